@@ -11,4 +11,5 @@ class BookAdmin(ModelAdmin):
 
 @admin.register(UserBookRelation)
 class UserBookRelationAdmin(ModelAdmin):
-    pass
\ No newline at end of file
+    # __str__ shows the username and book name.
+    list_select_related = ('user', 'book')
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BookConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'book'
+
+    def ready(self):
+        from book import cache  # noqa: F401 connects the response cache invalidation receivers
+        from book import metrics  # noqa: F401 connects the SQL query wrapper
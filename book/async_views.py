@@ -0,0 +1,139 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import APIException, MethodNotAllowed, NotAuthenticated, NotFound, ValidationError
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+from book.authentication import SignedTokenAuthentication, is_fresh, load_token, token_user, user_cache
+from book.facets import get_facets, parse_facets
+from book.logic import annotate_relation_state, upsert_relation
+from book.models import Book
+from book.renderers import ORJSONRenderer
+from book.routers import replica_reads
+from book.serializers import BooksValuesSerializer, UserBookRelationSerializer
+from book.views import BookViewSet
+
+# Async twins of the BookViewSet list/detail and relation PATCH endpoints for ASGI
+# deployments. They return the same JSON as the DRF views without holding a worker for a
+# whole request, but every query still runs in a thread: in Django 4.1 the async ORM
+# methods (aget, aiterator, ...) wrap the sync ones in sync_to_async.
+# Users come from the session or a Bearer token; HTTP Basic credentials are not checked.
+
+
+def render(data, status=200):
+    return HttpResponse(ORJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+class ErrorView(APIView):
+    # Errors go through DRF's own exception handling and rendering, so status codes, bodies and
+    # headers (Allow, WWW-Authenticate) match the DRF views. As there, SessionAuthentication
+    # comes first and sends no WWW-Authenticate, so authentication errors are 403s.
+    def __init__(self, request, methods):
+        super().__init__(args=(), kwargs={}, format_kwarg=None)
+        self.methods = methods
+        self.request = self.initialize_request(request)
+        self.headers = self.default_response_headers
+
+    @property
+    def allowed_methods(self):
+        return list(self.methods)
+
+    def render_error(self, exc):
+        return self.finalize_response(self.request, self.handle_exception(exc)).render()
+
+
+def async_api_view(*methods):
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                if request.method not in methods:
+                    raise MethodNotAllowed(request.method)
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                return ErrorView(request, methods).render_error(exc)
+        # As APIView.as_view(): CSRF is checked by load_user for session users only. Set directly,
+        # as Django's csrf_exempt wraps the view in a sync function.
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+async def load_user(request):
+    # Tokens resolve from the user cache and sessions need a cookie; only misses hop to a thread.
+    token = SignedTokenAuthentication.get_token(request)
+    if token is not None:
+        user_id, generation = load_token(token)
+        cached = user_cache.get(user_id)
+        if not is_fresh(cached, generation):
+            cached = await sync_to_async(user_cache.load)(user_id)
+        return token_user(generation, cached)
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return AnonymousUser()
+    user = await sync_to_async(get_user)(request)
+    if user.is_active:
+        # Same check as SessionAuthentication; it passes safe methods through.
+        SessionAuthentication().enforce_csrf(request)
+    return user
+
+
+@replica_reads
+@async_api_view('GET')
+async def book_list(request):
+    drf_request = Request(request)
+    drf_request.user = await load_user(request)
+    view = BookViewSet(request=drf_request, format_kwarg=None, action='list', args=(), kwargs={})
+    # Filtering and keyset pagination only build the query; nothing is evaluated yet.
+    queryset = view.filter_queryset(view.get_queryset())
+    paginator = view.paginator
+    page_queryset = paginator.get_page_queryset(queryset, drf_request, view)
+    facets = parse_facets(drf_request.query_params.get('facets'))
+
+    page = paginator.set_page([row async for row in page_queryset.aiterator()])
+    data = [BooksValuesSerializer.to_representation(row) for row in page]
+    response_data = paginator.get_paginated_response(data).data
+    if facets:
+        response_data['facets'] = await sync_to_async(get_facets)(queryset, facets)
+    return render(response_data)
+
+
+@replica_reads
+@async_api_view('GET')
+async def book_detail(request, pk):
+    queryset = Book.objects.filter(pk=pk)
+    user = await load_user(request)
+    if user.is_authenticated:
+        queryset = annotate_relation_state(queryset, user)
+    try:
+        row = await BooksValuesSerializer.prepare(queryset, with_rating_histogram=True).aget()
+    except Book.DoesNotExist:
+        raise NotFound()
+    return render(BooksValuesSerializer.to_representation(row))
+
+
+@async_api_view('PATCH')
+async def relation_update(request, book):
+    user = await load_user(request)
+    if not user.is_authenticated:
+        raise NotAuthenticated()
+
+    # Parsed like the DRF view: the body is already read, so this does not block.
+    data = Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+                   negotiator=api_settings.DEFAULT_CONTENT_NEGOTIATION_CLASS()).data
+    if not isinstance(data, dict):
+        raise ValidationError({'non_field_errors': ['Invalid data. Expected a dictionary.']})
+
+    serializer = UserBookRelationSerializer(data=data, partial=True)
+    serializer.is_valid(raise_exception=True)
+
+    relation = await sync_to_async(upsert_relation)(user, book, dict(serializer.validated_data))
+    if relation is None:
+        raise NotFound()
+    return render(UserBookRelationSerializer(relation).data)
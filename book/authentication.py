@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+from book.models import TokenGeneration
+
+TOKEN_SALT = 'book.authentication.token'
+USER_FIELDS = ('id', 'username', 'is_staff', 'is_superuser', 'is_active')
+
+
+def issue_token(user):
+    generation = TokenGeneration.objects.filter(user=user).values_list('generation', flat=True).first() or 0
+    return signing.dumps({'user': user.pk, 'generation': generation}, salt=TOKEN_SALT, compress=True)
+
+
+def revoke_tokens(user):
+    """Invalidate every token issued to the user so far; other workers notice within BOOK_TOKEN_USER_CACHE_TTL."""
+    _, created = TokenGeneration.objects.get_or_create(user=user, defaults={'generation': 1})
+    if not created:
+        TokenGeneration.objects.filter(user=user).update(generation=F('generation') + 1)
+    user_cache.evict(user.pk)
+
+
+def load_token(token):
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT, max_age=settings.BOOK_TOKEN_MAX_AGE)
+        return int(payload['user']), int(payload['generation'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise AuthenticationFailed('Invalid or expired token.')
+
+
+class UserCache:
+    # Per process, like LRUResponseCache: id, username and flags of active users with their
+    # current token generation, so authenticating a hot client costs no query at all.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def evict(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def get(self, user_id):
+        """`(user, generation)` from the cache, or None when missing or expired."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1], entry[2]
+
+    def load(self, user_id):
+        """`(user, generation)` from the database, or None for a missing or inactive user."""
+        user = (User.objects.filter(pk=user_id, is_active=True).only(*USER_FIELDS)
+                .annotate(current_generation=Coalesce('token_generation__generation', Value(0))).first())
+        if user is None:
+            return None
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + settings.BOOK_TOKEN_USER_CACHE_TTL, user,
+                                      user.current_generation)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > settings.BOOK_TOKEN_USER_CACHE_SIZE:
+                self._entries.popitem(last=False)
+        return user, user.current_generation
+
+
+user_cache = UserCache()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def evict_cached_user(sender, instance, **kwargs):
+    user_cache.evict(instance.pk)
+
+
+def token_user(generation, cached):
+    """The request's user for a token of `generation`, given the `(user, generation)` cache entry."""
+    if cached is None:
+        raise AuthenticationFailed('User inactive or deleted.')
+    user, current_generation = cached
+    if generation != current_generation:
+        raise AuthenticationFailed('Token has been revoked.')
+    # A fresh instance per request: the cached one is shared between threads.
+    return User.from_db(user._state.db, USER_FIELDS, [getattr(user, field) for field in USER_FIELDS])
+
+
+def is_fresh(cached, generation):
+    # A token newer than the cached generation was issued after a revoke in another process.
+    return cached is not None and cached[1] >= generation
+
+
+def authenticate_token(token):
+    user_id, generation = load_token(token)
+    cached = user_cache.get(user_id)
+    if not is_fresh(cached, generation):
+        cached = user_cache.load(user_id)
+    return token_user(generation, cached)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    `Authorization: Bearer <token>` with a signed, stateless token from issue_token().
+    Users are read through the process-wide UserCache, so neither a session nor a
+    user row is looked up while the cache is warm.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        token = self.get_token(request)
+        if token is None:
+            return None
+        return authenticate_token(token), token
+
+    @classmethod
+    def get_token(cls, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != cls.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed('Invalid token header.')
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed('Invalid token header.')
+
+    def authenticate_header(self, request):
+        return self.keyword
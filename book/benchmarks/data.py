@@ -0,0 +1,61 @@
+import random
+import string
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from book.logic import rebuild_aggregates
+from book.models import Book, UserBookRelation
+
+
+@contextmanager
+def throwaway_database(alias=DEFAULT_DB_ALIAS):
+    # A fresh, migrated test database, as the test runner creates: seeded rows can be committed
+    # and requests measured outside any wrapping transaction. Dropped on exit.
+    creation = connections[alias].creation
+    old_name = creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        creation.destroy_test_db(old_name, verbosity=0)
+
+
+def zipf_weights(size, skew):
+    return [1 / rank ** skew for rank in range(1, size + 1)]
+
+
+def seed_catalog(users=100, books=1000, relations_per_user=20, skew=1.1, seed=0, batch_size=5000):
+    # Popularity follows a Zipf law on both sides: a few books get most of the
+    # relations and a few users write most of them, as on a real catalog.
+    rng = random.Random(seed)
+    words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))) for _ in range(2000)]
+    prefix = f'bench{seed}_{rng.getrandbits(32):08x}'
+
+    User.objects.bulk_create([User(username=f'{prefix}_{index}') for index in range(users)], batch_size=batch_size)
+    user_ids = list(User.objects.filter(username__startswith=prefix + '_').order_by('id').values_list('id', flat=True))
+    Book.objects.bulk_create(
+        [Book(name=' '.join(rng.sample(words, 3)).capitalize(), price=rng.randint(1, 1000),
+              author=' '.join(rng.sample(words, 2)).title(), owner_id=rng.choice(user_ids)) for _ in range(books)],
+        batch_size=batch_size,
+    )
+    book_ids = list(Book.objects.order_by('-id').values_list('id', flat=True)[:books])
+    rng.shuffle(book_ids)
+
+    book_weights = zipf_weights(len(book_ids), skew)
+    user_weights = zipf_weights(len(user_ids), skew)
+    mean_weight = sum(user_weights) / len(user_weights)
+    relations = []
+    for user_id, weight in zip(user_ids, user_weights):
+        count = min(len(book_ids), max(1, round(relations_per_user * weight / mean_weight)))
+        for book_id in set(rng.choices(book_ids, book_weights, k=count)):
+            relations.append(UserBookRelation(
+                user_id=user_id, book_id=book_id, like=rng.random() < 0.4, in_bookmarks=rng.random() < 0.15,
+                rate=rng.choices([None, 1, 2, 3, 4, 5], [50, 3, 5, 10, 15, 17])[0],
+            ))
+    UserBookRelation.objects.bulk_create(relations, batch_size=batch_size)
+    for start in range(0, len(book_ids), batch_size):
+        rebuild_aggregates(Book.objects.filter(pk__in=book_ids[start:start + batch_size]))
+
+    return {'user_ids': user_ids, 'book_ids': book_ids, 'book_weights': book_weights, 'words': words,
+            'relations': len(relations)}
@@ -0,0 +1,56 @@
+import io
+import time
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from book.models import Book
+from book.renderers import MessagePackParser, MessagePackRenderer, ORJSONParser, ORJSONRenderer, msgpack, orjson
+from book.serializers import BooksValuesSerializer
+
+
+def available_formats():
+    formats = {'json': (JSONRenderer(), JSONParser())}
+    if orjson is not None:
+        formats['orjson'] = (ORJSONRenderer(), ORJSONParser())
+    if msgpack is not None:
+        formats['msgpack'] = (MessagePackRenderer(), MessagePackParser())
+    return formats
+
+
+def list_payload(size):
+    # Shaped like a `GET /book/` page, but without the max_page_size cap.
+    rows = BooksValuesSerializer.prepare(Book.objects.order_by('id'))[:size]
+    return {'next': 'http://testserver/book/?cursor=cD0xMjM0NQ%3D%3D', 'previous': None,
+            'results': [BooksValuesSerializer.to_representation(row) for row in rows]}
+
+
+def measure(renderer, parser, payload, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        body = renderer.render(payload, renderer.media_type, {})
+    encode = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        parser.parse(io.BytesIO(body), parser.media_type, {})
+    decode = time.perf_counter() - started
+
+    return {
+        'bytes': len(body),
+        'encode_per_s': iterations / encode,
+        'decode_per_s': iterations / decode,
+        'encode_mb_s': len(body) * iterations / encode / 1e6,
+        'decode_mb_s': len(body) * iterations / decode / 1e6,
+    }
+
+
+def run_renderer_benchmark(sizes, iterations, formats=None):
+    """`{size: {format: measurements}}` for list payloads of each size."""
+    formats = formats or available_formats()
+    results = {}
+    for size in sizes:
+        payload = list_payload(size)
+        results[size] = {name: measure(renderer, parser, payload, iterations)
+                         for name, (renderer, parser) in formats.items()}
+    return results
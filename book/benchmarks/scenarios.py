@@ -0,0 +1,102 @@
+import json
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+class Context:
+    def __init__(self, data, seed=0, writers=20):
+        self.data = data
+        self.rng = random.Random(seed)
+        self.client = Client()
+        self.writers = []
+        for user in User.objects.filter(pk__in=data['user_ids'][:writers]):
+            client = Client()
+            client.force_login(user)
+            self.writers.append(client)
+
+    def book_id(self):
+        return self.rng.choices(self.data['book_ids'], self.data['book_weights'])[0]
+
+    def search_term(self):
+        return self.rng.choice(self.data['words'])[:self.rng.randint(4, 6)]
+
+
+def list_books(ctx):
+    return ctx.client.get(reverse('book-list'))
+
+
+def list_filter(ctx):
+    return ctx.client.get(reverse('book-list'), {'price': ctx.rng.randint(1, 1000)})
+
+
+def list_search(ctx):
+    return ctx.client.get(reverse('book-list'), {'search': ctx.search_term()})
+
+
+def list_ordering(ctx):
+    ordering = ctx.rng.choice(['price', '-price', 'name', '-name'])
+    return ctx.client.get(reverse('book-list'), {'ordering': ordering, 'page_size': 50})
+
+
+def detail(ctx):
+    return ctx.client.get(reverse('book-detail', args=(ctx.book_id(),)))
+
+
+def write(ctx):
+    data = ctx.rng.choice([{'like': ctx.rng.random() < 0.7}, {'rate': ctx.rng.randint(1, 5)},
+                           {'in_bookmarks': ctx.rng.random() < 0.5}])
+    return ctx.rng.choice(ctx.writers).patch(reverse('userbookrelation-detail', args=(ctx.book_id(),)),
+                                             json.dumps(data), content_type='application/json')
+
+
+def mixed(ctx):
+    step = ctx.rng.choices([list_books, list_search, list_ordering, detail, write], [25, 15, 10, 40, 10])[0]
+    return step(ctx)
+
+
+SCENARIOS = {
+    'list': list_books,
+    'list_filter': list_filter,
+    'list_search': list_search,
+    'list_ordering': list_ordering,
+    'detail': detail,
+    'write_storm': write,
+    'mixed': mixed,
+}
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def run_scenario(ctx, step, requests):
+    timings = []
+    queries = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        request_started = time.perf_counter()
+        with CaptureQueriesContext(connection) as captured:
+            response = step(ctx)
+        timings.append((time.perf_counter() - request_started) * 1000)
+        queries.append(len(captured))
+        if response.status_code != 200:
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': requests,
+        'errors': errors,
+        'rps': round(requests / elapsed, 1),
+        'latency_ms': {'p50': round(percentile(timings, 50), 3), 'p90': round(percentile(timings, 90), 3),
+                       'p99': round(percentile(timings, 99), 3), 'max': round(max(timings), 3)},
+        'queries': {'mean': round(statistics.mean(queries), 2), 'max': max(queries), 'total': sum(queries)},
+    }
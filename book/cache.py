@@ -0,0 +1,193 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.response import Response
+from rest_framework.status import HTTP_200_OK
+
+from book.models import Book, UserBookRelation, deleting
+from book.routers import served_from_replica
+
+
+class BaseResponseCache:
+    # The version lives in a Django cache so a write in any process (another web worker,
+    # process_dirty_books, import_books, ...) invalidates the responses cached by all of them.
+    version_key = 'book:response-cache:version'
+    bumped_key = 'book:response-cache:bumped-at'
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+        self.hits = 0
+        self.misses = 0
+
+    def get_version(self):
+        return self.cache.get_or_set(self.version_key, 0, timeout=None)
+
+    def bump_version(self):
+        self.cache.add(self.version_key, 0, timeout=None)
+        try:
+            self.cache.incr(self.version_key)
+        except ValueError:
+            self.cache.set(self.version_key, 1, timeout=None)
+        self.cache.set(self.bumped_key, time.time(), timeout=None)
+
+    def bumped_within(self, seconds):
+        bumped_at = self.cache.get(self.bumped_key)
+        return bumped_at is not None and time.time() - bumped_at < seconds
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def lookup(self, key):
+        value = self.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class LRUResponseCache(BaseResponseCache):
+    # Responses are kept in process and only the version is shared. With a per-process
+    # `alias` backend (the default LocMemCache) other processes' writes are not seen, so
+    # entries also expire after `timeout` seconds.
+    def __init__(self, max_entries=1024, timeout=5, alias='default'):
+        super().__init__(alias)
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get_version(self):
+        version = super().get_version()
+        with self._lock:
+            if version != self._version:
+                # Entries of older versions can never be hit again.
+                self._entries.clear()
+                self._version = version
+        return version
+
+    def bump_version(self):
+        super().bump_version()
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        return dict(super().stats(), size=len(self._entries), max_entries=self.max_entries)
+
+
+class DjangoResponseCache(BaseResponseCache):
+    def __init__(self, alias='default', timeout=300):
+        super().__init__(alias)
+        self.timeout = timeout
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, timeout=self.timeout)
+
+
+@lru_cache(maxsize=None)
+def get_response_cache():
+    config = settings.BOOK_RESPONSE_CACHE
+    if not config:
+        return None
+    options = {key.lower(): value for key, value in config.get('OPTIONS', {}).items()}
+    return import_string(config['BACKEND'])(**options)
+
+
+@receiver(setting_changed)
+def reset_response_cache(setting, **kwargs):
+    if setting == 'BOOK_RESPONSE_CACHE':
+        get_response_cache.cache_clear()
+
+
+def invalidate():
+    response_cache = get_response_cache()
+    if response_cache is None:
+        return
+    # Bump right away so nothing cached during the write is reused, and again on
+    # commit so a response built from pre-commit data cannot outlive the write.
+    response_cache.bump_version()
+    transaction.on_commit(response_cache.bump_version)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=UserBookRelation)
+@receiver(post_delete, sender=UserBookRelation)
+def invalidate_on_change(sender, origin=None, **kwargs):
+    # Relations deleted along with their book or user: those deletes invalidate once.
+    if sender is UserBookRelation and (deleting(origin, Book) or deleting(origin, User)):
+        return
+    invalidate()
+
+
+def make_key(request, version):
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    # Responses carry the current user's relation to each book.
+    user = request.user.pk if request.user.is_authenticated else ''
+    raw = f'{version}:{user}:{request.get_host()}{request.path}?{params}'
+    return 'book:response:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+class CachedResponseMixin:
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        response_cache = get_response_cache()
+        if response_cache is None:
+            return handler(request, *args, **kwargs)
+
+        key = make_key(request, response_cache.get_version())
+        data = response_cache.lookup(key)
+        if data is not None:
+            return Response(data)
+
+        response = handler(request, *args, **kwargs)
+        # A replica may not have caught up with a write that bumped the version yet.
+        stale = served_from_replica() and response_cache.bumped_within(settings.BOOK_REPLICA_PIN_SECONDS)
+        if response.status_code == HTTP_200_OK and not stale:
+            response_cache.set(key, response.data)
+        return response
@@ -0,0 +1,71 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.db.models import OuterRef, Subquery
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from book.models import Book, CatalogState, DirtyBook
+
+# Validators depend on the representation and on the user's relations.
+VARY_HEADERS = ('Accept', 'Authorization', 'Cookie')
+
+
+def catalog_last_modified():
+    # Both lookups are served by an index (Book.updated_at, CatalogState pk) in one query.
+    # Relation changes write-behind mode has not applied to the books yet count through
+    # their dirty marks (a small queue).
+    last_update = Book.objects.order_by('-updated_at').values('updated_at')[:1]
+    last_mark = DirtyBook.objects.order_by('-marked_at').values('marked_at')[:1]
+    row = (CatalogState.objects.filter(pk=1)
+           .annotate(books_updated_at=Subquery(last_update), books_marked_at=Subquery(last_mark))
+           .values_list('books_updated_at', 'books_deleted_at', 'books_marked_at').first())
+    if row is None:
+        row = (Book.objects.order_by('-updated_at').values_list('updated_at', flat=True).first(), None,
+               DirtyBook.objects.order_by('-marked_at').values_list('marked_at', flat=True).first())
+    return max(filter(None, row), default=None), row
+
+
+def book_last_modified(pk):
+    marked_at = DirtyBook.objects.filter(book_id=OuterRef('pk')).values('marked_at')
+    row = Book.objects.filter(pk=pk).values_list('updated_at', Subquery(marked_at)).first()
+    return max(filter(None, row)) if row is not None else None
+
+
+def make_etag(request, *state):
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    user = request.user.pk if request.user.is_authenticated else ''
+    raw = f'{request.path}?{params}|{request.META.get("HTTP_ACCEPT", "")}|{user}|{state}'
+    return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+
+class ConditionalGetMixin:
+    def list(self, request, *args, **kwargs):
+        last_modified, state = catalog_last_modified()
+        return self.conditional_response(make_etag(request, state), last_modified,
+                                         super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            last_modified = book_last_modified(int(kwargs[self.lookup_url_kwarg or self.lookup_field]))
+        except ValueError:
+            last_modified = None
+        if last_modified is None:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(make_etag(request, last_modified), last_modified,
+                                         super().retrieve, request, *args, **kwargs)
+
+    def conditional_response(self, etag, last_modified, handler, request, *args, **kwargs):
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if not_modified is not None:
+            patch_vary_headers(not_modified, VARY_HEADERS)
+            return not_modified
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            patch_vary_headers(response, VARY_HEADERS)
+        return response
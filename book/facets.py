@@ -0,0 +1,65 @@
+from django.db.models import Count, Q
+from rest_framework.exceptions import ValidationError
+
+# Half-open [min, max) ranges; clients filter a bucket with `?price__gte=min&price__lt=max`.
+PRICE_BUCKETS = ((0, 100), (100, 250), (250, 500), (500, 1000), (1000, None))
+RATING_BANDS = ((0, 1), (1, 2), (2, 3), (3, 4), (4, None))
+FACETS = ('price', 'author', 'rating')
+AUTHOR_FACET_LIMIT = 20
+
+
+def parse_facets(value):
+    names = [name.strip() for name in (value or '').split(',') if name.strip()]
+    unknown = sorted(set(names) - set(FACETS))
+    if unknown:
+        raise ValidationError({'facets': [f'Unknown facets: {", ".join(unknown)}. '
+                                          f'Expected any of: {", ".join(FACETS)}.']})
+    return [name for name in FACETS if name in names]
+
+
+def range_filter(field, low, high):
+    condition = Q(**{f'{field}__gte': low})
+    if high is not None:
+        condition &= Q(**{f'{field}__lt': high})
+    return condition
+
+
+def range_facet(low, high, count):
+    return {'value': f'{low}-{high}' if high is not None else f'{low}+', 'min': low, 'max': high, 'count': count}
+
+
+def author_counts(queryset):
+    # Grouped on the (author, id) index; the database sorts and cuts the list.
+    counts = queryset.order_by().values('author').annotate(books=Count('pk'))
+    return counts.order_by('-books', 'author')[:AUTHOR_FACET_LIMIT]
+
+
+def get_facets(queryset, names):
+    """
+    Counts for the requested facets over the filtered `queryset`: every range bucket is a
+    conditional COUNT in a single aggregate, and the author facet is its own grouped query
+    with the ordering and limit done by the database.
+    """
+    if not names:
+        return {}
+    aggregates = {}
+    if 'price' in names:
+        aggregates.update({f'price_{low}': Count('pk', filter=range_filter('price', low, high))
+                           for low, high in PRICE_BUCKETS})
+    if 'rating' in names:
+        aggregates.update({f'rating_{low}': Count('pk', filter=range_filter('rating', low, high))
+                           for low, high in RATING_BANDS})
+        aggregates['rating_none'] = Count('pk', filter=Q(rating__isnull=True))
+
+    queryset = queryset.order_by()
+    counts = queryset.aggregate(**aggregates) if aggregates else {}
+
+    facets = {}
+    if 'price' in names:
+        facets['price'] = [range_facet(low, high, counts[f'price_{low}']) for low, high in PRICE_BUCKETS]
+    if 'author' in names:
+        facets['author'] = [{'value': row['author'], 'count': row['books']} for row in author_counts(queryset)]
+    if 'rating' in names:
+        facets['rating'] = [range_facet(low, high, counts[f'rating_{low}']) for low, high in RATING_BANDS]
+        facets['rating'].append({'value': 'unrated', 'min': None, 'max': None, 'count': counts['rating_none']})
+    return facets
@@ -0,0 +1,146 @@
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from book.cache import invalidate
+from book.logic import RELATION_FIELDS, rebuild_aggregates
+from book.models import Book, UserBookRelation
+from book.serializers import BooksSerializer, UserBookRelationBulkItemSerializer
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class Importer:
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.user_ids = {}
+        self.book_ids = set()
+        self.errors = []
+        self.explicit_ids = False
+
+    def read_rows(self, path, file_format=None):
+        file_format = file_format or ('csv' if str(path).endswith('.csv') else 'ndjson')
+        with open(path, newline='', encoding='utf-8') as source:
+            if file_format == 'csv':
+                for line, row in enumerate(csv.DictReader(source), start=2):
+                    # Empty CSV cells mean "not given", like a missing NDJSON key.
+                    yield line, {key: value for key, value in row.items() if value != ''}
+                return
+            for line, text in enumerate(source, start=1):
+                if not text.strip():
+                    continue
+                try:
+                    row = json.loads(text)
+                except ValueError as exc:
+                    self.errors.append((line, {'non_field_errors': [f'JSON parse error - {exc}']}))
+                    continue
+                if not isinstance(row, dict):
+                    self.errors.append((line, {'non_field_errors': ['Expected a JSON object.']}))
+                    continue
+                yield line, row
+
+    def resolve_users(self, usernames):
+        missing = set(usernames) - self.user_ids.keys()
+        if missing:
+            found = dict(User.objects.filter(username__in=missing).values_list('username', 'id'))
+            self.user_ids.update({username: found.get(username) for username in missing})
+
+    def import_books(self, rows):
+        created = 0
+        for batch in batches(rows, self.batch_size):
+            self.resolve_users(row['owner'] for _, row in batch if row.get('owner'))
+            books = []
+            for line, row in batch:
+                serializer = BooksSerializer(data=row)
+                if not serializer.is_valid():
+                    self.errors.append((line, serializer.errors))
+                    continue
+                owner = row.get('owner')
+                if owner and self.user_ids[owner] is None:
+                    self.errors.append((line, {'owner': [f'Unknown user "{owner}".']}))
+                    continue
+                if 'id' in row and not str(row['id']).isdigit():
+                    self.errors.append((line, {'id': ['A valid integer is required.']}))
+                    continue
+                fields = {name: value for name, value in serializer.validated_data.items() if name != 'rating'}
+                book = Book(owner_id=self.user_ids.get(owner), **fields)
+                if 'id' in row:
+                    book.id = int(row['id'])
+                books.append((line, book))
+
+            # Explicit ids that are taken, by an existing book or an earlier row, are reported per line.
+            taken = set(Book.objects.filter(pk__in=[book.id for _, book in books if book.id is not None])
+                        .values_list('pk', flat=True))
+            accepted = []
+            for line, book in books:
+                if book.id is not None:
+                    if book.id in taken:
+                        self.errors.append((line, {'id': [f'A book with id {book.id} already exists.']}))
+                        continue
+                    taken.add(book.id)
+                    self.explicit_ids = True
+                accepted.append(book)
+            books = accepted
+            with transaction.atomic():
+                Book.objects.bulk_create(books)
+            created += len(books)
+        return created
+
+    def import_relations(self, rows):
+        imported = 0
+        for batch in batches(rows, self.batch_size):
+            self.resolve_users(row['user'] for _, row in batch if row.get('user'))
+            valid = []
+            for line, row in batch:
+                serializer = UserBookRelationBulkItemSerializer(data=row)
+                if not serializer.is_valid():
+                    self.errors.append((line, serializer.errors))
+                elif self.user_ids.get(row.get('user')) is None:
+                    self.errors.append((line, {'user': [f'Unknown user "{row.get("user")}".']}))
+                else:
+                    valid.append((line, self.user_ids[row['user']], serializer.validated_data))
+
+            existing = set(Book.objects.filter(pk__in={data['book'] for _, _, data in valid})
+                           .values_list('pk', flat=True))
+            relations = {}
+            for line, user_id, data in valid:
+                if data['book'] not in existing:
+                    self.errors.append((line, {'book': [f'Invalid pk "{data["book"]}" - object does not exist.']}))
+                    continue
+                # Later rows for the same (user, book) override only the fields they give, like sequential PATCHes.
+                relations.setdefault((user_id, data['book']), {}).update(
+                    {name: data[name] for name in RELATION_FIELDS if name in data})
+
+            # Existing relations keep the fields a row does not give, so rows are written per field set.
+            groups = defaultdict(list)
+            for (user_id, book_id), fields in relations.items():
+                groups[tuple(sorted(fields))].append(UserBookRelation(user_id=user_id, book_id=book_id, **fields))
+            with transaction.atomic():
+                for names, objs in groups.items():
+                    if names:
+                        UserBookRelation.objects.bulk_create(objs, update_conflicts=True, update_fields=names,
+                                                             unique_fields=['user_id', 'book_id'])
+                    else:
+                        UserBookRelation.objects.bulk_create(objs, ignore_conflicts=True)
+            self.book_ids.update(book_id for _, book_id in relations)
+            imported += len(relations)
+        return imported
+
+    def finish(self):
+        if self.explicit_ids:
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [Book]):
+                    cursor.execute(sql)
+        book_ids = sorted(self.book_ids)
+        for start in range(0, len(book_ids), self.batch_size):
+            rebuild_aggregates(Book.objects.filter(pk__in=book_ids[start:start + self.batch_size]))
+        invalidate()
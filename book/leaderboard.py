@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from book.models import Book, BookLikeActivity
+from book.serializers import BooksValuesSerializer
+
+BOARDS = ('rated', 'liked', 'trending')
+
+
+def book_rows(queryset):
+    return [BooksValuesSerializer.to_representation(row) for row in queryset]
+
+
+def top_rated(limit, min_ratings=1):
+    books = Book.objects.filter(rating__isnull=False, rating_count__gte=min_ratings).order_by('-rating', '-id')
+    return book_rows(BooksValuesSerializer.prepare(books)[:limit])
+
+
+def most_liked(limit):
+    books = Book.objects.filter(likes_count__gt=0).order_by('-likes_count', '-id')
+    return book_rows(BooksValuesSerializer.prepare(books)[:limit])
+
+
+def trending(limit, days=7):
+    # Cost follows the number of books liked in the window, not the catalog size.
+    since = timezone.now().date() - timedelta(days=days - 1)
+    totals = list(BookLikeActivity.objects.filter(day__gte=since).values('book_id')
+                  .annotate(recent_likes=Sum('likes')).filter(recent_likes__gt=0)
+                  .order_by('-recent_likes', '-book_id').values_list('book_id', 'recent_likes')[:limit])
+    books = Book.objects.filter(pk__in=[pk for pk, _ in totals])
+    books = {row['id']: row for row in BooksValuesSerializer.prepare(books)}
+    return [dict(BooksValuesSerializer.to_representation(books[pk]), recent_likes=recent_likes)
+            for pk, recent_likes in totals if pk in books]
+
+
+def get_leaderboard(board, limit=10, days=7, min_ratings=1):
+    if board == 'rated':
+        return top_rated(limit, min_ratings)
+    if board == 'liked':
+        return most_liked(limit)
+    return trending(limit, days)
+
+
+def prune_like_activity(days=None):
+    # Buckets older than the longest trending window are never read again.
+    days = days or settings.BOOK_TRENDING_MAX_DAYS
+    return BookLikeActivity.objects.filter(day__lt=timezone.now().date() - timedelta(days=days - 1)).delete()[0]
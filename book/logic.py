@@ -1,9 +1,327 @@
-from django.db.models import Avg
+from collections import defaultdict
 
-from book.models import UserBookRelation
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, FilteredRelation, FloatField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
+
+from book.cache import invalidate
+from book.models import RATE_COUNT_FIELDS, Book, BookLikeActivity, DirtyBook, PendingLikeActivity, UserBookRelation
 
 
 def set_rating(book):
-    rating = UserBookRelation.objects.filter(book=book).aggregate(rating=Avg('rate')).get('rating')
-    book.rating = rating
-    book.save()
\ No newline at end of file
+    rate_counts = {field: Count('pk', filter=Q(rate=rate)) for rate, field in RATE_COUNT_FIELDS.items()}
+    stats = UserBookRelation.objects.filter(book=book).aggregate(rating_sum=Sum('rate'), rating_count=Count('rate'),
+                                                                 **rate_counts)
+    book.rating_sum = stats['rating_sum'] or 0
+    book.rating_count = stats['rating_count']
+    book.rating = book.rating_sum / book.rating_count if book.rating_count else None
+    for field in rate_counts:
+        setattr(book, field, stats[field])
+    book.save(update_fields=['rating', 'rating_sum', 'rating_count', *rate_counts, 'updated_at'])
+
+
+def update_aggregates(book_id, likes=0, bookmarks=0, old_rate=None, new_rate=None):
+    changes = {}
+    if likes:
+        changes['likes_count'] = F('likes_count') + likes
+    if bookmarks:
+        changes['bookmarks_count'] = F('bookmarks_count') + bookmarks
+    if old_rate != new_rate:
+        sum_delta = (new_rate or 0) - (old_rate or 0)
+        count_delta = (new_rate is not None) - (old_rate is not None)
+        rating_sum = F('rating_sum') + sum_delta
+        rating_count = F('rating_count') + count_delta
+        changes['rating_sum'] = rating_sum
+        changes['rating_count'] = rating_count
+        # SET expressions see the pre-update row, so the new average is computed from the same deltas.
+        changes['rating'] = Cast(rating_sum, FloatField()) / NullIf(rating_count, Value(0))
+        # Rates outside RATE_CHOICES (only writable around the serializers) have no bucket.
+        if old_rate in RATE_COUNT_FIELDS:
+            changes[RATE_COUNT_FIELDS[old_rate]] = F(RATE_COUNT_FIELDS[old_rate]) - 1
+        if new_rate in RATE_COUNT_FIELDS:
+            changes[RATE_COUNT_FIELDS[new_rate]] = F(RATE_COUNT_FIELDS[new_rate]) + 1
+    if changes:
+        Book.objects.filter(pk=book_id).update(updated_at=timezone.now(), **changes)
+
+
+def record_relation_change(book_id, likes=0, bookmarks=0, old_rate=None, new_rate=None):
+    if not likes and not bookmarks and old_rate == new_rate:
+        return
+    # Recorded in both modes: the flush worker only sees totals, not when the likes happened.
+    record_like_activity({book_id: likes})
+    if settings.BOOK_AGGREGATES_WRITE_BEHIND:
+        mark_dirty(book_id)
+    else:
+        update_aggregates(book_id, likes=likes, bookmarks=bookmarks, old_rate=old_rate, new_rate=new_rate)
+
+
+def record_like_activity(deltas):
+    """Add `{book_id: net new likes}` to today's BookLikeActivity buckets, or queue them in write-behind mode."""
+    deltas = {book_id: delta for book_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    day = timezone.now().date()
+    if settings.BOOK_AGGREGATES_WRITE_BEHIND:
+        PendingLikeActivity.objects.bulk_create([PendingLikeActivity(book_id=book_id, day=day, likes=delta)
+                                                 for book_id, delta in deltas.items()])
+    else:
+        add_like_activity({(book_id, day): delta for book_id, delta in deltas.items()})
+
+
+def add_like_activity(deltas):
+    """Add `{(book_id, day): likes}` to the BookLikeActivity buckets."""
+    if not deltas:
+        return
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        for (book_id, day), delta in deltas.items():
+            BookLikeActivity.objects.get_or_create(book_id=book_id, day=day)
+            BookLikeActivity.objects.filter(book_id=book_id, day=day).update(likes=F('likes') + delta)
+        return
+
+    qn = connection.ops.quote_name
+    table, likes = qn(BookLikeActivity._meta.db_table), qn('likes')
+    params = []
+    for (book_id, day), delta in sorted(deltas.items()):
+        params += [book_id, connection.ops.adapt_datefield_value(day), delta]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({qn("book_id")}, {qn("day")}, {likes}) '
+            f'VALUES {", ".join(["(%s, %s, %s)"] * len(deltas))} '
+            f'ON CONFLICT ({qn("book_id")}, {qn("day")}) DO UPDATE SET {likes} = {table}.{likes} + EXCLUDED.{likes}',
+            params,
+        )
+
+
+def flush_like_activity(batch_size=500):
+    processed = 0
+    while True:
+        with transaction.atomic():
+            rows = list(PendingLikeActivity.objects.select_for_update(skip_locked=True).order_by('id')
+                        .values_list('id', 'book_id', 'day', 'likes')[:batch_size])
+            if not rows:
+                return processed
+            PendingLikeActivity.objects.filter(pk__in=[row[0] for row in rows]).delete()
+            deltas = defaultdict(int)
+            for _, book_id, day, likes in rows:
+                deltas[book_id, day] += likes
+            add_like_activity({key: delta for key, delta in deltas.items() if delta})
+        processed += len(rows)
+        invalidate()
+
+
+def mark_dirty(*book_ids):
+    # Bump marked_at on a queued book, so a flush that already read the older mark keeps the row.
+    DirtyBook.objects.bulk_create([DirtyBook(book_id=book_id) for book_id in book_ids], update_conflicts=True,
+                                  unique_fields=['book_id'], update_fields=['marked_at'])
+
+
+def refresh_aggregates(book_ids):
+    if not book_ids:
+        return
+    if settings.BOOK_AGGREGATES_WRITE_BEHIND:
+        mark_dirty(*book_ids)
+    else:
+        rebuild_aggregates(Book.objects.filter(pk__in=book_ids))
+
+
+def load_relations(user, book_ids):
+    return {relation.book_id: relation for relation in UserBookRelation.objects.filter(user=user, book_id__in=book_ids)}
+
+
+def apply_relation_changes(user, changes, attempts=3):
+    """
+    Apply `{book_id: {field: value}}` to the user's relations with a fixed number of
+    queries and return `{book_id: (relation, status)}`.
+    """
+    for attempt in range(attempts):
+        relations = load_relations(user, changes)
+        results, to_create, to_update, update_fields, likes = {}, [], [], set(), {}
+
+        for book_id, fields in changes.items():
+            relation = relations.get(book_id)
+            if relation is None:
+                relation = UserBookRelation(user=user, book_id=book_id, **fields)
+                to_create.append(relation)
+                results[book_id] = (relation, 'created')
+                likes[book_id] = int(relation.like)
+                continue
+            changed = {name for name, value in fields.items() if getattr(relation, name) != value}
+            if 'like' in changed:
+                likes[book_id] = 1 if fields['like'] else -1
+            for name in changed:
+                setattr(relation, name, fields[name])
+            if changed:
+                to_update.append(relation)
+                update_fields |= changed
+            results[book_id] = (relation, 'updated' if changed else 'unchanged')
+
+        try:
+            with transaction.atomic():
+                UserBookRelation.objects.bulk_create(to_create)
+                if to_update:
+                    UserBookRelation.objects.bulk_update(to_update, sorted(update_fields))
+                refresh_aggregates([relation.book_id for relation in to_create + to_update])
+                record_like_activity(likes)
+            return results
+        except IntegrityError:
+            # A concurrent first write created one of the relations after our read: read
+            # them again, so statuses and like deltas follow what is actually in the table.
+            if attempt == attempts - 1:
+                raise
+
+
+RELATION_FIELDS = ('like', 'in_bookmarks', 'rate')
+
+
+def _upsert_relation_sql(fields):
+    qn = connection.ops.quote_name
+    opts = UserBookRelation._meta
+    relations, books = qn(opts.db_table), qn(Book._meta.db_table)
+    names = ('user_id', 'book_id') + RELATION_FIELDS
+    values = ', '.join(f'CAST(%s AS {opts.get_field(name).cast_db_type(connection)})' for name in names)
+    updates = ', '.join(f'{qn(name)} = EXCLUDED.{qn(name)}' for name in fields or ('user_id',))
+    returning = ', '.join(f'{relations}.{qn(name)}' for name in ('id',) + RELATION_FIELDS)
+    insert = (f'INSERT INTO {relations} ({", ".join(qn(name) for name in names)}) SELECT {values} '
+              f'WHERE EXISTS (SELECT 1 FROM {books} WHERE {qn("id")} = %s)')
+    conflict = f'ON CONFLICT ({qn("user_id")}, {qn("book_id")}) DO UPDATE SET {updates}'
+    if connection.vendor != 'postgresql':
+        return f'{insert} {conflict} RETURNING {returning}'
+    # The locked pre-image comes back with the new row, so there is no separate read. The
+    # insert refers to `old` so that the row is locked before it is updated. A row another
+    # transaction inserted after our snapshot is not in `old`: it is left alone and nothing
+    # comes back, so the caller runs the statement again and locks it then.
+    return (
+        f'WITH old AS (SELECT {", ".join(qn(name) for name in RELATION_FIELDS)} FROM {relations} '
+        f'WHERE {qn("user_id")} = %s AND {qn("book_id")} = %s FOR UPDATE), '
+        f'upserted AS ({insert} AND (SELECT COUNT(*) FROM old) >= 0 {conflict} '
+        f'WHERE EXISTS (SELECT 1 FROM old) RETURNING {returning}) '
+        f'SELECT upserted.*, {", ".join(f"old.{qn(name)}" for name in RELATION_FIELDS)} '
+        f'FROM upserted LEFT JOIN old ON TRUE'
+    )
+
+
+def upsert_relation(user, book_id, fields):
+    """
+    Create or update the user's relation to a book with a single INSERT ... ON CONFLICT DO UPDATE
+    and apply the change to the book aggregates. Returns None if the book does not exist.
+    """
+    with transaction.atomic():
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            if not Book.objects.filter(pk=book_id).exists():
+                return None
+            relation, _ = UserBookRelation.objects.get_or_create(user=user, book_id=book_id)
+            for name, value in fields.items():
+                setattr(relation, name, value)
+            relation.save()
+            return relation
+
+        values = dict({'like': False, 'in_bookmarks': False, 'rate': None}, **fields)
+        params = [user.pk, book_id] + [values[name] for name in RELATION_FIELDS] + [book_id]
+        if connection.vendor == 'postgresql':
+            # Twice at most: the second statement sees a row a concurrent first write committed.
+            for _ in range(2):
+                with connection.cursor() as cursor:
+                    cursor.execute(_upsert_relation_sql(fields), [user.pk, book_id] + params)
+                    row = cursor.fetchone()
+                if row is not None:
+                    break
+            old = row[4:] if row is not None and row[4] is not None else None
+        else:
+            # SQLite has no FOR UPDATE or writable CTEs, but runs a single writer at a time.
+            old = UserBookRelation.objects.filter(user=user, book_id=book_id).values_list(*RELATION_FIELDS).first()
+            with connection.cursor() as cursor:
+                cursor.execute(_upsert_relation_sql(fields), params)
+                row = cursor.fetchone()
+        if row is None:
+            return None
+
+        relation_id, like, in_bookmarks, rate = row[:4]
+        relation = UserBookRelation(id=relation_id, user=user, book_id=book_id,
+                                    like=bool(like), in_bookmarks=bool(in_bookmarks), rate=rate)
+        relation._loaded_values = {'like': relation.like, 'in_bookmarks': relation.in_bookmarks, 'rate': rate}
+
+        old_like, old_in_bookmarks, old_rate = old or (False, False, None)
+        record_relation_change(book_id,
+                               likes=int(relation.like) - int(old_like),
+                               bookmarks=int(relation.in_bookmarks) - int(old_in_bookmarks),
+                               old_rate=old_rate,
+                               new_rate=rate)
+        invalidate()
+    return relation
+
+
+def flush_dirty_books(batch_size=500):
+    flush_like_activity(batch_size)
+    processed = 0
+    while True:
+        with transaction.atomic():
+            marks = dict(DirtyBook.objects.select_for_update(skip_locked=True)
+                         .order_by('marked_at').values_list('book_id', 'marked_at')[:batch_size])
+            if not marks:
+                return processed
+            book_ids = list(marks)
+            rebuild_aggregates(Book.objects.filter(pk__in=book_ids))
+            # Dequeue only the marks that were read: a writer that marked a book after that
+            # (its relation change may be invisible to this rebuild) keeps it for the next pass.
+            DirtyBook.objects.filter(book_id__in=book_ids, marked_at__lte=max(marks.values())).delete()
+        processed += len(book_ids)
+        invalidate()
+
+
+def annotate_relation_state(queryset, user):
+    # One LEFT JOIN on the unique (user, book) index instead of a relation lookup per book.
+    return queryset.annotate(
+        current_user_relation=FilteredRelation('userbookrelation', condition=Q(userbookrelation__user=user)),
+        relation_like=Coalesce('current_user_relation__like', Value(False)),
+        relation_in_bookmarks=Coalesce('current_user_relation__in_bookmarks', Value(False)),
+        relation_rate=F('current_user_relation__rate'),
+    )
+
+
+def _relation_subquery(aggregate, **filters):
+    relations = UserBookRelation.objects.filter(book=OuterRef('pk'), **filters).order_by()
+    return Coalesce(Subquery(relations.values('book').annotate(value=aggregate).values('value')), Value(0))
+
+
+def _relation_count(**filters):
+    return _relation_subquery(Count('pk'), **filters)
+
+
+def _rate_counts():
+    return {field: _relation_count(rate=rate) for rate, field in RATE_COUNT_FIELDS.items()}
+
+
+def rebuild_counters(books=None):
+    if books is None:
+        books = Book.objects.all()
+    updated = books.update(likes_count=_relation_count(like=True),
+                           bookmarks_count=_relation_count(in_bookmarks=True),
+                           **_rate_counts(),
+                           updated_at=timezone.now())
+    invalidate()
+    return updated
+
+
+def rebuild_aggregates(books):
+    rating_sum = _relation_subquery(Sum('rate'), rate__isnull=False)
+    rating_count = _relation_count(rate__isnull=False)
+    updated = books.update(likes_count=_relation_count(like=True),
+                           bookmarks_count=_relation_count(in_bookmarks=True),
+                           rating_sum=rating_sum,
+                           rating_count=rating_count,
+                           rating=Cast(rating_sum, FloatField()) / NullIf(rating_count, Value(0)),
+                           **_rate_counts(),
+                           updated_at=timezone.now())
+    invalidate()
+    return updated
+
+
+def find_rating_mismatches(books=None):
+    if books is None:
+        books = Book.objects.all()
+    books = books.annotate(actual_sum=Coalesce(Sum('userbookrelation__rate'), 0),
+                           actual_count=Count('userbookrelation__rate'))
+    return [book for book in books.order_by('pk')
+            if (book.rating_sum, book.rating_count) != (book.actual_sum, book.actual_count)]
@@ -0,0 +1,88 @@
+import json
+import platform
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from book.benchmarks.data import seed_catalog, throwaway_database
+from book.benchmarks.scenarios import SCENARIOS, Context, run_scenario
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic catalog in a throwaway test database and run API scenarios in-process '
+            'through the real URL routes, reporting throughput, latency percentiles and SQL queries per scenario')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--books', type=int, default=5000)
+        parser.add_argument('--relations-per-user', type=int, default=30)
+        parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent of book and user popularity')
+        parser.add_argument('--requests', type=int, default=500, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as source:
+                    baseline = json.load(source)['scenarios']
+            except (OSError, ValueError, KeyError) as exc:
+                raise CommandError(f'Cannot read baseline: {exc}')
+
+        results = {
+            'meta': {
+                'vendor': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'response_cache': settings.BOOK_RESPONSE_CACHE and settings.BOOK_RESPONSE_CACHE['BACKEND'],
+                'write_behind': settings.BOOK_AGGREGATES_WRITE_BEHIND,
+                **{name: options[name]
+                   for name in ('users', 'books', 'relations_per_user', 'skew', 'requests', 'seed')},
+            },
+            'scenarios': {},
+        }
+
+        # Seeded and written for real, so each request commits (and its atomic blocks are real
+        # transactions, not savepoints) as in production; the database is dropped afterwards.
+        # Replicas would still point at the configured database, so reads stay on the primary.
+        with throwaway_database(), override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                                                     BOOK_READ_REPLICAS=[]):
+            started = time.perf_counter()
+            data = seed_catalog(options['users'], options['books'], options['relations_per_user'],
+                                options['skew'], options['seed'])
+            self.stdout.write(f'Seeded {options["users"]} users, {options["books"]} books, '
+                              f'{data["relations"]} relations in {time.perf_counter() - started:.1f}s')
+
+            ctx = Context(data, seed=options['seed'])
+            self.stdout.write(f'{"scenario":>14} {"rps":>8} {"p50 ms":>8} {"p99 ms":>8} {"queries":>8} '
+                              f'{"errors":>7}')
+            for name in options['scenarios']:
+                run_scenario(ctx, SCENARIOS[name], options['warmup'])
+                result = results['scenarios'][name] = run_scenario(ctx, SCENARIOS[name], options['requests'])
+                self.stdout.write(f'{name:>14} {result["rps"]:>8.1f} {result["latency_ms"]["p50"]:>8.2f} '
+                                  f'{result["latency_ms"]["p99"]:>8.2f} {result["queries"]["mean"]:>8.2f} '
+                                  f'{result["errors"]:>7}{self.compare(baseline, name, result)}')
+
+        if options['output']:
+            with open(options['output'], 'w') as target:
+                json.dump(results, target, indent=2, sort_keys=True)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    def compare(self, baseline, name, result):
+        if not baseline or name not in baseline:
+            return ''
+        before = baseline[name]
+        rps = (result['rps'] / before['rps'] - 1) * 100 if before['rps'] else 0
+        before_p99 = before['latency_ms']['p99']
+        p99 = (result['latency_ms']['p99'] / before_p99 - 1) * 100 if before_p99 else 0
+        queries = result['queries']['mean'] - before['queries']['mean']
+        return f'  vs baseline: rps {rps:+.1f}%, p99 {p99:+.1f}%, queries {queries:+.2f}'
@@ -0,0 +1,64 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+async def fetch(host, port, target):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f'GET {target} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+class Command(BaseCommand):
+    help = ('Measure requests per second and latency of a running server, e.g. the same URL served by '
+            '`gunicorn book_store.wsgi` and by `uvicorn book_store.asgi:application`')
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='e.g. http://127.0.0.1:8000/async/book/')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=100)
+
+    def handle(self, *args, **options):
+        for option in ('requests', 'concurrency'):
+            if options[option] < 1:
+                raise CommandError(f'--{option} must be at least 1.')
+        self.stdout.write(f'{"rps":>9} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7}  url')
+        for url in options['urls']:
+            parts = urlsplit(url)
+            if parts.scheme != 'http' or not parts.hostname:
+                raise CommandError(f'Only plain http:// URLs are supported, got "{url}".')
+            target = parts.path + (f'?{parts.query}' if parts.query else '')
+            rps, timings, errors = asyncio.run(self.run(parts.hostname, parts.port or 80, target, options))
+            p99 = statistics.quantiles(timings, n=100)[-1] if len(timings) > 1 else timings[0]
+            self.stdout.write(f'{rps:>9.1f} {statistics.median(timings):>8.2f} {p99:>8.2f} {errors:>7}  {url}')
+
+    async def run(self, host, port, target, options):
+        timings = []
+        errors = 0
+        pending = iter(range(options['requests']))
+
+        async def worker():
+            nonlocal errors
+            for _ in pending:
+                started = time.perf_counter()
+                try:
+                    status = await fetch(host, port, target)
+                except (OSError, IndexError, ValueError):
+                    # Refused or reset connections and missing or malformed status lines.
+                    status = None
+                timings.append((time.perf_counter() - started) * 1000)
+                if status != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(options['concurrency'])))
+        return len(timings) / (time.perf_counter() - started), timings, errors
@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from book.benchmarks.data import seed_catalog
+from book.benchmarks.renderers import available_formats, run_renderer_benchmark
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Compare encode/decode throughput and payload size of the JSON, orjson and MessagePack '
+            'renderers on book list responses')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000)
+        parser.add_argument('--sizes', nargs='+', type=int, default=[20, 100, 1000], help='Books per payload')
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        formats = available_formats()
+        self.stdout.write(f'Formats: {", ".join(formats)}')
+        try:
+            # The seeded catalog is rolled back, so the database is left untouched.
+            with transaction.atomic():
+                seed_catalog(users=max(10, options['books'] // 20), books=options['books'], relations_per_user=10,
+                             seed=options['seed'])
+                results = run_renderer_benchmark(options['sizes'], options['iterations'], formats)
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f'{"books":>6} {"format":>8} {"bytes":>9} {"size":>6} {"enc/s":>9} {"dec/s":>9} '
+                          f'{"enc MB/s":>9} {"dec MB/s":>9}')
+        for size, measurements in results.items():
+            json_bytes = measurements['json']['bytes']
+            for name, result in measurements.items():
+                self.stdout.write(f'{size:>6} {name:>8} {result["bytes"]:>9} {result["bytes"] / json_bytes:>6.2f} '
+                                  f'{result["encode_per_s"]:>9.0f} {result["decode_per_s"]:>9.0f} '
+                                  f'{result["encode_mb_s"]:>9.1f} {result["decode_mb_s"]:>9.1f}')
+
+        if options['output']:
+            with open(options['output'], 'w') as target:
+                json.dump(results, target, indent=2, sort_keys=True)
+            self.stdout.write(f'Results written to {options["output"]}')
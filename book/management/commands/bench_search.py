@@ -0,0 +1,61 @@
+import random
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from book.models import Book
+from book.search import FullTextSearchFilter
+from book.views import BookViewSet
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measure ?search= latency of full-text search against ILIKE for growing catalog sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000])
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--vocabulary', type=int, default=20000, help='Number of distinct words in titles')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))
+                 for _ in range(options['vocabulary'])]
+        factory = APIRequestFactory()
+        view = BookViewSet()
+        backends = [('fulltext', FullTextSearchFilter()), ('ilike', SearchFilter())]
+
+        self.stdout.write(f'{"books":>8} {"backend":>9} {"p50 ms":>8} {"p95 ms":>8}')
+        try:
+            with transaction.atomic():
+                seeded = 0
+                for size in sorted(options['sizes']):
+                    Book.objects.bulk_create(
+                        [Book(name=' '.join(rng.sample(words, 3)), price=rng.randint(1, 1000),
+                              author=' '.join(rng.sample(words, 2)).title()) for _ in range(size - seeded)],
+                        batch_size=5000,
+                    )
+                    seeded = size
+                    terms = [rng.choice(words)[:rng.randint(4, 6)] for _ in range(options['queries'])]
+                    for name, backend in backends:
+                        timings = []
+                        for term in terms:
+                            request = Request(factory.get('/', {'search': term}))
+                            started = time.perf_counter()
+                            list(backend.filter_queryset(request, Book.objects.all(), view).order_by('id')[:20])
+                            timings.append((time.perf_counter() - started) * 1000)
+                        p95 = statistics.quantiles(timings, n=20)[-1]
+                        self.stdout.write(f'{size:>8} {name:>9} {statistics.median(timings):>8.2f} {p95:>8.2f}')
+                raise Rollback
+        except Rollback:
+            pass
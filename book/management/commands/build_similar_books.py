@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from book.similarity import build_similar_books, update_similar_books
+
+
+class Command(BaseCommand):
+    help = 'Recompute "readers also liked" neighbors of books whose likes or rates changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild the neighbors of every book')
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Keep running, updating every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            if options['full']:
+                self.stdout.write(f'Built neighbors for {build_similar_books()} books')
+            else:
+                self.stdout.write(f'Updated neighbors of {update_similar_books()} books')
+            if options['interval'] is None:
+                return
+            time.sleep(max(0, options['interval'] - (time.monotonic() - started)))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from book.export import EXPORT_FORMATS, iter_export
+from book.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Stream the book catalog with likes, rating and owner name as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='ndjson')
+        parser.add_argument('--output', help='File to write to, stdout by default')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        chunks = iter_export(Book.objects.all(), options['format'], chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from book.importer import Importer
+
+
+class Command(BaseCommand):
+    help = 'Bulk import books (and optionally user-book relations) from CSV or NDJSON files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('books', help='CSV or NDJSON file with name, price, author and optional owner, id')
+        parser.add_argument('--relations', help='CSV or NDJSON file with user, book, like, in_bookmarks, rate')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Input format, guessed from the extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        importer = Importer(batch_size=options['batch_size'])
+
+        started = time.monotonic()
+        books = importer.import_books(importer.read_rows(options['books'], options['format']))
+        self.report('books', books, started)
+
+        if options['relations']:
+            started = time.monotonic()
+            relations = importer.import_relations(importer.read_rows(options['relations'], options['format']))
+            self.report('relations', relations, started)
+
+        started = time.monotonic()
+        importer.finish()
+        self.stdout.write(f'Updated aggregates of {len(importer.book_ids)} books in {time.monotonic() - started:.1f}s')
+
+        for line, errors in importer.errors:
+            self.stderr.write(f'line {line}: {errors}')
+        if importer.errors:
+            self.stderr.write(f'{len(importer.errors)} rows skipped')
+
+    def report(self, name, count, started):
+        elapsed = time.monotonic() - started
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f'Imported {count} {name} in {elapsed:.1f}s ({rate:.0f} rows/s)'))
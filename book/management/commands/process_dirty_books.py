@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from book.logic import flush_dirty_books
+
+
+class Command(BaseCommand):
+    help = 'Recompute aggregates of books queued by write-behind relation updates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Flush the queue once and exit')
+        parser.add_argument('--interval', type=float, default=settings.BOOK_AGGREGATES_MAX_STALENESS,
+                            help='Seconds between flushes, i.e. the maximum staleness of aggregates')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            processed = flush_dirty_books(batch_size=options['batch_size'])
+            if processed:
+                self.stdout.write(f'Recomputed aggregates for {processed} books')
+            if options['once']:
+                return
+            time.sleep(max(0, options['interval'] - (time.monotonic() - started)))
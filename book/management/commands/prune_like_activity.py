@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from book.leaderboard import prune_like_activity
+
+
+class Command(BaseCommand):
+    help = 'Delete like activity buckets older than the longest trending leaderboard window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.BOOK_TRENDING_MAX_DAYS)
+
+    def handle(self, *args, **options):
+        deleted = prune_like_activity(options['days'])
+        self.stdout.write(f'Deleted {deleted} like activity buckets')
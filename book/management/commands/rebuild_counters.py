@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from book.logic import rebuild_counters
+from book.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized likes_count, bookmarks_count and rate_<n>_count columns of books'
+
+    def add_arguments(self, parser):
+        parser.add_argument('book_ids', nargs='*', type=int, help='Only rebuild these books')
+
+    def handle(self, *args, **options):
+        books = Book.objects.all()
+        if options['book_ids']:
+            books = books.filter(pk__in=options['book_ids'])
+        updated = rebuild_counters(books)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt counters for {updated} books'))
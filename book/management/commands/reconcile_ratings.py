@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from book.logic import find_rating_mismatches, set_rating
+from book.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Compare the stored rating_sum/rating_count of books against a full recompute'
+
+    def add_arguments(self, parser):
+        parser.add_argument('book_ids', nargs='*', type=int, help='Only check these books')
+        parser.add_argument('--fix', action='store_true', help='Overwrite mismatching books with recomputed values')
+
+    def handle(self, *args, **options):
+        books = Book.objects.all()
+        if options['book_ids']:
+            books = books.filter(pk__in=options['book_ids'])
+
+        mismatches = find_rating_mismatches(books)
+        for book in mismatches:
+            self.stdout.write(f'{book}: stored {book.rating_sum}/{book.rating_count}, '
+                              f'actual {book.actual_sum}/{book.actual_count}')
+            if options['fix']:
+                set_rating(book)
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('All ratings are consistent'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {len(mismatches)} books'))
+        else:
+            raise CommandError(f'{len(mismatches)} books have inconsistent ratings')
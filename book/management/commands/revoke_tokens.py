@@ -0,0 +1,20 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from book.authentication import revoke_tokens
+
+
+class Command(BaseCommand):
+    help = 'Revoke every API token issued to the given users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='+')
+
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(username__in=options['usernames']))
+        missing = set(options['usernames']) - {user.username for user in users}
+        if missing:
+            raise CommandError(f'Unknown users: {", ".join(sorted(missing))}')
+        for user in users:
+            revoke_tokens(user)
+        self.stdout.write(self.style.SUCCESS(f'Revoked tokens of {len(users)} users'))
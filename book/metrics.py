@@ -0,0 +1,179 @@
+import asyncio
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+_current_request = ContextVar('book_metrics_request', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_wrapper(sender, connection, **kwargs):
+    # Installed once per connection instead of per request: the stats live in a context
+    # variable, which also follows sync_to_async into the thread running async-view queries.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def format_labels(labels):
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+class MetricsRegistry:
+    # Per process, like LRUResponseCache: Prometheus scrapes and sums every worker.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+            self.db_seconds = defaultdict(float)
+            self.response_bytes = defaultdict(int)
+
+    def observe(self, view, method, status, duration, stats, size):
+        with self._lock:
+            self.requests[view, method, status] += 1
+            self.latency[view, method].observe(duration)
+            self.queries[view, method].observe(stats.queries)
+            self.db_seconds[view, method] += stats.db_time
+            self.response_bytes[view, method] += size
+
+    def render(self):
+        lines = []
+        with self._lock:
+            lines += ['# HELP http_requests_total Requests by URL name, method and status.',
+                      '# TYPE http_requests_total counter']
+            for (view, method, status), value in sorted(self.requests.items()):
+                labels = format_labels({'view': view, 'method': method, 'status': status})
+                lines.append(f'http_requests_total{labels} {value}')
+            self._render_histogram(lines, 'http_request_duration_seconds', 'Request latency.', self.latency)
+            self._render_histogram(lines, 'http_request_db_queries', 'SQL queries per request.', self.queries)
+            self._render_counter(lines, 'http_request_db_duration_seconds_total', 'Time spent in SQL.', self.db_seconds)
+            self._render_counter(lines, 'http_response_size_bytes_total', 'Response body size.', self.response_bytes)
+        return '\n'.join(lines) + '\n'
+
+    def _render_counter(self, lines, name, help_text, values):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for (view, method), value in sorted(values.items()):
+            lines.append(f'{name}{format_labels({"view": view, "method": method})} {value}')
+
+    def _render_histogram(self, lines, name, help_text, histograms):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for (view, method), histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                labels = format_labels({'view': view, 'method': method, 'le': bound})
+                lines.append(f'{name}_bucket{labels} {cumulative}')
+            labels = format_labels({'view': view, 'method': method})
+            lines.append(f'{name}_sum{labels} {histogram.sum}')
+            lines.append(f'{name}_count{labels} {histogram.count}')
+
+
+registry = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    # Records requests per resolved URL name. Queries run while a streaming response
+    # is consumed happen after the middleware returns and are not counted.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Lets Django call this middleware without an extra sync_to_async hop.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        for connection in connections.all():
+            install_query_wrapper(None, connection)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _current_request.set(RequestStats())
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            self.observe(request, response, time.perf_counter() - started, _current_request.get())
+        finally:
+            _current_request.reset(token)
+        return response
+
+    async def __acall__(self, request):
+        token = _current_request.set(RequestStats())
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            self.observe(request, response, time.perf_counter() - started, _current_request.get())
+        finally:
+            _current_request.reset(token)
+        return response
+
+    def observe(self, request, response, duration, stats):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else '') or 'unmatched'
+        method = request.method if request.method in METHODS else 'other'
+        if response.streaming:
+            size = int(response.get('Content-Length', 0))
+        else:
+            size = len(response.content)
+        registry.observe(view, method, response.status_code, duration, stats, size)
+
+
+def metrics(request):
+    # Staff sessions, or scrapers with `Authorization: Bearer <BOOK_METRICS_TOKEN>`.
+    token = settings.BOOK_METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    if not (token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+            or request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,38 @@
+# Generated by Django 4.1 on 2022-08-24 18:40
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Book = apps.get_model('book', 'Book')
+    UserBookRelation = apps.get_model('book', 'UserBookRelation')
+
+    def relation_count(**filters):
+        relations = UserBookRelation.objects.filter(book=OuterRef('pk'), **filters).order_by()
+        return Coalesce(Subquery(relations.values('book').annotate(count=Count('pk')).values('count')), Value(0))
+
+    Book.objects.update(likes_count=relation_count(like=True),
+                        bookmarks_count=relation_count(in_bookmarks=True))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0013_book_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='bookmarks_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.1 on 2022-08-25 19:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_rating_totals(apps, schema_editor):
+    Book = apps.get_model('book', 'Book')
+    UserBookRelation = apps.get_model('book', 'UserBookRelation')
+
+    relations = UserBookRelation.objects.filter(book=OuterRef('pk'), rate__isnull=False).order_by().values('book')
+    Book.objects.update(
+        rating_sum=Coalesce(Subquery(relations.annotate(total=Sum('rate')).values('total')), Value(0)),
+        rating_count=Coalesce(Subquery(relations.annotate(count=Count('pk')).values('count')), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0014_book_likes_count_bookmarks_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_rating_totals, migrations.RunPython.noop),
+    ]
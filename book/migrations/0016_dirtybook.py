@@ -0,0 +1,20 @@
+# Generated by Django 4.1 on 2022-08-27 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0015_book_rating_sum_rating_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtyBook',
+            fields=[
+                ('book_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('marked_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
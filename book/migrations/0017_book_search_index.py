@@ -0,0 +1,56 @@
+# Generated by Django 4.1 on 2022-08-29 11:30
+
+from django.db import migrations
+
+FTS_TABLE = 'book_book_fts'
+SEARCH_CONFIG = 'simple'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "ALTER TABLE book_book ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A') || "
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(author, '')), 'B')) STORED"
+        )
+        schema_editor.execute('CREATE INDEX book_book_search_vector_gin ON book_book USING GIN (search_vector)')
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(name, author, content='book_book', content_rowid='id')"
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON book_book BEGIN '
+            f'INSERT INTO {FTS_TABLE}(rowid, name, author) VALUES (new.id, new.name, new.author); END'
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON book_book BEGIN '
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, author) VALUES ('delete', old.id, old.name, old.author); END"
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF name, author ON book_book BEGIN '
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, author) VALUES ('delete', old.id, old.name, old.author); "
+            f'INSERT INTO {FTS_TABLE}(rowid, name, author) VALUES (new.id, new.name, new.author); END'
+        )
+        schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE book_book DROP COLUMN search_vector')
+    elif vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0016_dirtybook'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
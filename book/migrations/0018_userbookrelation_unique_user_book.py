@@ -0,0 +1,49 @@
+# Generated by Django 4.1 on 2022-09-02 10:21
+
+from django.db import migrations, models
+from django.db.models import Count, FloatField, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def remove_duplicate_relations(apps, schema_editor):
+    Book = apps.get_model('book', 'Book')
+    UserBookRelation = apps.get_model('book', 'UserBookRelation')
+
+    duplicates = (UserBookRelation.objects.values('user', 'book').order_by()
+                  .annotate(keep=Min('id'), count=Count('id')).filter(count__gt=1))
+    book_ids = set()
+    for duplicate in duplicates:
+        UserBookRelation.objects.filter(user=duplicate['user'], book=duplicate['book']) \
+            .exclude(id=duplicate['keep']).delete()
+        book_ids.add(duplicate['book'])
+    if not book_ids:
+        return
+
+    def relation_aggregate(aggregate, **filters):
+        relations = UserBookRelation.objects.filter(book=OuterRef('pk'), **filters).order_by().values('book')
+        return Coalesce(Subquery(relations.annotate(value=aggregate).values('value')), Value(0))
+
+    rating_sum = relation_aggregate(Sum('rate'), rate__isnull=False)
+    rating_count = relation_aggregate(Count('id'), rate__isnull=False)
+    Book.objects.filter(pk__in=book_ids).update(
+        likes_count=relation_aggregate(Count('id'), like=True),
+        bookmarks_count=relation_aggregate(Count('id'), in_bookmarks=True),
+        rating_sum=rating_sum,
+        rating_count=rating_count,
+        rating=Cast(rating_sum, FloatField()) / NullIf(rating_count, Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0017_book_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_relations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userbookrelation',
+            constraint=models.UniqueConstraint(fields=('user', 'book'), name='unique_user_book_relation'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.1 on 2022-09-06 16:48
+
+from django.db import migrations, models
+import django.utils.timezone
+
+FTS_TABLE = 'book_book_fts'
+
+
+def restore_search_triggers(apps, schema_editor):
+    # SQLite rebuilds book_book for this migration and drops its full-text triggers.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for suffix in ('ai', 'ad', 'au'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+    schema_editor.execute(
+        f'CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON book_book BEGIN '
+        f'INSERT INTO {FTS_TABLE}(rowid, name, author) VALUES (new.id, new.name, new.author); END'
+    )
+    schema_editor.execute(
+        f'CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON book_book BEGIN '
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, author) "
+        f"VALUES ('delete', old.id, old.name, old.author); END"
+    )
+    schema_editor.execute(
+        f'CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF name, author ON book_book BEGIN '
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, author) VALUES ('delete', old.id, old.name, old.author); "
+        f'INSERT INTO {FTS_TABLE}(rowid, name, author) VALUES (new.id, new.name, new.author); END'
+    )
+    schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def create_catalog_state(apps, schema_editor):
+    apps.get_model('book', 'CatalogState').objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0018_userbookrelation_unique_user_book'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('books_deleted_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(create_catalog_state, migrations.RunPython.noop),
+    ]
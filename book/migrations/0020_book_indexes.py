@@ -0,0 +1,25 @@
+# Generated by Django 4.1 on 2022-09-08 15:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0019_book_updated_at_catalogstate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['price', 'id'], name='book_price_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['name', 'id'], name='book_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userbookrelation',
+            index=models.Index(fields=['book', 'like'], name='relation_book_like_idx'),
+        ),
+    ]
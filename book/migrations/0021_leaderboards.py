@@ -0,0 +1,38 @@
+# Generated by Django 4.1 on 2022-09-12 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0020_book_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookLikeActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_id', models.BigIntegerField()),
+                ('day', models.DateField()),
+                ('likes', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['rating', 'id'], name='book_rating_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['likes_count', 'id'], name='book_likes_count_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booklikeactivity',
+            index=models.Index(fields=['day', 'book_id', 'likes'], name='like_activity_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='booklikeactivity',
+            constraint=models.UniqueConstraint(fields=('book_id', 'day'), name='unique_book_like_activity_day'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.1 on 2022-09-15 11:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0021_leaderboards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogstate',
+            name='similarities_built_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.CreateModel(
+            name='BookNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_id', models.BigIntegerField()),
+                ('neighbor_id', models.BigIntegerField()),
+                ('score', models.FloatField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='bookneighbor',
+            index=models.Index(fields=['neighbor_id'], name='book_neighbor_neighbor_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookneighbor',
+            constraint=models.UniqueConstraint(fields=('book_id', 'neighbor_id'), name='unique_book_neighbor'),
+        ),
+    ]
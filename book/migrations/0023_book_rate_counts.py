@@ -0,0 +1,84 @@
+# Generated by Django 4.1 on 2022-09-19 10:14
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+RATES = range(6)
+FTS_TABLE = 'book_book_fts'
+
+
+def restore_search_triggers(apps, schema_editor):
+    # SQLite rebuilds book_book for this migration and drops its full-text triggers.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for suffix in ('ai', 'ad', 'au'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+    schema_editor.execute(
+        f'CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON book_book BEGIN '
+        f'INSERT INTO {FTS_TABLE}(rowid, name, author) VALUES (new.id, new.name, new.author); END'
+    )
+    schema_editor.execute(
+        f'CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON book_book BEGIN '
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, author) "
+        f"VALUES ('delete', old.id, old.name, old.author); END"
+    )
+    schema_editor.execute(
+        f'CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF name, author ON book_book BEGIN '
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, author) VALUES ('delete', old.id, old.name, old.author); "
+        f'INSERT INTO {FTS_TABLE}(rowid, name, author) VALUES (new.id, new.name, new.author); END'
+    )
+    schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def fill_rate_counts(apps, schema_editor):
+    Book = apps.get_model('book', 'Book')
+    UserBookRelation = apps.get_model('book', 'UserBookRelation')
+
+    def rate_count(rate):
+        relations = UserBookRelation.objects.filter(book=OuterRef('pk'), rate=rate).order_by()
+        return Coalesce(Subquery(relations.values('book').annotate(value=Count('pk')).values('value')), Value(0))
+
+    Book.objects.update(**{f'rate_{rate}_count': rate_count(rate) for rate in RATES})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0022_similar_books'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='rate_0_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rate_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rate_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rate_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rate_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rate_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(fill_rate_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1 on 2022-09-21 10:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('book', '0023_book_rate_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenGeneration',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='token_generation', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('generation', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
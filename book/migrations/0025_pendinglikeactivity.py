@@ -0,0 +1,22 @@
+# Generated by Django 4.1 on 2022-09-23 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0024_token_generation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingLikeActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_id', models.BigIntegerField()),
+                ('day', models.DateField()),
+                ('likes', models.IntegerField()),
+            ],
+        ),
+    ]
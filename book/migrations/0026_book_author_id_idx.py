@@ -0,0 +1,17 @@
+# Generated by Django 4.1 on 2022-09-23 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0025_pendinglikeactivity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author', 'id'], name='book_author_id_idx'),
+        ),
+    ]
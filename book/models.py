@@ -1,6 +1,9 @@
 from django.contrib.auth.models import User
 from django.core.validators import MaxValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
 
 
 class Book(models.Model):
@@ -10,11 +13,45 @@ class Book(models.Model):
     owner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='own_books')
     readers = models.ManyToManyField(User, through='UserBookRelation', related_name='books')
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=None, null=True)
+    likes_count = models.PositiveIntegerField(default=0)
+    bookmarks_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    # Rates per RATE_CHOICES value, kept next to rating_sum/rating_count (see RATE_COUNT_FIELDS).
+    rate_0_count = models.PositiveIntegerField(default=0)
+    rate_1_count = models.PositiveIntegerField(default=0)
+    rate_2_count = models.PositiveIntegerField(default=0)
+    rate_3_count = models.PositiveIntegerField(default=0)
+    rate_4_count = models.PositiveIntegerField(default=0)
+    rate_5_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        # Keyset pagination orders by (field, id), so `?price=` and `?ordering=` walk these.
+        indexes = [
+            models.Index(fields=['price', 'id'], name='book_price_id_idx'),
+            models.Index(fields=['name', 'id'], name='book_name_id_idx'),
+            # `?author=` and the author facet, which groups on it.
+            models.Index(fields=['author', 'id'], name='book_author_id_idx'),
+            # Leaderboards read these from the top down, so a lookup touches only `limit` rows.
+            models.Index(fields=['rating', 'id'], name='book_rating_id_idx'),
+            models.Index(fields=['likes_count', 'id'], name='book_likes_count_id_idx'),
+        ]
 
     def __str__(self):
         return f'{self.id}: {self.name}'
 
 
+class CatalogState(models.Model):
+    # Single row; deletions leave no updated_at behind, so they are recorded here.
+    books_deleted_at = models.DateTimeField(null=True)
+    # Start of the last BookNeighbor build; workers reload their similarity index when it moves.
+    similarities_built_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f'books deleted at {self.books_deleted_at}'
+
+
 class UserBookRelation(models.Model):
     RATE_CHOICES = (
         (0, 'Bad'),
@@ -31,17 +68,154 @@ class UserBookRelation(models.Model):
     in_bookmarks = models.BooleanField(default=False)
     rate = models.PositiveSmallIntegerField(choices=RATE_CHOICES, null=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'book'], name='unique_user_book_relation'),
+        ]
+        indexes = [
+            models.Index(fields=['book', 'like'], name='relation_book_like_idx'),
+        ]
+
     def __str__(self):
         return f'{self.user.username}: {self.book.name} RATE: {self.rate}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        # save() takes its counter deltas from the values last read from the database.
+        names = fields or [field.attname for field in self._meta.concrete_fields]
+        self._loaded_values = dict(getattr(self, '_loaded_values', {}),
+                                   **{name: getattr(self, name) for name in names})
+
     def save(self, *args, **kwargs):
-        from book.logic import set_rating
+        from book.logic import record_relation_change
+
+        loaded = getattr(self, '_loaded_values', {})
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            record_relation_change(self.book_id,
+                                   likes=int(self.like) - int(loaded.get('like', False)),
+                                   bookmarks=int(self.in_bookmarks) - int(loaded.get('in_bookmarks', False)),
+                                   old_rate=loaded.get('rate'),
+                                   new_rate=self.rate)
+
+        self._loaded_values = {'like': self.like, 'in_bookmarks': self.in_bookmarks, 'rate': self.rate}
+
+
+RATE_COUNT_FIELDS = {rate: f'rate_{rate}_count' for rate, _ in UserBookRelation.RATE_CHOICES}
+
+
+class DirtyBook(models.Model):
+    # Plain id instead of a foreign key: a book deleted while queued is just skipped by the worker.
+    book_id = models.BigIntegerField(primary_key=True)
+    marked_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.book_id}: {self.marked_at}'
+
+
+class BookLikeActivity(models.Model):
+    # Net likes per book and UTC day for the trending leaderboard; plain id like DirtyBook.
+    book_id = models.BigIntegerField()
+    day = models.DateField()
+    likes = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book_id', 'day'], name='unique_book_like_activity_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'book_id', 'likes'], name='like_activity_day_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.book_id} {self.day}: {self.likes}'
+
+
+class PendingLikeActivity(models.Model):
+    # Insert-only log of like deltas in write-behind mode, folded into BookLikeActivity by
+    # flush_dirty_books so that a burst of likes does not queue up on one bucket row.
+    book_id = models.BigIntegerField()
+    day = models.DateField()
+    likes = models.IntegerField()
+
+    def __str__(self):
+        return f'{self.book_id} {self.day}: {self.likes:+d}'
+
+
+class BookNeighbor(models.Model):
+    # Top BOOK_SIMILAR_TOP_K "readers also liked" books per book, maintained by book.similarity.
+    book_id = models.BigIntegerField()
+    neighbor_id = models.BigIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book_id', 'neighbor_id'], name='unique_book_neighbor'),
+        ]
+        indexes = [
+            models.Index(fields=['neighbor_id'], name='book_neighbor_neighbor_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.book_id} -> {self.neighbor_id}: {self.score:.3f}'
+
+
+class TokenGeneration(models.Model):
+    # Signed API tokens carry the generation they were issued in; bumping it revokes them all.
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='token_generation')
+    generation = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.user_id}: {self.generation}'
+
+
+def deleting(origin, model):
+    """Whether a delete started from `origin` (an instance or a queryset) is deleting `model` rows."""
+    return isinstance(origin, model) or (isinstance(origin, models.QuerySet) and origin.model is model)
+
+
+@receiver(post_delete, sender=UserBookRelation)
+def relation_deleted(sender, instance, origin=None, **kwargs):
+    from book.logic import record_relation_change
+
+    # A cascade from a book leaves nothing to update; one from a user is applied per book
+    # by user_deleted.
+    if deleting(origin, Book) or deleting(origin, User):
+        return
+    record_relation_change(instance.book_id, likes=-int(instance.like), bookmarks=-int(instance.in_bookmarks),
+                           old_rate=instance.rate)
+
+
+@receiver(pre_delete, sender=User)
+def collect_user_relations(sender, instance, **kwargs):
+    instance._deleted_likes = dict(UserBookRelation.objects.filter(user=instance).order_by()
+                                   .values('book_id').annotate(likes=models.Count('pk', filter=models.Q(like=True)))
+                                   .values_list('book_id', 'likes'))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    from book.cache import invalidate
+    from book.logic import record_like_activity, refresh_aggregates
 
-        creating = not self.pk
-        old_rating = self.rate
+    likes = getattr(instance, '_deleted_likes', {})
+    if not likes:
+        return
+    record_like_activity({book_id: -count for book_id, count in likes.items()})
+    refresh_aggregates(list(likes))
+    invalidate()
 
-        super().save(*args, **kwargs)
 
-        new_rating = self.rate
-        if old_rating != new_rating or creating:
-            set_rating(self.book)
\ No newline at end of file
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    CatalogState.objects.update_or_create(pk=1, defaults={'books_deleted_at': timezone.now()})
+    BookLikeActivity.objects.filter(book_id=instance.pk).delete()
+    PendingLikeActivity.objects.filter(book_id=instance.pk).delete()
+    BookNeighbor.objects.filter(models.Q(book_id=instance.pk) | models.Q(neighbor_id=instance.pk)).delete()
@@ -0,0 +1,115 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor, _reverse_ordering
+
+
+class KeysetPagination(CursorPagination):
+    # The cursor stores every ordering value of the boundary row (with `id` as
+    # tiebreak), so each page is a `WHERE (field, id) > (...) LIMIT n` query.
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('id',)
+    tiebreak = 'id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request, view)))
+
+    def get_page_queryset(self, queryset, request, view=None):
+        # Split from paginate_queryset so async views can evaluate the page themselves.
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            reverse, current_position = self.cursor.reverse, self.cursor.position
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(self._keyset_filter(queryset, current_position, reverse))
+
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        reverse = self.cursor is not None and self.cursor.reverse
+        current_position = self.cursor.position if self.cursor is not None else None
+
+        self.page = results[:self.page_size]
+        has_following = len(results) > len(self.page)
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = current_position is not None
+
+        self.next_position = self._get_position_from_instance(self.page[-1], self.ordering) if self.page else None
+        self.previous_position = self._get_position_from_instance(self.page[0], self.ordering) if self.page else None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        fields = [order.lstrip('-') for order in ordering]
+        if self.tiebreak not in fields:
+            direction = '-' if ordering and ordering[-1].startswith('-') else ''
+            ordering += (direction + self.tiebreak,)
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next or self.next_position is None:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.next_position))
+
+    def get_previous_link(self):
+        if not self.has_previous or self.previous_position is None:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.previous_position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field_name = order.lstrip('-')
+            attr = instance[field_name] if isinstance(instance, dict) else getattr(instance, field_name)
+            values.append(attr)
+        return json.dumps(values)
+
+    def _get_output_field(self, queryset, field_name):
+        if field_name in queryset.query.annotations:
+            return queryset.query.annotations[field_name].output_field
+        return queryset.model._meta.get_field(field_name)
+
+    def _keyset_filter(self, queryset, position, reverse):
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            values = [self._get_output_field(queryset, order.lstrip('-')).to_python(value)
+                      for order, value in zip(self.ordering, values)]
+        except (ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        # Lexicographic comparison: (a > x) OR (a = x AND b > y) OR ...
+        condition = Q()
+        equal = Q()
+        for order, value in zip(self.ordering, values):
+            field_name = order.lstrip('-')
+            lookup = '__lt' if order.startswith('-') != reverse else '__gt'
+            condition |= equal & Q(**{field_name + lookup: value})
+            equal &= Q(**{field_name: value})
+        return condition
@@ -0,0 +1,84 @@
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    # The output of JSONRenderer with the default COMPACT_JSON/UNICODE_JSON settings, apart
+    # from exponent notation of very large or small floats. Types orjson does not handle
+    # (Decimal, lazy strings) and datetimes, which DRF formats its own way, go through DRF's
+    # JSONEncoder. Falls back to JSONRenderer without orjson or when indenting.
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        if (orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context)
+                or not self.compact or self.ensure_ascii):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        encoder = self.encoder_class()
+        ret = orjson.dumps(data, default=encoder.default,
+                           option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+        # Same escaping as JSONRenderer, for JSON embedded in <script> tags.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class ORJSONParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            body = stream.read()
+            if encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+                body = body.decode(encoding)
+            return orjson.loads(body)
+        except (ValueError, UnicodeDecodeError) as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    available = msgpack is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encoders.JSONEncoder().default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+    available = msgpack is not None
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, TypeError) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
+
+
+class ContentNegotiation(DefaultContentNegotiation):
+    # Renderers and parsers whose optional library is not installed are skipped, so
+    # `Accept: application/msgpack` gets a 406 instead of a failing render.
+    def select_parser(self, request, parsers):
+        return super().select_parser(request, [parser for parser in parsers if getattr(parser, 'available', True)])
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderers = [renderer for renderer in renderers if getattr(renderer, 'available', True)]
+        return super().select_renderer(request, renderers, format_suffix)
@@ -0,0 +1,195 @@
+import asyncio
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# 0 when pointed at a primary (a local stand-in) or when every received WAL record is
+# replayed, so an idle primary does not look like growing lag.
+POSTGRES_LAG_SQL = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+'''
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+
+class RequestRouting:
+    __slots__ = ('replica_reads', 'used_replica', 'wrote')
+
+    def __init__(self):
+        self.replica_reads = False
+        self.used_replica = False
+        self.wrote = False
+
+
+_routing = ContextVar('book_request_routing', default=None)
+
+
+def replica_reads(view):
+    """Let GETs of a function view read from replicas; viewsets list theirs in `replica_actions`."""
+    view.replica_reads = True
+    return view
+
+
+def served_from_replica():
+    routing = _routing.get()
+    return routing is not None and routing.used_replica
+
+
+def record_write(execute, sql, params, many, context):
+    routing = _routing.get()
+    if routing is not None and not routing.wrote and sql.lstrip()[:6].upper().startswith(WRITE_STATEMENTS):
+        routing.wrote = True
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_write_wrapper(sender, connection, **kwargs):
+    if connection.alias == DEFAULT_DB_ALIAS and record_write not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_write)
+
+
+class ReplicaHealth:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked = {}
+
+    def reset(self):
+        with self._lock:
+            self._checked.clear()
+
+    def is_healthy(self, alias):
+        # Only the last result: the router also runs in async views, which must not query.
+        with self._lock:
+            checked = self._checked.get(alias)
+        return checked is not None and checked[1]
+
+    def refresh(self, aliases):
+        """Re-check the replicas whose result is missing or older than BOOK_REPLICA_CHECK_INTERVAL."""
+        now = time.monotonic()
+        with self._lock:
+            stale = [alias for alias in aliases if alias not in self._checked
+                     or now - self._checked[alias][0] >= settings.BOOK_REPLICA_CHECK_INTERVAL]
+        for alias in stale:
+            healthy = self.check(alias)
+            with self._lock:
+                self._checked[alias] = (now, healthy)
+
+    def check(self, alias):
+        try:
+            lag = self.measure_lag(alias)
+        except DatabaseError:
+            # Drop the broken connection so the next check reconnects.
+            connections[alias].close()
+            return False
+        return lag <= settings.BOOK_REPLICA_MAX_LAG
+
+    def measure_lag(self, alias):
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            if connection.vendor != 'postgresql':
+                cursor.execute('SELECT 1')
+                return 0.0
+            cursor.execute(POSTGRES_LAG_SQL)
+            return float(cursor.fetchone()[0])
+
+
+health = ReplicaHealth()
+
+
+class ReplicaRouter:
+    """
+    Sends reads of book models to a healthy replica from BOOK_READ_REPLICAS, but only inside
+    the read-only views ReplicaRoutingMiddleware picked. Writes, reads in a transaction,
+    sessions and users (a login writes them during a GET) and everything outside requests
+    (commands, workers, shell) use the primary.
+    """
+    replica_apps = ('book',)
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if (routing is None or not routing.replica_reads or model._meta.app_label not in self.replica_apps
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        replicas = [alias for alias in settings.BOOK_READ_REPLICAS if health.is_healthy(alias)]
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        routing.used_replica = True
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or Django would save an instance read from a replica back to it.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    # A client whose request wrote to the primary gets a cookie that pins its reads to the
+    # primary for BOOK_REPLICA_PIN_SECONDS, so it never reads its own write from a lagging replica.
+    pin_cookie = 'book_primary_pin'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        install_write_wrapper(None, connections[DEFAULT_DB_ALIAS])
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _routing.set(RequestRouting())
+        try:
+            response = self.get_response(request)
+            return self.pin(request, response, _routing.get())
+        finally:
+            _routing.reset(token)
+
+    async def __acall__(self, request):
+        token = _routing.set(RequestRouting())
+        try:
+            response = await self.get_response(request)
+            return self.pin(request, response, _routing.get())
+        finally:
+            _routing.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Sync, so under ASGI Django runs it in a thread and the health checks may query.
+        routing = _routing.get()
+        if routing is not None:
+            routing.replica_reads = self.use_replicas(request, view_func)
+            if routing.replica_reads:
+                health.refresh(settings.BOOK_READ_REPLICAS)
+
+    def use_replicas(self, request, view_func):
+        if (not settings.BOOK_READ_REPLICAS or request.method not in SAFE_METHODS
+                or self.pin_cookie in request.COOKIES):
+            return False
+        if getattr(view_func, 'replica_reads', False):
+            return True
+        # DRF viewsets: the action the method maps to must be one the viewset lists.
+        actions = getattr(view_func, 'actions', None) or {}
+        action = actions.get(request.method.lower(), actions.get('get') if request.method == 'HEAD' else None)
+        return action in getattr(getattr(view_func, 'cls', None), 'replica_actions', ())
+
+    def pin(self, request, response, routing):
+        if settings.BOOK_READ_REPLICAS and (request.method not in SAFE_METHODS or routing.wrote):
+            response.set_cookie(self.pin_cookie, '1', max_age=settings.BOOK_REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
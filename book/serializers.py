@@ -1,19 +1,119 @@
+from decimal import Decimal, ROUND_HALF_EVEN
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from rest_framework.serializers import ModelSerializer, SerializerMethodField, IntegerField, DecimalField, CharField
+from django.db.models import F
+from rest_framework.serializers import ModelSerializer, Serializer, SerializerMethodField, IntegerField, \
+    DecimalField, CharField, ValidationError
+
+from book.models import RATE_COUNT_FIELDS, Book, UserBookRelation
+
+
+def relation_state(like, in_bookmarks, rate):
+    return {'like': like, 'in_bookmarks': in_bookmarks, 'rate': rate}
 
-from book.models import Book, UserBookRelation
+
+def rating_histogram(counts):
+    # {"0": n, ..., "5": n} from the rate_<n>_count columns, which RATE_COUNT_FIELDS names.
+    return {str(rate): counts[field] for rate, field in RATE_COUNT_FIELDS.items()}
 
 
 class BooksSerializer(ModelSerializer):
-    annotated_likes = IntegerField(read_only=True)
+    annotated_likes = IntegerField(source='likes_count', read_only=True)
     owner_name = CharField(source='owner.username', default="", read_only=True)
+    relation = SerializerMethodField()
 
     class Meta:
         model = Book
-        fields = ['id', 'name', 'price', 'author', 'annotated_likes', 'rating', 'owner_name']
+        fields = ['id', 'name', 'price', 'author', 'annotated_likes', 'rating', 'owner_name', 'relation']
+        extra_kwargs = {'price': {'min_value': 0}}
+
+    def get_relation(self, book):
+        # The current user's like/bookmark/rate, present when annotated by annotate_relation_state.
+        if not hasattr(book, 'relation_like'):
+            return None
+        return relation_state(book.relation_like, book.relation_in_bookmarks, book.relation_rate)
+
+
+class BookDetailSerializer(BooksSerializer):
+    rating_histogram = SerializerMethodField()
+
+    class Meta(BooksSerializer.Meta):
+        fields = BooksSerializer.Meta.fields + ['rating_histogram']
+
+    def get_rating_histogram(self, book):
+        return rating_histogram({field: getattr(book, field) for field in RATE_COUNT_FIELDS.values()})
+
+
+class BooksValuesSerializer:
+    # Read-only fast path for book lists: rows come from `.values()` with the likes and
+    # owner name resolved in SQL, and the output matches BooksSerializer key for key.
+    rating_quantum = Decimal('0.01')
+
+    def __init__(self, instance=None, many=False, **kwargs):
+        self.instance = instance
+        self.many = many
+
+    @classmethod
+    def prepare(cls, queryset, with_rating_histogram=False):
+        # Keep annotations such as `search_rank` so pagination can read them from the rows.
+        histogram = RATE_COUNT_FIELDS.values() if with_rating_histogram else ()
+        return queryset.values('id', 'name', 'price', 'author', 'rating', *histogram, *queryset.query.annotations,
+                               annotated_likes=F('likes_count'), owner_name=F('owner__username'))
+
+    @classmethod
+    def to_representation(cls, row):
+        rating = row['rating']
+        data = {
+            'id': row['id'],
+            'name': row['name'],
+            'price': row['price'],
+            'author': row['author'],
+            'annotated_likes': row['annotated_likes'],
+            'rating': None if rating is None else f'{rating.quantize(cls.rating_quantum, ROUND_HALF_EVEN):f}',
+            'owner_name': row['owner_name'] or '',
+            'relation': relation_state(row['relation_like'], row['relation_in_bookmarks'], row['relation_rate'])
+            if 'relation_like' in row else None,
+        }
+        if RATE_COUNT_FIELDS[0] in row:
+            data['rating_histogram'] = rating_histogram(row)
+        return data
+
+    @property
+    def data(self):
+        if self.many:
+            return [self.to_representation(row) for row in self.instance]
+        return self.to_representation(self.instance)
 
 
 class UserBookRelationSerializer(ModelSerializer):
     class Meta:
         model = UserBookRelation
-        fields = ['book', 'like', 'in_bookmarks', 'rate']
\ No newline at end of file
+        fields = ['book', 'like', 'in_bookmarks', 'rate']
+        # Writes take the book from the URL.
+        read_only_fields = ['book']
+
+
+class UserBookRelationBulkItemSerializer(ModelSerializer):
+    # Book ids are checked in one query for the whole batch instead of a lookup per item.
+    book = IntegerField(min_value=1)
+
+    class Meta:
+        model = UserBookRelation
+        fields = ['book', 'like', 'in_bookmarks', 'rate']
+
+
+class LeaderboardParamsSerializer(Serializer):
+    limit = IntegerField(min_value=1, max_value=100, default=10)
+    days = IntegerField(min_value=1, default=7)
+    min_ratings = IntegerField(min_value=1, default=1)
+
+    def validate_days(self, days):
+        # Older buckets are pruned, so longer windows would silently come up short.
+        if days > settings.BOOK_TRENDING_MAX_DAYS:
+            raise ValidationError(f'Ensure this value is less than or equal to {settings.BOOK_TRENDING_MAX_DAYS}.')
+        return days
+
+
+class SimilarParamsSerializer(Serializer):
+    limit = IntegerField(min_value=1, max_value=100, default=10)
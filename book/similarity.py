@@ -0,0 +1,223 @@
+import heapq
+import math
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from book.models import Book, BookNeighbor, CatalogState, UserBookRelation
+from book.serializers import BooksValuesSerializer
+
+# A relation counts as "read and liked" when it is a like or a rate of 4 or 5.
+POSITIVE_RATE = 4
+# Books updated this long before the previous run are looked at again, so a write
+# whose transaction committed after that run started is not missed.
+WATERMARK_SLACK = timedelta(minutes=1)
+CHUNK_SIZE = 500
+
+
+def positive_relations():
+    return UserBookRelation.objects.filter(Q(like=True) | Q(rate__gte=POSITIVE_RATE))
+
+
+def chunked(values, size=CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def cooccurrences(book_ids):
+    """
+    Rows of `(book_id, other_book_id, readers of both)` for the given books, ordered by
+    book_id. Users with more than BOOK_SIMILAR_MAX_USER_ITEMS positive relations are
+    skipped: they add a quadratic number of pairs and say little about either book.
+    """
+    readers = positive_relations().filter(book_id__in=book_ids).values('user_id')
+    users = (positive_relations().filter(user__in=readers).values('user_id')
+             .annotate(items=Count('id')).filter(items__lte=settings.BOOK_SIMILAR_MAX_USER_ITEMS)
+             .values('user_id'))
+    positive_sql, positive_params = positive_relations().values('user_id', 'book_id').query.sql_with_params()
+    users_sql, users_params = users.query.sql_with_params()
+    placeholders = ', '.join(['%s'] * len(book_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH positive AS ({positive_sql}), users AS ({users_sql}) '
+            f'SELECT a.book_id, b.book_id, COUNT(*) FROM positive a '
+            f'JOIN users u ON u.user_id = a.user_id '
+            f'JOIN positive b ON b.user_id = a.user_id AND b.book_id <> a.book_id '
+            f'WHERE a.book_id IN ({placeholders}) '
+            f'GROUP BY a.book_id, b.book_id ORDER BY a.book_id',
+            (*positive_params, *users_params, *book_ids),
+        )
+        return cursor.fetchall()
+
+
+def reader_counts(book_ids, counts):
+    missing = [book_id for book_id in book_ids if book_id not in counts]
+    for chunk in chunked(missing):
+        counts.update(positive_relations().filter(book_id__in=chunk).order_by()
+                      .values_list('book_id').annotate(readers=Count('id')))
+    return counts
+
+
+def compute_neighbors(book_ids, top_k):
+    """
+    Yield `(book_id, [(score, neighbor_id), ...])` with the top_k neighbors of each book
+    by cosine similarity of their reader sets: readers of both / sqrt(readers of a * readers of b).
+    """
+    counts = {}
+    for chunk in chunked(book_ids):
+        rows = cooccurrences(chunk)
+        reader_counts({other for _, other, _ in rows} | set(chunk), counts)
+        found = set()
+        for book_id, pairs in groupby(rows, key=itemgetter(0)):
+            found.add(book_id)
+            scored = ((both / math.sqrt(counts[book_id] * counts[other]), other) for _, other, both in pairs)
+            yield book_id, heapq.nlargest(top_k, scored)
+        for book_id in set(chunk) - found:
+            yield book_id, []
+
+
+def _mark_built(started):
+    CatalogState.objects.update_or_create(pk=1, defaults={'similarities_built_at': started})
+
+
+def build_similar_books(top_k=None):
+    """Recompute BookNeighbor for every book; returns the number of books with neighbors."""
+    top_k = top_k or settings.BOOK_SIMILAR_TOP_K
+    started = timezone.now()
+    book_ids = positive_relations().order_by('book_id').values_list('book_id', flat=True).distinct()
+    neighbors = [BookNeighbor(book_id=book_id, neighbor_id=other, score=score)
+                 for book_id, scored in compute_neighbors(book_ids, top_k) for score, other in scored]
+    with transaction.atomic():
+        BookNeighbor.objects.all().delete()
+        BookNeighbor.objects.bulk_create(neighbors, batch_size=1000)
+        _mark_built(started)
+    return len({neighbor.book_id for neighbor in neighbors})
+
+
+def update_similar_books(top_k=None):
+    """
+    Recompute the neighbors of books updated since the last run, which covers every
+    like or rate change, and mirror the new scores into their neighbors' lists.
+    Returns the number of books recomputed.
+
+    A neighbor list that loses an entry is not backfilled from books outside it, so a
+    periodic build_similar_books() keeps long-lived lists complete.
+    """
+    top_k = top_k or settings.BOOK_SIMILAR_TOP_K
+    built_at = CatalogState.objects.filter(pk=1).values_list('similarities_built_at', flat=True).first()
+    if built_at is None:
+        return build_similar_books(top_k)
+
+    started = timezone.now()
+    changed = list(Book.objects.filter(updated_at__gt=built_at - WATERMARK_SLACK).values_list('pk', flat=True))
+    scores = {}
+    for book_id, scored in compute_neighbors(changed, top_k):
+        for score, other in scored:
+            scores[book_id, other] = score
+            # Cosine similarity is symmetric.
+            scores.setdefault((other, book_id), score)
+
+    with transaction.atomic():
+        for chunk in chunked(changed):
+            BookNeighbor.objects.filter(Q(book_id__in=chunk) | Q(neighbor_id__in=chunk)).delete()
+        BookNeighbor.objects.bulk_create([BookNeighbor(book_id=book_id, neighbor_id=other, score=score)
+                                          for (book_id, other), score in scores.items()], batch_size=1000)
+        trim_neighbors({book_id for book_id, _ in scores}, top_k)
+        _mark_built(started)
+    return len(changed)
+
+
+def trim_neighbors(book_ids, top_k):
+    for chunk in chunked(book_ids):
+        rows = (BookNeighbor.objects.filter(book_id__in=chunk)
+                .order_by('book_id', '-score', 'neighbor_id').values_list('book_id', 'pk'))
+        extra = [pk for _, group in groupby(rows, key=itemgetter(0)) for _, pk in list(group)[top_k:]]
+        BookNeighbor.objects.filter(pk__in=extra).delete()
+
+
+class SimilarityIndex:
+    """
+    Every BookNeighbor row in four flat arrays (12 bytes per neighbor): the neighbors of
+    book_ids[i] are neighbor_ids[offsets[i]:offsets[i + 1]], best first, so a lookup is
+    one bisect and a slice.
+    """
+
+    def __init__(self, rows=()):
+        self.book_ids = array('q')
+        self.offsets = array('q', [0])
+        self.neighbor_ids = array('q')
+        self.scores = array('f')
+        for book_id, neighbors in groupby(rows, key=itemgetter(0)):
+            for _, neighbor_id, score in neighbors:
+                self.neighbor_ids.append(neighbor_id)
+                self.scores.append(score)
+            self.book_ids.append(book_id)
+            self.offsets.append(len(self.neighbor_ids))
+
+    @classmethod
+    def load(cls):
+        rows = BookNeighbor.objects.order_by('book_id', '-score', 'neighbor_id').values_list(
+            'book_id', 'neighbor_id', 'score')
+        return cls(rows.iterator(chunk_size=10000))
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    def neighbors(self, book_id, limit):
+        index = bisect_left(self.book_ids, book_id)
+        if index == len(self.book_ids) or self.book_ids[index] != book_id:
+            return []
+        start = self.offsets[index]
+        stop = min(self.offsets[index + 1], start + limit)
+        return list(zip(self.neighbor_ids[start:stop], self.scores[start:stop]))
+
+
+class SimilarityStore:
+    # Per process, like the response cache: each worker checks CatalogState at most every
+    # BOOK_SIMILAR_RELOAD_INTERVAL seconds and reloads the index when a build finished.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._index = None
+            self._built_at = None
+            self._checked_at = None
+
+    def get(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < settings.BOOK_SIMILAR_RELOAD_INTERVAL:
+            return self._index
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= settings.BOOK_SIMILAR_RELOAD_INTERVAL:
+                built_at = CatalogState.objects.filter(pk=1).values_list('similarities_built_at', flat=True).first()
+                if self._index is None or built_at != self._built_at:
+                    self._index = SimilarityIndex.load()
+                    self._built_at = built_at
+                self._checked_at = now
+            return self._index
+
+
+store = SimilarityStore()
+
+
+def similar_books(book_id, limit=10):
+    """Up to `limit` books similar to the given one, best first, or None if it does not exist."""
+    neighbors = store.get().neighbors(book_id, limit)
+    books = Book.objects.filter(pk__in=[book_id, *(pk for pk, _ in neighbors)])
+    books = {row['id']: row for row in BooksValuesSerializer.prepare(books)}
+    if book_id not in books:
+        return None
+    return [dict(BooksValuesSerializer.to_representation(books[pk]), similarity=round(score, 4))
+            for pk, score in neighbors if pk in books]
@@ -1,13 +1,16 @@
 import json
+from unittest import mock
 
 from django.contrib.auth.models import User
+from django.db import DatabaseError, IntegrityError, connection
 from django.db.models import Count, Case, When, Avg
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_204_NO_CONTENT, HTTP_403_FORBIDDEN, \
-    HTTP_400_BAD_REQUEST
+    HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
 
-from book.models import Book, UserBookRelation
+from book import logic
+from book.models import Book, BookLikeActivity, UserBookRelation
 from book.serializers import BooksSerializer
 
 
@@ -28,7 +31,7 @@ class BooksApiTestCase(APITestCase):
             annotated_likes=Count(Case(When(userbookrelation__like=True, then=1)))).order_by('id')
         serializer_data = BooksSerializer(books, many=True).data
 
-        self.assertEqual(serializer_data, resp.data)
+        self.assertEqual(serializer_data, resp.data['results'])
         self.assertEqual(HTTP_200_OK, resp.status_code)
         self.assertEqual(serializer_data[0]['rating'], '2.00')
         self.assertEqual(serializer_data[0]['annotated_likes'], 1)
@@ -40,7 +43,7 @@ class BooksApiTestCase(APITestCase):
             annotated_likes=Count(Case(When(userbookrelation__like=True, then=1))))
         serializer_data = BooksSerializer(books, many=True).data
 
-        self.assertEqual(serializer_data, resp.data)
+        self.assertEqual(serializer_data, resp.data['results'])
         self.assertEqual(HTTP_200_OK, resp.status_code)
 
     def test_filter_negative(self):
@@ -48,7 +51,7 @@ class BooksApiTestCase(APITestCase):
         resp = self.client.get(url, data={'price': 99999999})
         serializer_data = BooksSerializer(many=True).data
 
-        self.assertEqual(serializer_data, resp.data)
+        self.assertEqual(serializer_data, resp.data['results'])
         self.assertEqual(HTTP_200_OK, resp.status_code)
 
     def test_search(self):
@@ -57,7 +60,7 @@ class BooksApiTestCase(APITestCase):
         books = Book.objects.filter(id__in=[self.book1.id, self.book3.id]).annotate(
             annotated_likes=Count(Case(When(userbookrelation__like=True, then=1)))).order_by('id')
         serializer_data = BooksSerializer(books, many=True).data
-        self.assertEqual(serializer_data, resp.data)
+        self.assertEqual(serializer_data, resp.data['results'])
         self.assertEqual(HTTP_200_OK, resp.status_code)
 
     def test_search_negative(self):
@@ -65,7 +68,7 @@ class BooksApiTestCase(APITestCase):
         resp = self.client.get(url, data={'search': 'Negative'})
         serializer_data = BooksSerializer(many=True).data
 
-        self.assertEqual(serializer_data, resp.data)
+        self.assertEqual(serializer_data, resp.data['results'])
         self.assertEqual(HTTP_200_OK, resp.status_code)
 
     def test_ordering(self):
@@ -75,7 +78,7 @@ class BooksApiTestCase(APITestCase):
             annotated_likes=Count(Case(When(userbookrelation__like=True, then=1)))).order_by('price')
         serializer_data = BooksSerializer(books, many=True).data
 
-        self.assertEqual(serializer_data, resp.data)
+        self.assertEqual(serializer_data, resp.data['results'])
         self.assertEqual(HTTP_200_OK, resp.status_code)
 
     def test_ordering_negative(self):
@@ -85,7 +88,7 @@ class BooksApiTestCase(APITestCase):
             annotated_likes=Count(Case(When(userbookrelation__like=True, then=1)))).order_by('-price')
         serializer_data = BooksSerializer(books, many=True).data
 
-        self.assertEqual(serializer_data, resp.data)
+        self.assertEqual(serializer_data, resp.data['results'])
         self.assertEqual(HTTP_200_OK, resp.status_code)
 
     def test_create(self):
@@ -183,6 +186,126 @@ class BooksApiTestCase(APITestCase):
         self.assertEqual(3, Book.objects.all().count())
 
 
+class BooksPaginationTestCase(APITestCase):
+    def setUp(self):
+        self.books = [Book.objects.create(name=f'Test book {i}', price=100 + i % 3, author='Author')
+                      for i in range(7)]
+
+    def collect(self, params):
+        url = reverse('book-list')
+        resp = self.client.get(url, data=params)
+        ids = [book['id'] for book in resp.data['results']]
+        while resp.data['next']:
+            resp = self.client.get(resp.data['next'])
+            self.assertEqual(HTTP_200_OK, resp.status_code)
+            ids += [book['id'] for book in resp.data['results']]
+        return ids
+
+    def test_pages(self):
+        ids = self.collect({'page_size': 3})
+        self.assertEqual([book.id for book in self.books], ids)
+
+    def test_pages_ordering_tiebreak(self):
+        ids = self.collect({'page_size': 2, 'ordering': '-price'})
+        expected = Book.objects.order_by('-price', '-id').values_list('id', flat=True)
+        self.assertEqual(list(expected), ids)
+
+    def test_previous(self):
+        url = reverse('book-list')
+        first = self.client.get(url, data={'page_size': 3, 'ordering': 'price'})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(first.data['results'], back.data['results'])
+        self.assertIsNone(first.data['previous'])
+
+    def test_page_size_cap(self):
+        Book.objects.bulk_create([Book(name='Bulk', price=1, author='Author') for _ in range(150)])
+        url = reverse('book-list')
+        resp = self.client.get(url, data={'page_size': 1000})
+        self.assertEqual(100, len(resp.data['results']))
+
+    def test_invalid_cursor(self):
+        url = reverse('book-list')
+        resp = self.client.get(url, data={'cursor': 'garbage'})
+        self.assertEqual(HTTP_404_NOT_FOUND, resp.status_code)
+
+
+class BooksRelationStateTestCase(APITestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='test_user1')
+        self.user2 = User.objects.create(username='test_user2')
+        self.book1 = Book.objects.create(name='Test book 1', price=100, author='Author 1')
+        self.book2 = Book.objects.create(name='Test book 2', price=150, author='Author 2')
+        self.book3 = Book.objects.create(name='Test book 3', price=200, author='Author 3')
+        UserBookRelation.objects.create(user=self.user1, book=self.book1, like=True, rate=2)
+        UserBookRelation.objects.create(user=self.user1, book=self.book2, in_bookmarks=True)
+        UserBookRelation.objects.create(user=self.user1, book=self.book3)
+        UserBookRelation.objects.create(user=self.user2, book=self.book3, like=True)
+
+    def relations(self, resp):
+        return {book['id']: book['relation'] for book in resp.data['results']}
+
+    def test_list(self):
+        self.client.force_login(self.user1)
+        resp = self.client.get(reverse('book-list'))
+        self.assertEqual({
+            self.book1.id: {'like': True, 'in_bookmarks': False, 'rate': 2},
+            self.book2.id: {'like': False, 'in_bookmarks': True, 'rate': None},
+            self.book3.id: {'like': False, 'in_bookmarks': False, 'rate': None},
+        }, self.relations(resp))
+
+    def test_list_anonymous(self):
+        resp = self.client.get(reverse('book-list'))
+        self.assertEqual({self.book1.id: None, self.book2.id: None, self.book3.id: None}, self.relations(resp))
+
+    def test_list_no_relation_rows_created(self):
+        self.client.force_login(self.user2)
+        resp = self.client.get(reverse('book-list'))
+        self.assertEqual({'like': False, 'in_bookmarks': False, 'rate': None}, self.relations(resp)[self.book1.id])
+        self.assertEqual(4, UserBookRelation.objects.count())
+
+    def test_detail(self):
+        self.client.force_login(self.user1)
+        resp = self.client.get(reverse('book-detail', args=(self.book1.id,)))
+        self.assertEqual({'like': True, 'in_bookmarks': False, 'rate': 2}, resp.data['relation'])
+
+    def test_cached_per_user(self):
+        url = reverse('book-detail', args=(self.book3.id,))
+        self.client.force_login(self.user1)
+        first = self.client.get(url)
+        self.client.force_login(self.user2)
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(HTTP_200_OK, second.status_code)
+        self.assertEqual({'like': True, 'in_bookmarks': False, 'rate': None}, second.data['relation'])
+
+    def test_state_after_like(self):
+        self.client.force_login(self.user1)
+        self.client.get(reverse('book-list'))
+        self.client.patch(reverse('userbookrelation-detail', args=(self.book3.id,)),
+                          data=json.dumps({'like': True}), content_type='application/json')
+        resp = self.client.get(reverse('book-list'))
+        self.assertTrue(self.relations(resp)[self.book3.id]['like'])
+
+    def test_mine(self):
+        self.client.force_login(self.user1)
+        resp = self.client.get(reverse('book-mine'))
+        self.assertEqual(HTTP_200_OK, resp.status_code)
+        self.assertEqual([self.book1.id, self.book2.id], [book['id'] for book in resp.data['results']])
+        self.assertEqual({'like': True, 'in_bookmarks': False, 'rate': 2}, resp.data['results'][0]['relation'])
+
+    def test_mine_pages(self):
+        self.client.force_login(self.user1)
+        resp = self.client.get(reverse('book-mine'), data={'page_size': 1, 'ordering': '-price'})
+        self.assertEqual([self.book2.id], [book['id'] for book in resp.data['results']])
+        resp = self.client.get(resp.data['next'])
+        self.assertEqual([self.book1.id], [book['id'] for book in resp.data['results']])
+        self.assertIsNone(resp.data['next'])
+
+    def test_mine_no_login(self):
+        resp = self.client.get(reverse('book-mine'))
+        self.assertEqual(HTTP_403_FORBIDDEN, resp.status_code)
+
+
 class BooksRelationTestCase(APITestCase):
     def setUp(self):
         self.user1 = User.objects.create(username='test_user1')
@@ -228,3 +351,132 @@ class BooksRelationTestCase(APITestCase):
         resp = self.client.patch(url, data=json_data, content_type='application/json')
         self.book1.refresh_from_db()
         self.assertEqual(HTTP_400_BAD_REQUEST, resp.status_code)
+
+    def test_rate_aggregates(self):
+        url = reverse('userbookrelation-detail', args=(self.book1.id,))
+        UserBookRelation.objects.create(user=self.user1, book=self.book1, rate=5)
+        self.client.force_login(self.user2)
+        self.client.patch(url, data=json.dumps({'rate': 2, 'like': True}), content_type='application/json')
+        self.client.patch(url, data=json.dumps({'rate': 3}), content_type='application/json')
+        self.book1.refresh_from_db()
+        self.assertEqual((1, 8, 2, '4.00'), (self.book1.likes_count, self.book1.rating_sum,
+                                             self.book1.rating_count, str(self.book1.rating)))
+
+    def test_patch_queries(self):
+        url = reverse('userbookrelation-detail', args=(self.book1.id,))
+        self.client.force_login(self.user2)
+        self.client.patch(url, data=json.dumps({'rate': 2}), content_type='application/json')
+        # session + user, savepoint, upsert returning the old values, aggregate update, release;
+        # SQLite reads the old values first
+        queries = 6 if connection.vendor == 'postgresql' else 7
+        with self.assertNumQueries(queries):
+            resp = self.client.patch(url, data=json.dumps({'rate': 4}), content_type='application/json')
+        self.assertEqual({'book': self.book1.id, 'like': False, 'in_bookmarks': False, 'rate': 4}, resp.data)
+        # the rate did not change, so the book is not touched
+        with self.assertNumQueries(queries - 1):
+            self.client.patch(url, data=json.dumps({'rate': 4}), content_type='application/json')
+        self.assertEqual(1, UserBookRelation.objects.filter(user=self.user2, book=self.book1).count())
+
+    def test_patch_is_atomic(self):
+        url = reverse('userbookrelation-detail', args=(self.book1.id,))
+        self.client.force_login(self.user2)
+        with mock.patch.object(logic, 'update_aggregates', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.client.patch(url, data=json.dumps({'like': True}), content_type='application/json')
+        self.assertFalse(UserBookRelation.objects.exists())
+        self.assertFalse(BookLikeActivity.objects.exists())
+
+    def test_not_existing_book(self):
+        url = reverse('userbookrelation-detail', args=(999999,))
+        self.client.force_login(self.user2)
+        resp = self.client.patch(url, data=json.dumps({'like': True}), content_type='application/json')
+        self.assertEqual(HTTP_404_NOT_FOUND, resp.status_code)
+        self.assertFalse(UserBookRelation.objects.exists())
+
+    def test_put_takes_book_from_url(self):
+        url = reverse('userbookrelation-detail', args=(self.book1.id,))
+        self.client.force_login(self.user2)
+        data = {'book': self.book2.id, 'like': True, 'in_bookmarks': False, 'rate': None}
+        resp = self.client.put(url, data=json.dumps(data), content_type='application/json')
+        self.assertEqual(HTTP_200_OK, resp.status_code)
+        self.assertEqual(self.book1.id, resp.data['book'])
+        self.assertTrue(UserBookRelation.objects.get(user=self.user2, book=self.book1).like)
+        self.assertFalse(UserBookRelation.objects.filter(book=self.book2).exists())
+
+    def test_unique(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book1)
+        with self.assertRaises(IntegrityError):
+            UserBookRelation.objects.create(user=self.user1, book=self.book1)
+
+
+class BooksRelationBulkTestCase(APITestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='test_user1')
+        self.user2 = User.objects.create(username='test_user2')
+        self.book1 = Book.objects.create(name='Test book 1', price=100, author='Author 1')
+        self.book2 = Book.objects.create(name='Test book 2', price=150, author='Author 1')
+        self.book3 = Book.objects.create(name='Test book 3', price=200, author='Author 2')
+        UserBookRelation.objects.create(user=self.user1, book=self.book1, like=True, rate=4)
+        UserBookRelation.objects.create(user=self.user2, book=self.book1, rate=2)
+
+    def test_bulk(self):
+        url = reverse('userbookrelation-bulk')
+        data = [
+            {'book': self.book1.id, 'rate': 5, 'like': False},
+            {'book': self.book2.id, 'like': True, 'in_bookmarks': True, 'rate': 3},
+            {'book': self.book3.id, 'rate': 11},
+            {'book': self.book2.id, 'like': False},
+            {'book': 999999, 'like': True},
+        ]
+        self.client.force_login(self.user1)
+        with self.assertNumQueries(10):
+            resp = self.client.post(url, data=json.dumps(data), content_type='application/json')
+
+        self.assertEqual(HTTP_200_OK, resp.status_code)
+        self.assertEqual(['updated', 'created', 'error', 'error', 'error'],
+                         [item['status'] for item in resp.data])
+        self.assertEqual({'book': self.book2.id, 'like': True, 'in_bookmarks': True, 'rate': 3, 'status': 'created'},
+                         resp.data[1])
+        self.assertIn('rate', resp.data[2]['errors'])
+
+        self.book1.refresh_from_db()
+        self.book2.refresh_from_db()
+        self.assertEqual((0, '3.50'), (self.book1.likes_count, str(self.book1.rating)))
+        self.assertEqual((1, 1, '3.00'), (self.book2.likes_count, self.book2.bookmarks_count, str(self.book2.rating)))
+
+    def test_concurrent_create(self):
+        # Another request creates the relation between our read and our insert.
+        def load_relations(user, book_ids):
+            if not UserBookRelation.objects.filter(user=user, book=self.book2).exists():
+                UserBookRelation.objects.create(user=user, book=self.book2, like=True)
+                return {}
+            return real_load_relations(user, book_ids)
+
+        real_load_relations = logic.load_relations
+        self.client.force_login(self.user1)
+        with mock.patch('book.logic.load_relations', side_effect=load_relations):
+            resp = self.client.post(reverse('userbookrelation-bulk'), content_type='application/json',
+                                    data=json.dumps([{'book': self.book2.id, 'like': True, 'rate': 3}]))
+        self.assertEqual(HTTP_200_OK, resp.status_code)
+        self.assertEqual('updated', resp.data[0]['status'])
+        self.book2.refresh_from_db()
+        self.assertEqual((1, '3.00'), (self.book2.likes_count, str(self.book2.rating)))
+        self.assertEqual(1, BookLikeActivity.objects.get(book_id=self.book2.id).likes)
+
+    def test_unchanged(self):
+        url = reverse('userbookrelation-bulk')
+        data = [{'book': self.book1.id, 'like': True, 'rate': 4}]
+        self.client.force_login(self.user1)
+        resp = self.client.post(url, data=json.dumps(data), content_type='application/json')
+        self.assertEqual('unchanged', resp.data[0]['status'])
+
+    def test_not_list(self):
+        url = reverse('userbookrelation-bulk')
+        self.client.force_login(self.user1)
+        resp = self.client.post(url, data=json.dumps({'book': self.book1.id}), content_type='application/json')
+        self.assertEqual(HTTP_400_BAD_REQUEST, resp.status_code)
+
+    def test_no_login(self):
+        url = reverse('userbookrelation-bulk')
+        resp = self.client.post(url, data=json.dumps([]), content_type='application/json')
+        self.assertEqual(HTTP_403_FORBIDDEN, resp.status_code)
@@ -0,0 +1,124 @@
+import json
+
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_403_FORBIDDEN, HTTP_404_NOT_FOUND, \
+    HTTP_405_METHOD_NOT_ALLOWED
+from rest_framework.test import APIClient, APITestCase
+
+from book.authentication import issue_token
+
+from book.models import Book, UserBookRelation
+
+
+class AsyncViewsTestCase(APITestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='test_user1')
+        self.book1 = Book.objects.create(name='Test book 1', price=100, author='Author 1', owner=self.user1)
+        self.book2 = Book.objects.create(name='Test book 2', price=150, author='Author 2')
+        self.book3 = Book.objects.create(name='Test book Author 1', price=200, author='Author 2')
+        UserBookRelation.objects.create(user=self.user1, book=self.book1, like=True, rate=2)
+
+    def test_list_same_as_sync(self):
+        for params in [{}, {'ordering': '-price'}, {'search': 'Author 1'}, {'price': 150}, {'page_size': 2}]:
+            sync = self.client.get(reverse('book-list'), data=params)
+            resp = self.client.get(reverse('async-book-list'), data=params)
+            self.assertEqual(HTTP_200_OK, resp.status_code)
+            self.assertEqual(sync.json()['results'], resp.json()['results'])
+
+    def test_list_logged_in_same_as_sync(self):
+        self.client.force_login(self.user1)
+        sync = self.client.get(reverse('book-list'))
+        resp = self.client.get(reverse('async-book-list'))
+        self.assertEqual(sync.json()['results'], resp.json()['results'])
+        self.assertEqual({'like': True, 'in_bookmarks': False, 'rate': 2}, resp.json()['results'][0]['relation'])
+        sync = self.client.get(reverse('book-detail', args=(self.book1.id,)))
+        resp = self.client.get(reverse('async-book-detail', args=(self.book1.id,)))
+        self.assertEqual(sync.json(), resp.json())
+
+    def test_list_pages(self):
+        resp = self.client.get(reverse('async-book-list'), data={'page_size': 2})
+        self.assertIn('/async/book/', resp.json()['next'])
+        resp = self.client.get(resp.json()['next'])
+        self.assertEqual([self.book3.id], [book['id'] for book in resp.json()['results']])
+
+    def test_list_bad_filter(self):
+        resp = self.client.get(reverse('async-book-list'), data={'price': 'abc'})
+        self.assertEqual(HTTP_400_BAD_REQUEST, resp.status_code)
+
+    def test_detail(self):
+        sync = self.client.get(reverse('book-detail', args=(self.book1.id,)))
+        resp = self.client.get(reverse('async-book-detail', args=(self.book1.id,)))
+        self.assertEqual(sync.content, resp.content)
+        resp = self.client.get(reverse('async-book-detail', args=(999999,)))
+        self.assertEqual(HTTP_404_NOT_FOUND, resp.status_code)
+
+    def test_relation_update(self):
+        url = reverse('async-userbookrelation-detail', args=(self.book2.id,))
+        self.client.force_login(self.user1)
+        resp = self.client.patch(url, data=json.dumps({'like': True, 'rate': 4}), content_type='application/json')
+        self.assertEqual(HTTP_200_OK, resp.status_code)
+        self.assertEqual({'book': self.book2.id, 'like': True, 'in_bookmarks': False, 'rate': 4}, resp.json())
+        self.book2.refresh_from_db()
+        self.assertEqual((1, '4.00'), (self.book2.likes_count, str(self.book2.rating)))
+
+    def test_relation_update_invalid(self):
+        url = reverse('async-userbookrelation-detail', args=(self.book2.id,))
+        self.client.force_login(self.user1)
+        resp = self.client.patch(url, data=json.dumps({'rate': 11}), content_type='application/json')
+        self.assertEqual(HTTP_400_BAD_REQUEST, resp.status_code)
+        self.assertIn('rate', resp.json())
+
+    def test_relation_update_no_login(self):
+        url = reverse('async-userbookrelation-detail', args=(self.book2.id,))
+        resp = self.client.patch(url, data=json.dumps({'like': True}), content_type='application/json')
+        self.assertEqual(HTTP_403_FORBIDDEN, resp.status_code)
+
+    def test_relation_update_csrf(self):
+        url = reverse('async-userbookrelation-detail', args=(self.book2.id,))
+        client = APIClient(enforce_csrf_checks=True)
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {issue_token(self.user1)}')
+        resp = client.patch(url, data=json.dumps({'like': True}), content_type='application/json')
+        self.assertEqual(HTTP_200_OK, resp.status_code)
+
+        client = APIClient(enforce_csrf_checks=True)
+        client.force_login(self.user1)
+        resp = client.patch(url, data=json.dumps({'rate': 3}), content_type='application/json')
+        self.assertEqual(HTTP_403_FORBIDDEN, resp.status_code)
+        self.assertIn('CSRF Failed', resp.json()['detail'])
+        sync = client.patch(reverse('userbookrelation-detail', args=(self.book2.id,)),
+                            data=json.dumps({'rate': 3}), content_type='application/json')
+        self.assertEqual(sync.json(), resp.json())
+        self.assertEqual(HTTP_200_OK, client.get(reverse('async-book-list')).status_code)
+        self.assertIsNone(UserBookRelation.objects.get(user=self.user1, book=self.book2).rate)
+
+    def test_errors_same_as_sync(self):
+        self.client.force_login(self.user1)
+        cases = [
+            ('get', 'userbookrelation-detail', 'async-userbookrelation-detail', (self.book2.id,), {}),
+            ('patch', 'userbookrelation-detail', 'async-userbookrelation-detail', (self.book2.id,),
+             {'data': '{"like": ', 'content_type': 'application/json'}),
+            ('patch', 'userbookrelation-detail', 'async-userbookrelation-detail', (self.book2.id,),
+             {'data': 'like=1', 'content_type': 'text/plain'}),
+            ('patch', 'userbookrelation-detail', 'async-userbookrelation-detail', (999999,),
+             {'data': '{"like": true}', 'content_type': 'application/json'}),
+        ]
+        for method, sync_name, async_name, args, kwargs in cases:
+            with self.subTest(method=method, url=async_name):
+                sync = getattr(self.client, method)(reverse(sync_name, args=args), **kwargs)
+                resp = getattr(self.client, method)(reverse(async_name, args=args), **kwargs)
+                self.assertEqual(sync.status_code, resp.status_code)
+                self.assertEqual(sync.json().keys(), resp.json().keys())
+                self.assertEqual('application/json', resp['Content-Type'])
+
+        resp = self.client.post(reverse('async-book-detail', args=(self.book1.id,)))
+        self.assertEqual(HTTP_405_METHOD_NOT_ALLOWED, resp.status_code)
+        self.assertEqual({'detail': 'Method "POST" not allowed.'}, resp.json())
+        self.assertEqual('GET', resp['Allow'])
+
+    def test_auth_errors_same_as_sync(self):
+        for header in ['Bearer nonsense', 'Bearer']:
+            sync = self.client.get(reverse('book-list'), HTTP_AUTHORIZATION=header)
+            resp = self.client.get(reverse('async-book-list'), HTTP_AUTHORIZATION=header)
+            self.assertEqual((sync.status_code, sync.get('WWW-Authenticate')),
+                             (resp.status_code, resp.get('WWW-Authenticate')))
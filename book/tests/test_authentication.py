@@ -0,0 +1,109 @@
+import json
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command, CommandError
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_204_NO_CONTENT, HTTP_403_FORBIDDEN
+from rest_framework.test import APIClient, APITestCase
+
+from book.authentication import issue_token, user_cache
+from book.models import Book, TokenGeneration, UserBookRelation
+
+
+class SignedTokenAuthenticationTestCase(APITestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create(username='test_user1')
+        self.staff = User.objects.create(username='test_staff', is_staff=True)
+        self.book1 = Book.objects.create(name='Test book 1', price=100, author='Author 1', owner=self.staff)
+        UserBookRelation.objects.create(user=self.user, book=self.book1, like=True)
+
+    def token_client(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    def test_issue(self):
+        self.assertEqual(HTTP_403_FORBIDDEN, self.client.post(reverse('token')).status_code)
+        self.client.force_login(self.user)
+        resp = self.client.post(reverse('token'))
+        self.assertEqual(HTTP_200_OK, resp.status_code)
+
+        resp = self.token_client(resp.data['token']).get(reverse('book-list'))
+        self.assertEqual({'like': True, 'in_bookmarks': False, 'rate': None}, resp.data['results'][0]['relation'])
+
+    @override_settings(BOOK_RESPONSE_CACHE=None)
+    def test_no_auth_queries_when_cached(self):
+        client = self.token_client(issue_token(self.user))
+        # user, conditional GET state, page
+        with self.assertNumQueries(3):
+            client.get(reverse('book-list'))
+        with self.assertNumQueries(2):
+            resp = client.get(reverse('book-list'))
+        self.assertTrue(resp.data['results'][0]['relation']['like'])
+
+    def test_writes(self):
+        client = self.token_client(issue_token(self.user))
+        resp = client.patch(reverse('userbookrelation-detail', args=(self.book1.id,)),
+                            data=json.dumps({'rate': 4}), content_type='application/json')
+        self.assertEqual(HTTP_200_OK, resp.status_code)
+        self.assertEqual(4, UserBookRelation.objects.get(user=self.user, book=self.book1).rate)
+
+        resp = client.patch(reverse('book-detail', args=(self.book1.id,)), data={'price': 1}, format='json')
+        self.assertEqual(HTTP_403_FORBIDDEN, resp.status_code)
+        resp = self.token_client(issue_token(self.staff)).patch(reverse('book-detail', args=(self.book1.id,)),
+                                                                data={'price': 1}, format='json')
+        self.assertEqual(HTTP_200_OK, resp.status_code)
+
+    def test_invalid(self):
+        for header in ['Bearer nonsense', f'Bearer {issue_token(self.user)}x', 'Bearer', 'Bearer a b']:
+            resp = self.client.get(reverse('book-list'), HTTP_AUTHORIZATION=header)
+            self.assertEqual(HTTP_403_FORBIDDEN, resp.status_code, header)
+
+    @override_settings(BOOK_TOKEN_MAX_AGE=-1)
+    def test_expired(self):
+        resp = self.token_client(issue_token(self.user)).get(reverse('book-list'))
+        self.assertEqual(HTTP_403_FORBIDDEN, resp.status_code)
+
+    def test_revoke(self):
+        client = self.token_client(issue_token(self.user))
+        self.assertEqual(HTTP_200_OK, client.get(reverse('book-list')).status_code)
+        self.assertEqual(HTTP_204_NO_CONTENT, client.post(reverse('token-revoke')).status_code)
+        self.assertEqual(HTTP_403_FORBIDDEN, client.get(reverse('book-list')).status_code)
+        self.assertEqual(HTTP_200_OK, self.token_client(issue_token(self.user)).get(reverse('book-list')).status_code)
+
+    def test_revoke_in_other_process(self):
+        old = self.token_client(issue_token(self.user))
+        old.get(reverse('book-list'))
+        # Another worker revoked and issued a new token; this one still has the old generation cached.
+        TokenGeneration.objects.create(user=self.user, generation=1)
+        new = self.token_client(issue_token(self.user))
+        self.assertEqual(HTTP_200_OK, new.get(reverse('book-list')).status_code)
+        self.assertEqual(HTTP_403_FORBIDDEN, old.get(reverse('book-list')).status_code)
+
+    def test_inactive(self):
+        client = self.token_client(issue_token(self.user))
+        client.get(reverse('book-list'))
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(HTTP_403_FORBIDDEN, client.get(reverse('book-list')).status_code)
+
+    def test_async(self):
+        client = self.token_client(issue_token(self.user))
+        resp = client.get(reverse('async-book-detail', args=(self.book1.id,)))
+        self.assertTrue(resp.json()['relation']['like'])
+        resp = client.patch(reverse('async-userbookrelation-detail', args=(self.book1.id,)),
+                            data=json.dumps({'like': False}), content_type='application/json')
+        self.assertEqual(HTTP_200_OK, resp.status_code)
+        resp = self.client.get(reverse('async-book-list'), HTTP_AUTHORIZATION='Bearer nonsense')
+        self.assertEqual(HTTP_403_FORBIDDEN, resp.status_code)
+        self.assertEqual('Invalid or expired token.', resp.json()['detail'])
+
+    def test_command(self):
+        client = self.token_client(issue_token(self.user))
+        call_command('revoke_tokens', 'test_user1', stdout=StringIO())
+        self.assertEqual(HTTP_403_FORBIDDEN, client.get(reverse('book-list')).status_code)
+        with self.assertRaises(CommandError):
+            call_command('revoke_tokens', 'nobody', stdout=StringIO())
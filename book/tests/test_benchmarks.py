@@ -0,0 +1,78 @@
+import contextlib
+import json
+import os
+import socketserver
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from book.benchmarks.data import seed_catalog
+from book.models import Book, UserBookRelation
+
+
+class BenchmarksTestCase(TestCase):
+    def test_seed_catalog(self):
+        data = seed_catalog(users=20, books=50, relations_per_user=5, seed=1)
+        self.assertEqual(50, Book.objects.filter(pk__in=data['book_ids']).count())
+        self.assertEqual(data['relations'], UserBookRelation.objects.count())
+        # The most popular book collects far more relations than an average one.
+        counts = [UserBookRelation.objects.filter(book_id=book_id).count() for book_id in data['book_ids']]
+        self.assertGreater(counts[0], 3 * sum(counts) / len(counts))
+        book = Book.objects.get(pk=data['book_ids'][0])
+        self.assertEqual(UserBookRelation.objects.filter(book=book, like=True).count(), book.likes_count)
+
+    def test_bench_api(self):
+        # The test database already is a throwaway one, and this test's transaction cleans up.
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch('book.management.commands.bench_api.throwaway_database',
+                           return_value=contextlib.nullcontext()) as throwaway_database:
+            output = os.path.join(directory, 'results.json')
+            call_command('bench_api', users=10, books=30, requests=5, warmup=1, output=output,
+                         stdout=StringIO())
+            with open(output) as source:
+                results = json.load(source)
+            call_command('bench_api', users=10, books=30, requests=5, warmup=1, baseline=output, seed=1,
+                         scenarios=['detail'], stdout=StringIO())
+
+        self.assertEqual(2, throwaway_database.call_count)
+        self.assertEqual({'list', 'list_filter', 'list_search', 'list_ordering', 'detail', 'write_storm', 'mixed'},
+                         set(results['scenarios']))
+        for result in results['scenarios'].values():
+            self.assertEqual(0, result['errors'])
+            self.assertGreater(result['queries']['total'], 0)
+
+    def test_bench_http_bad_responses(self):
+        class Handler(socketserver.StreamRequestHandler):
+            responses = iter([b'', b'garbage\r\n', b'HTTP/1.1 OK\r\n'])
+
+            def handle(self):
+                self.rfile.readline()
+                self.wfile.write(next(self.responses, b'HTTP/1.1 200 OK\r\n\r\n'))
+
+        with socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler) as server:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            stdout = StringIO()
+            call_command('bench_http', f'http://127.0.0.1:{server.server_address[1]}/', requests=5, concurrency=1,
+                         stdout=stdout)
+            server.shutdown()
+        self.assertEqual(['3'], [line.split()[3] for line in stdout.getvalue().splitlines()[1:]])
+
+        with self.assertRaises(CommandError):
+            call_command('bench_http', 'http://127.0.0.1/', requests=0, stdout=StringIO())
+
+    def test_bench_renderers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('bench_renderers', books=30, sizes=[5, 20], iterations=2, output=output, stdout=StringIO())
+            with open(output) as source:
+                results = json.load(source)
+
+        self.assertEqual({'5', '20'}, set(results))
+        self.assertIn('json', results['20'])
+        for result in results['20'].values():
+            self.assertGreater(result['bytes'], results['5']['json']['bytes'])
+        self.assertEqual(0, Book.objects.count())
@@ -0,0 +1,102 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from book.cache import LRUResponseCache, get_response_cache
+from book.models import Book, UserBookRelation
+
+
+class LRUResponseCacheTestCase(TestCase):
+    def test_eviction(self):
+        cache = LRUResponseCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(1, cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(3, cache.get('c'))
+
+    def test_bump_version(self):
+        cache = LRUResponseCache()
+        version = cache.get_version()
+        cache.set('a', 1)
+        cache.bump_version()
+        self.assertEqual(version + 1, cache.get_version())
+        self.assertIsNone(cache.get('a'))
+
+    def test_version_shared_between_processes(self):
+        worker, other = LRUResponseCache(), LRUResponseCache()
+        version = worker.get_version()
+        worker.set('a', 1)
+        other.bump_version()
+        self.assertEqual(version + 1, worker.get_version())
+        self.assertIsNone(worker.get('a'))
+
+    def test_timeout(self):
+        cache = LRUResponseCache(timeout=5)
+        with mock.patch('book.cache.time.monotonic', return_value=100):
+            cache.set('a', 1)
+        with mock.patch('book.cache.time.monotonic', return_value=105):
+            self.assertEqual(1, cache.get('a'))
+        with mock.patch('book.cache.time.monotonic', return_value=106):
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(0, cache.stats()['size'])
+
+
+class ResponseCacheTestCase(APITestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='test_user1')
+        self.book1 = Book.objects.create(name='Test book 1', price=100, author='Author 1')
+        self.book2 = Book.objects.create(name='Test book 2', price=150, author='Author 2')
+        self.cache = get_response_cache()
+        self.cache.hits = self.cache.misses = 0
+
+    def test_hit(self):
+        url = reverse('book-list')
+        first = self.client.get(url, data={'ordering': 'price', 'search': 'Test'})
+        second = self.client.get(url, data={'search': 'Test', 'ordering': 'price'})
+        self.assertEqual(first.data, second.data)
+        self.assertEqual({'hits': 1, 'misses': 1}, {key: self.cache.stats()[key] for key in ('hits', 'misses')})
+
+    def test_invalidate_on_relation_change(self):
+        url = reverse('book-detail', args=(self.book1.id,))
+        self.assertEqual(0, self.client.get(url).data['annotated_likes'])
+        UserBookRelation.objects.create(user=self.user1, book=self.book1, like=True)
+        self.assertEqual(1, self.client.get(url).data['annotated_likes'])
+        self.assertEqual(0, self.cache.hits)
+
+    def test_invalidate_on_book_change(self):
+        url = reverse('book-list')
+        self.client.get(url)
+        self.book2.delete()
+        self.assertEqual(1, len(self.client.get(url).data['results']))
+
+    def test_invalidate_from_other_process(self):
+        url = reverse('book-detail', args=(self.book1.id,))
+        self.client.get(url)
+        # A worker such as process_dirty_books: its own cache instance, no signals here.
+        Book.objects.filter(pk=self.book1.pk).update(name='Changed')
+        LRUResponseCache().bump_version()
+        self.assertEqual('Changed', self.client.get(url).data['name'])
+        self.assertEqual(0, self.cache.hits)
+
+    @override_settings(BOOK_RESPONSE_CACHE={'BACKEND': 'book.cache.DjangoResponseCache',
+                                            'OPTIONS': {'ALIAS': 'default', 'TIMEOUT': 60}})
+    def test_django_backend(self):
+        cache = get_response_cache()
+        url = reverse('book-detail', args=(self.book1.id,))
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(1, cache.hits)
+        self.book1.name = 'Changed'
+        self.book1.save()
+        self.assertEqual('Changed', self.client.get(url).data['name'])
+
+    @override_settings(BOOK_RESPONSE_CACHE=None)
+    def test_disabled(self):
+        url = reverse('book-list')
+        self.assertEqual(2, len(self.client.get(url).data['results']))
@@ -0,0 +1,88 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_304_NOT_MODIFIED
+from rest_framework.test import APITestCase
+
+from book.logic import flush_dirty_books
+from book.models import Book, UserBookRelation
+
+
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='test_user1')
+        self.book1 = Book.objects.create(name='Test book 1', price=100, author='Author 1')
+        self.book2 = Book.objects.create(name='Test book 2', price=150, author='Author 2')
+
+    def test_list_not_modified(self):
+        url = reverse('book-list')
+        resp = self.client.get(url)
+        self.assertEqual(HTTP_200_OK, resp.status_code)
+        self.assertIn('Last-Modified', resp)
+
+        with self.assertNumQueries(1):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(HTTP_304_NOT_MODIFIED, resp.status_code)
+        self.assertEqual(b'', resp.content)
+
+    def test_list_params_change_etag(self):
+        url = reverse('book-list')
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(etag, self.client.get(url, data={'ordering': 'price'})['ETag'])
+
+    def test_list_modified_by_like(self):
+        url = reverse('book-list')
+        etag = self.client.get(url)['ETag']
+        UserBookRelation.objects.create(user=self.user1, book=self.book2, like=True)
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(HTTP_200_OK, resp.status_code)
+        self.assertEqual(1, resp.data['results'][1]['annotated_likes'])
+
+    def test_list_modified_by_delete(self):
+        url = reverse('book-list')
+        etag = self.client.get(url)['ETag']
+        self.book1.delete()
+        self.assertEqual(HTTP_200_OK, self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code)
+
+    def test_detail(self):
+        url = reverse('book-detail', args=(self.book1.id,))
+        resp = self.client.get(url)
+        etag, last_modified = resp['ETag'], resp['Last-Modified']
+
+        with self.assertNumQueries(1):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(HTTP_304_NOT_MODIFIED, resp.status_code)
+        resp = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(HTTP_304_NOT_MODIFIED, resp.status_code)
+
+        UserBookRelation.objects.create(user=self.user1, book=self.book1, rate=4)
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(HTTP_200_OK, resp.status_code)
+        self.assertNotEqual(etag, resp['ETag'])
+
+    def test_detail_not_found(self):
+        resp = self.client.get(reverse('book-detail', args=(999999,)))
+        self.assertEqual(404, resp.status_code)
+        self.assertNotIn('ETag', resp)
+
+    def test_vary(self):
+        url = reverse('book-list')
+        resp = self.client.get(url)
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+        for response in (resp, not_modified):
+            vary = {header.strip() for header in response['Vary'].split(',')}
+            self.assertLessEqual({'Accept', 'Authorization', 'Cookie'}, vary)
+
+    @override_settings(BOOK_AGGREGATES_WRITE_BEHIND=True)
+    def test_own_change_before_flush(self):
+        # The book counters wait for the flush, but the user's relation in the response does not.
+        self.client.force_login(self.user1)
+        relation_url = reverse('userbookrelation-detail', args=(self.book1.id,))
+        for url, like in [(reverse('book-list'), True), (reverse('book-detail', args=(self.book1.id,)), False)]:
+            with self.subTest(url=url):
+                resp = self.client.get(url)
+                self.client.patch(relation_url, data=json.dumps({'like': like}), content_type='application/json')
+                self.assertEqual(HTTP_200_OK, self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag']).status_code)
+                flush_dirty_books()
@@ -0,0 +1,59 @@
+import csv
+import json
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_403_FORBIDDEN
+from rest_framework.test import APITestCase
+
+from book.models import Book, UserBookRelation
+
+
+class ExportTestCase(APITestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='test_user1')
+        self.admin = User.objects.create(username='test_admin', is_staff=True)
+        self.book1 = Book.objects.create(name='Test book 1', price=100, author='Author 1', owner=self.user1)
+        self.book2 = Book.objects.create(name='Test, "book" 2', price=150, author='Author 2')
+        UserBookRelation.objects.create(user=self.user1, book=self.book1, like=True, rate=3)
+
+    def expected(self):
+        return [
+            {'id': self.book1.id, 'name': 'Test book 1', 'price': 100, 'author': 'Author 1',
+             'annotated_likes': 1, 'rating': '3.00', 'owner_name': 'test_user1'},
+            {'id': self.book2.id, 'name': 'Test, "book" 2', 'price': 150, 'author': 'Author 2',
+             'annotated_likes': 0, 'rating': None, 'owner_name': ''},
+        ]
+
+    def test_ndjson(self):
+        self.client.force_login(self.admin)
+        resp = self.client.get(reverse('book-export'))
+        self.assertEqual(HTTP_200_OK, resp.status_code)
+        self.assertTrue(resp.streaming)
+        lines = b''.join(resp.streaming_content).decode().splitlines()
+        self.assertEqual(self.expected(), [json.loads(line) for line in lines])
+
+    def test_csv(self):
+        self.client.force_login(self.admin)
+        resp = self.client.get(reverse('book-export'), data={'output': 'csv', 'price': 150})
+        rows = list(csv.reader(b''.join(resp.streaming_content).decode().splitlines()))
+        self.assertEqual(['id', 'name', 'price', 'author', 'annotated_likes', 'rating', 'owner_name'], rows[0])
+        self.assertEqual([str(self.book2.id), 'Test, "book" 2', '150', 'Author 2', '0', '', ''], rows[1])
+        self.assertEqual(2, len(rows))
+
+    def test_wrong_output(self):
+        self.client.force_login(self.admin)
+        resp = self.client.get(reverse('book-export'), data={'output': 'xml'})
+        self.assertEqual(HTTP_400_BAD_REQUEST, resp.status_code)
+
+    def test_not_staff(self):
+        self.client.force_login(self.user1)
+        resp = self.client.get(reverse('book-export'))
+        self.assertEqual(HTTP_403_FORBIDDEN, resp.status_code)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_books', stdout=out)
+        self.assertEqual(self.expected(), [json.loads(line) for line in out.getvalue().splitlines()])
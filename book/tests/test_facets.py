@@ -0,0 +1,82 @@
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+from rest_framework.test import APITestCase
+
+from book.models import Book, UserBookRelation
+
+
+class FacetsTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_user1')
+        self.book1 = Book.objects.create(name='Test book 1', price=50, author='Author 1')
+        self.book2 = Book.objects.create(name='Test book 2', price=100, author='Author 1')
+        self.book3 = Book.objects.create(name='Other book 3', price=300, author='Author 2')
+        self.book4 = Book.objects.create(name='Other book 4', price=1500, author='Author 3')
+        UserBookRelation.objects.create(user=self.user, book=self.book1, rate=5)
+        UserBookRelation.objects.create(user=self.user, book=self.book2, rate=2)
+        UserBookRelation.objects.create(user=self.user, book=self.book3, rate=4)
+
+    def get(self, url_name='book-list', **params):
+        resp = self.client.get(reverse(url_name), data=params)
+        self.assertEqual(HTTP_200_OK, resp.status_code)
+        return resp.json()
+
+    def counts(self, facet):
+        return {bucket['value']: bucket['count'] for bucket in facet if bucket['count']}
+
+    def ids(self, **params):
+        return [book['id'] for book in self.get(**params)['results']]
+
+    def test_range_filters(self):
+        ids = self.ids
+        self.assertEqual([self.book2.id, self.book3.id], ids(price__gte=100, price__lte=300))
+        self.assertEqual([self.book1.id], ids(price__lt=100))
+        self.assertEqual([self.book1.id, self.book3.id], ids(rating__gte=4))
+        self.assertEqual([self.book2.id], ids(rating__gt=1, rating__lt=3))
+        self.assertEqual([self.book1.id, self.book2.id], ids(author='Author 1'))
+
+    def test_facets(self):
+        data = self.get(facets='price,author,rating')
+        self.assertEqual(4, len(data['results']))
+        facets = data['facets']
+        self.assertEqual({'0-100': 1, '100-250': 1, '250-500': 1, '1000+': 1}, self.counts(facets['price']))
+        self.assertEqual({'min': 1000, 'max': None}, {key: facets['price'][-1][key] for key in ('min', 'max')})
+        self.assertEqual([{'value': 'Author 1', 'count': 2}, {'value': 'Author 2', 'count': 1},
+                          {'value': 'Author 3', 'count': 1}], facets['author'])
+        self.assertEqual({'2-3': 1, '4+': 2, 'unrated': 1}, self.counts(facets['rating']))
+
+    def test_facets_follow_filters(self):
+        facets = self.get(facets='author,price', search='Other')['facets']
+        self.assertEqual({'Author 2': 1, 'Author 3': 1}, self.counts(facets['author']))
+        self.assertEqual({'250-500': 1, '1000+': 1}, self.counts(facets['price']))
+
+        facets = self.get(facets='rating', price__gte=100, page_size=1)['facets']
+        self.assertEqual({'2-3': 1, '4+': 1, 'unrated': 1}, self.counts(facets['rating']))
+        self.assertEqual(['rating'], list(facets))
+
+    def test_no_facets(self):
+        self.assertNotIn('facets', self.get())
+        self.assertNotIn('facets', self.get(facets=''))
+
+    def test_unknown_facet(self):
+        resp = self.client.get(reverse('book-list'), data={'facets': 'price,color'})
+        self.assertEqual(HTTP_400_BAD_REQUEST, resp.status_code)
+        self.assertIn('color', resp.data['facets'][0])
+
+    def test_async(self):
+        self.assertEqual(self.get(facets='price,author,rating', search='book'),
+                         self.get('async-book-list', facets='price,author,rating', search='book'))
+
+    @override_settings(BOOK_RESPONSE_CACHE=None)
+    def test_queries(self):
+        Book.objects.bulk_create([Book(name=f'Bulk {index}', price=index, author=f'Author {index % 30}')
+                                  for index in range(200)])
+        # conditional GET state, range facets, author facet, page
+        with self.assertNumQueries(4) as queries:
+            data = self.get(facets='price,author,rating')
+        self.assertEqual(20, len(data['facets']['author']))
+        self.assertIn('LIMIT 20', queries.captured_queries[2]['sql'])
+        self.assertEqual([('Author 1', 9), ('Author 2', 8), ('Author 3', 8), ('Author 0', 7)],
+                         [(row['value'], row['count']) for row in data['facets']['author'][:4]])
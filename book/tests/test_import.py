@@ -0,0 +1,103 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from book.models import Book, UserBookRelation
+
+
+class ImportBooksTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='test_user1')
+        self.user2 = User.objects.create(username='test_user2')
+        self.existing = Book.objects.create(name='Existing', price=10, author='Author')
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(content)
+        return path
+
+    def call(self, *args, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_books', *args, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_csv(self):
+        books = self.write('books.csv', 'name,price,author,owner\n'
+                                        'Book 1,100,Author 1,test_user1\n'
+                                        'Book 2,150,Author 2,\n'
+                                        'Book 3,-1,Author 3,\n'
+                                        'Book 4,150,Author 4,nobody\n')
+        stdout, stderr = self.call(books, batch_size=2)
+        self.assertIn('Imported 2 books', stdout)
+        self.assertIn('2 rows skipped', stderr)
+        self.assertEqual(self.user1, Book.objects.get(name='Book 1').owner)
+        self.assertIsNone(Book.objects.get(name='Book 2').owner)
+
+    def test_relations(self):
+        books = self.write('books.ndjson', '\n'.join(json.dumps(row) for row in [
+            {'id': 500, 'name': 'Book 1', 'price': 100, 'author': 'Author 1'},
+            {'id': 501, 'name': 'Book 2', 'price': 150, 'author': 'Author 2', 'owner': 'test_user2'},
+        ]))
+        relations = self.write('relations.ndjson', '\n'.join(json.dumps(row) for row in [
+            {'user': 'test_user1', 'book': 500, 'like': True, 'rate': 4},
+            {'user': 'test_user2', 'book': 500, 'like': True, 'rate': 2},
+            {'user': 'test_user2', 'book': 500, 'like': False, 'rate': 1},
+            {'user': 'test_user1', 'book': self.existing.id, 'in_bookmarks': True},
+            {'user': 'test_user1', 'book': 999},
+            {'user': 'nobody', 'book': 500},
+        ]))
+        stdout, stderr = self.call(books, relations=relations, batch_size=4)
+        self.assertIn('Imported 3 relations', stdout)
+        self.assertIn('2 rows skipped', stderr)
+
+        book = Book.objects.get(pk=500)
+        self.assertEqual((1, 5, 2, '2.50'), (book.likes_count, book.rating_sum, book.rating_count, str(book.rating)))
+        self.existing.refresh_from_db()
+        self.assertEqual(1, self.existing.bookmarks_count)
+        self.assertEqual(3, UserBookRelation.objects.count())
+        self.assertGreater(Book.objects.create(name='New', price=1, author='Author').id, 501)
+
+    def test_partial_rows(self):
+        relation = UserBookRelation.objects.create(user=self.user1, book=self.existing, like=True, rate=4)
+        relations = self.write('relations.ndjson', '\n'.join(json.dumps(row) for row in [
+            {'user': 'test_user1', 'book': self.existing.id, 'in_bookmarks': True},
+            {'user': 'test_user2', 'book': self.existing.id, 'like': True},
+            {'user': 'test_user2', 'book': self.existing.id, 'rate': 2},
+        ]))
+        books = self.write('books.ndjson', '')
+        self.call(books, relations=relations)
+
+        relation.refresh_from_db()
+        self.assertEqual((True, True, 4), (relation.like, relation.in_bookmarks, relation.rate))
+        merged = UserBookRelation.objects.get(user=self.user2, book=self.existing)
+        self.assertEqual((True, False, 2), (merged.like, merged.in_bookmarks, merged.rate))
+        self.existing.refresh_from_db()
+        self.assertEqual((2, 1, '3.00'), (self.existing.likes_count, self.existing.bookmarks_count,
+                                          str(self.existing.rating)))
+
+    def test_bad_lines(self):
+        books = self.write('books.ndjson', '\n'.join([
+            json.dumps({'name': 'Book 1', 'price': 100, 'author': 'Author 1'}),
+            '{"name": "Book 2", ',
+            '[1, 2]',
+            json.dumps({'id': self.existing.id, 'name': 'Book 3', 'price': 100, 'author': 'Author 3'}),
+            json.dumps({'id': 700, 'name': 'Book 4', 'price': 100, 'author': 'Author 4'}),
+            json.dumps({'id': 700, 'name': 'Book 5', 'price': 100, 'author': 'Author 5'}),
+        ]))
+        stdout, stderr = self.call(books)
+        self.assertIn('Imported 2 books', stdout)
+        self.assertIn('4 rows skipped', stderr)
+        for line in ('line 2: ', 'line 3: ', 'line 4: ', 'line 6: '):
+            self.assertIn(line, stderr)
+        self.assertEqual('Existing', Book.objects.get(pk=self.existing.id).name)
+        self.assertEqual('Book 4', Book.objects.get(pk=700).name)
@@ -0,0 +1,119 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
+from rest_framework.test import APITestCase
+
+from book.logic import flush_dirty_books, record_like_activity
+from book.models import Book, BookLikeActivity, PendingLikeActivity, UserBookRelation
+
+
+class LeaderboardTestCase(APITestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f'test_user{index}') for index in range(3)]
+        self.book1 = Book.objects.create(name='Test book 1', price=100, author='Author 1')
+        self.book2 = Book.objects.create(name='Test book 2', price=150, author='Author 2')
+        self.book3 = Book.objects.create(name='Test book 3', price=200, author='Author 3')
+
+        UserBookRelation.objects.create(user=self.users[0], book=self.book1, like=True, rate=5)
+        UserBookRelation.objects.create(user=self.users[0], book=self.book2, like=True, rate=4)
+        UserBookRelation.objects.create(user=self.users[1], book=self.book2, like=True, rate=5)
+        UserBookRelation.objects.create(user=self.users[2], book=self.book2, rate=3)
+
+    def board(self, board, **params):
+        resp = self.client.get(reverse('book-top', kwargs={'board': board}), data=params)
+        self.assertEqual(HTTP_200_OK, resp.status_code)
+        return resp.data
+
+    def test_top_rated(self):
+        self.assertEqual([self.book1.id, self.book2.id], [book['id'] for book in self.board('rated')])
+        self.assertEqual([self.book2.id], [book['id'] for book in self.board('rated', min_ratings=2)])
+        self.assertEqual([self.book1.id], [book['id'] for book in self.board('rated', limit=1)])
+
+    def test_most_liked(self):
+        data = self.board('liked')
+        self.assertEqual([self.book2.id, self.book1.id], [book['id'] for book in data])
+        self.assertEqual(2, data[0]['annotated_likes'])
+
+    def test_trending(self):
+        today = timezone.now().date()
+        BookLikeActivity.objects.create(book_id=self.book3.id, day=today - timedelta(days=10), likes=50)
+        data = self.board('trending')
+        self.assertEqual([(self.book2.id, 2), (self.book1.id, 1)],
+                         [(book['id'], book['recent_likes']) for book in data])
+        self.assertEqual(self.book3.id, self.board('trending', days=11)[0]['id'])
+
+    def test_trending_follows_relation_writes(self):
+        self.client.force_login(self.users[1])
+        self.client.patch(reverse('userbookrelation-detail', args=(self.book2.id,)),
+                          data=json.dumps({'like': False}), content_type='application/json')
+        self.client.post(reverse('userbookrelation-bulk'), content_type='application/json',
+                         data=json.dumps([{'book': self.book3.id, 'like': True},
+                                          {'book': self.book1.id, 'like': True}]))
+        UserBookRelation.objects.create(user=self.users[2], book=self.book3, like=True)
+
+        data = self.board('trending')
+        self.assertEqual([(self.book3.id, 2), (self.book1.id, 2), (self.book2.id, 1)],
+                         [(book['id'], book['recent_likes']) for book in data])
+
+    @override_settings(BOOK_AGGREGATES_WRITE_BEHIND=True)
+    def test_write_behind(self):
+        BookLikeActivity.objects.all().delete()
+        self.client.force_login(self.users[1])
+        self.client.patch(reverse('userbookrelation-detail', args=(self.book3.id,)),
+                          data=json.dumps({'like': True}), content_type='application/json')
+        self.client.post(reverse('userbookrelation-bulk'), content_type='application/json',
+                         data=json.dumps([{'book': self.book1.id, 'like': True},
+                                          {'book': self.book2.id, 'like': False}]))
+        UserBookRelation.objects.create(user=self.users[2], book=self.book3, like=True)
+        # Likes are only queued until the worker runs.
+        self.assertFalse(BookLikeActivity.objects.exists())
+        self.assertEqual(4, PendingLikeActivity.objects.count())
+
+        flush_dirty_books()
+        self.assertFalse(PendingLikeActivity.objects.exists())
+        self.assertEqual({self.book1.id: 1, self.book2.id: -1, self.book3.id: 2},
+                         dict(BookLikeActivity.objects.values_list('book_id', 'likes')))
+        self.assertEqual([(self.book3.id, 2), (self.book1.id, 1)],
+                         [(book['id'], book['recent_likes']) for book in self.board('trending')])
+
+    @override_settings(BOOK_TRENDING_MAX_DAYS=60)
+    def test_max_days(self):
+        self.assertEqual(2, len(self.board('trending', days=45)))
+
+    def test_deleted_book(self):
+        self.book1.delete()
+        self.assertFalse(BookLikeActivity.objects.filter(book_id=self.book1.id).exists())
+        self.assertEqual([self.book2.id], [book['id'] for book in self.board('trending')])
+
+    def test_invalid_params(self):
+        for params in [{'limit': 0}, {'limit': 101}, {'days': 31}, {'min_ratings': 'x'}]:
+            resp = self.client.get(reverse('book-top', kwargs={'board': 'trending'}), data=params)
+            self.assertEqual(HTTP_400_BAD_REQUEST, resp.status_code)
+        self.assertEqual(HTTP_404_NOT_FOUND, self.client.get('/book/top/cheapest/').status_code)
+
+    @override_settings(BOOK_RESPONSE_CACHE=None)
+    def test_queries(self):
+        Book.objects.bulk_create([Book(name='Bulk', price=1, author='Author', likes_count=1, rating=1, rating_count=1)
+                                  for _ in range(200)])
+        record_like_activity({book.id: 1 for book in Book.objects.filter(name='Bulk')})
+        with self.assertNumQueries(1):
+            self.board('rated', limit=100)
+        with self.assertNumQueries(1):
+            self.board('liked', limit=100)
+        with self.assertNumQueries(2):
+            self.assertEqual(100, len(self.board('trending', limit=100)))
+
+    def test_prune(self):
+        today = timezone.now().date()
+        BookLikeActivity.objects.create(book_id=self.book3.id, day=today - timedelta(days=29), likes=1)
+        BookLikeActivity.objects.create(book_id=self.book3.id, day=today - timedelta(days=30), likes=1)
+        call_command('prune_like_activity', stdout=StringIO())
+        self.assertEqual([today - timedelta(days=29), today],
+                         sorted(set(BookLikeActivity.objects.values_list('day', flat=True))))
@@ -1,8 +1,15 @@
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
-from book.logic import set_rating
-from book.models import Book, UserBookRelation
+from book import logic
+from book.logic import set_rating, flush_dirty_books, mark_dirty
+from book.models import Book, BookLikeActivity, DirtyBook, UserBookRelation
 
 
 class SetRatingTestCase(TestCase):
@@ -19,4 +26,176 @@ class SetRatingTestCase(TestCase):
     def test_ok(self):
         set_rating(self.book1)
         self.book1.refresh_from_db()
-        self.assertEqual('2.00', str(self.book1.rating))
\ No newline at end of file
+        self.assertEqual('2.00', str(self.book1.rating))
+
+
+class CountersTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='test_user1')
+        self.user2 = User.objects.create(username='test_user2')
+        self.book1 = Book.objects.create(name='Test book 1', price=100, author='Author', owner=self.user1)
+
+        self.relation1 = UserBookRelation.objects.create(user=self.user1, book=self.book1, like=True)
+        self.relation2 = UserBookRelation.objects.create(user=self.user2, book=self.book1, like=True,
+                                                         in_bookmarks=True)
+
+    def test_create(self):
+        self.book1.refresh_from_db()
+        self.assertEqual(2, self.book1.likes_count)
+        self.assertEqual(1, self.book1.bookmarks_count)
+
+    def test_update(self):
+        relation = UserBookRelation.objects.get(pk=self.relation1.pk)
+        relation.like = False
+        relation.in_bookmarks = True
+        relation.save()
+        relation.save()
+        self.book1.refresh_from_db()
+        self.assertEqual(1, self.book1.likes_count)
+        self.assertEqual(2, self.book1.bookmarks_count)
+
+    def test_save_after_refresh(self):
+        UserBookRelation.objects.filter(pk=self.relation1.pk).update(like=False)
+        Book.objects.filter(pk=self.book1.pk).update(likes_count=1)
+        self.relation1.refresh_from_db()
+        self.relation1.like = True
+        self.relation1.save()
+        self.book1.refresh_from_db()
+        self.assertEqual(2, self.book1.likes_count)
+
+    def test_delete(self):
+        self.relation2.delete()
+        self.book1.refresh_from_db()
+        self.assertEqual(1, self.book1.likes_count)
+        self.assertEqual(0, self.book1.bookmarks_count)
+
+    def test_delete_user_cascade(self):
+        self.user2.delete()
+        self.book1.refresh_from_db()
+        self.assertEqual(1, self.book1.likes_count)
+        self.assertEqual(0, self.book1.bookmarks_count)
+        self.assertEqual(1, BookLikeActivity.objects.get(book_id=self.book1.id).likes)
+
+    def test_delete_user_cascade_queries(self):
+        books = Book.objects.bulk_create([Book(name=f'Book {index}', price=100, author='Author') for index in range(5)])
+        UserBookRelation.objects.bulk_create([UserBookRelation(user=self.user2, book=book, like=True)
+                                              for book in books])
+        with CaptureQueriesContext(connection) as captured:
+            self.user2.delete()
+        # One rebuild for all the books, however many relations the user had.
+        updates = [query for query in captured.captured_queries if query['sql'].startswith('UPDATE "book_book"')]
+        self.assertEqual(1, len(updates))
+        self.book1.refresh_from_db()
+        self.assertEqual((1, 0), (self.book1.likes_count, self.book1.bookmarks_count))
+
+    def test_delete_book_cascade(self):
+        with CaptureQueriesContext(connection) as captured:
+            self.book1.delete()
+        # The relations go with the book: no counter updates or like activity for them.
+        self.assertFalse([query for query in captured.captured_queries
+                          if query['sql'].startswith('UPDATE "book_book"')])
+        self.assertFalse(BookLikeActivity.objects.exists())
+
+    def test_rebuild(self):
+        Book.objects.update(likes_count=10, bookmarks_count=10)
+        call_command('rebuild_counters', stdout=StringIO())
+        self.book1.refresh_from_db()
+        self.assertEqual(2, self.book1.likes_count)
+        self.assertEqual(1, self.book1.bookmarks_count)
+
+
+class RatingAggregatesTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='test_user1')
+        self.user2 = User.objects.create(username='test_user2')
+        self.book1 = Book.objects.create(name='Test book 1', price=100, author='Author', owner=self.user1)
+
+        self.relation1 = UserBookRelation.objects.create(user=self.user1, book=self.book1, rate=2)
+        self.relation2 = UserBookRelation.objects.create(user=self.user2, book=self.book1, rate=5)
+
+    def assertRating(self, rating, rating_sum, rating_count):
+        self.book1.refresh_from_db()
+        self.assertEqual(rating, None if self.book1.rating is None else str(self.book1.rating))
+        self.assertEqual((rating_sum, rating_count), (self.book1.rating_sum, self.book1.rating_count))
+
+    def test_create(self):
+        self.assertRating('3.50', 7, 2)
+
+    def test_change(self):
+        relation = UserBookRelation.objects.get(pk=self.relation1.pk)
+        relation.rate = 4
+        relation.save()
+        self.assertRating('4.50', 9, 2)
+
+    def test_unrate(self):
+        relation = UserBookRelation.objects.get(pk=self.relation2.pk)
+        relation.rate = None
+        relation.save()
+        self.assertRating('2.00', 2, 1)
+
+    def test_delete(self):
+        self.relation1.delete()
+        self.relation2.delete()
+        self.assertRating(None, 0, 0)
+
+    def test_reconcile(self):
+        call_command('reconcile_ratings', stdout=StringIO())
+        Book.objects.update(rating_sum=1, rating_count=1)
+        with self.assertRaises(CommandError):
+            call_command('reconcile_ratings', stdout=StringIO())
+        call_command('reconcile_ratings', fix=True, stdout=StringIO())
+        self.assertRating('3.50', 7, 2)
+
+
+@override_settings(BOOK_AGGREGATES_WRITE_BEHIND=True)
+class WriteBehindTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='test_user1')
+        self.user2 = User.objects.create(username='test_user2')
+        self.book1 = Book.objects.create(name='Test book 1', price=100, author='Author', owner=self.user1)
+
+    def test_deferred_until_flush(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book1, like=True, rate=2)
+        UserBookRelation.objects.create(user=self.user2, book=self.book1, in_bookmarks=True, rate=5)
+        self.book1.refresh_from_db()
+        self.assertEqual((0, 0, None), (self.book1.likes_count, self.book1.rating_count, self.book1.rating))
+        self.assertEqual(1, DirtyBook.objects.count())
+
+        self.assertEqual(1, flush_dirty_books())
+        self.book1.refresh_from_db()
+        self.assertEqual(1, self.book1.likes_count)
+        self.assertEqual(1, self.book1.bookmarks_count)
+        self.assertEqual((7, 2), (self.book1.rating_sum, self.book1.rating_count))
+        self.assertEqual('3.50', str(self.book1.rating))
+        self.assertFalse(DirtyBook.objects.exists())
+
+    def test_write_during_flush(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book1, like=True)
+        rebuild_aggregates = logic.rebuild_aggregates
+
+        def rebuild_then_write(books):
+            # A writer commits after the flusher's snapshot; its mark finds the queued row.
+            updated = rebuild_aggregates(books)
+            if rebuild.call_count == 1:
+                UserBookRelation.objects.create(user=self.user2, book=self.book1, like=True)
+                mark_dirty(self.book1.id)
+            return updated
+
+        with mock.patch.object(logic, 'rebuild_aggregates', side_effect=rebuild_then_write) as rebuild:
+            self.assertEqual(2, flush_dirty_books())
+        self.book1.refresh_from_db()
+        self.assertEqual(2, self.book1.likes_count)
+        self.assertFalse(DirtyBook.objects.exists())
+
+    def test_delete(self):
+        relation = UserBookRelation.objects.create(user=self.user1, book=self.book1, like=True, rate=2)
+        flush_dirty_books()
+        relation.delete()
+        call_command('process_dirty_books', once=True, stdout=StringIO())
+        self.book1.refresh_from_db()
+        self.assertEqual((0, 0, None), (self.book1.likes_count, self.book1.rating_count, self.book1.rating))
+
+    def test_deleted_book(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book1, like=True)
+        self.book1.delete()
+        self.assertEqual(1, flush_dirty_books())
@@ -0,0 +1,80 @@
+import json
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from book.metrics import record_query, registry
+from book.models import Book
+
+
+@override_settings(BOOK_METRICS_TOKEN='secret')
+class MetricsTestCase(APITestCase):
+    def setUp(self):
+        registry.reset()
+        self.user = User.objects.create(username='test_username')
+        self.book = Book.objects.create(name='Test book 1', price=25, author='Author 1')
+
+    def scrape(self):
+        return self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').content.decode()
+
+    def sample(self, text, name, **labels):
+        for line in text.splitlines():
+            if line.startswith(name + '{') and all(f'{key}="{value}"' in line for key, value in labels.items()):
+                return float(line.rsplit(' ', 1)[1])
+        return None
+
+    def test_counts_requests_and_queries(self):
+        self.client.get(reverse('book-list'))
+        self.client.get(reverse('book-list'), data={'ordering': 'price'})
+        self.client.get(reverse('book-detail', args=(self.book.id,)))
+        self.client.force_login(self.user)
+        self.client.patch(reverse('userbookrelation-detail', args=(self.book.id,)),
+                          data=json.dumps({'like': True}), content_type='application/json')
+
+        text = self.scrape()
+        self.assertEqual(2, self.sample(text, 'http_requests_total', view='book-list', method='GET', status=200))
+        self.assertEqual(1, self.sample(text, 'http_requests_total', view='book-detail', status=200))
+        self.assertEqual(1, self.sample(text, 'http_requests_total', view='userbookrelation-detail', method='PATCH'))
+        self.assertEqual(2, self.sample(text, 'http_request_duration_seconds_count', view='book-list'))
+        self.assertEqual(2, self.sample(text, 'http_request_duration_seconds_bucket', view='book-list', le='+Inf'))
+        self.assertGreater(self.sample(text, 'http_request_db_queries_sum', view='book-list'), 0)
+        self.assertGreater(self.sample(text, 'http_request_db_queries_sum', view='userbookrelation-detail'), 0)
+        self.assertGreater(self.sample(text, 'http_response_size_bytes_total', view='book-list'), 0)
+
+    def test_async_view_queries(self):
+        self.client.get(reverse('async-book-list'))
+        text = self.scrape()
+        self.assertEqual(1, self.sample(text, 'http_requests_total', view='async-book-list'))
+        self.assertGreater(self.sample(text, 'http_request_db_queries_sum', view='async-book-list'), 0)
+
+    def test_unmatched_and_unknown_method(self):
+        self.client.get('/no-such-page/')
+        self.client.generic('BREW', reverse('book-list'))
+        text = self.scrape()
+        self.assertEqual(1, self.sample(text, 'http_requests_total', view='unmatched', status=404))
+        self.assertEqual(1, self.sample(text, 'http_requests_total', view='book-list', method='other'))
+
+    def test_queries_outside_requests_not_recorded(self):
+        list(Book.objects.all())
+        self.assertNotIn('db_queries_bucket', registry.render())
+        self.assertIn(record_query, connection.execute_wrappers)
+
+    def test_token(self):
+        self.assertEqual(403, self.client.get(reverse('metrics')).status_code)
+        for header in ['Bearer wrong', 'Bearer secretx', 'secret']:
+            self.assertEqual(403, self.client.get(reverse('metrics'), HTTP_AUTHORIZATION=header).status_code)
+        resp = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(200, resp.status_code)
+        self.assertTrue(resp['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    @override_settings(BOOK_METRICS_TOKEN=None)
+    def test_staff_only_by_default(self):
+        self.assertEqual(403, self.client.get(reverse('metrics')).status_code)
+        self.assertEqual(403, self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer None').status_code)
+        self.client.force_login(self.user)
+        self.assertEqual(403, self.client.get(reverse('metrics')).status_code)
+        self.client.force_login(User.objects.create(username='test_staff', is_staff=True))
+        self.assertEqual(200, self.client.get(reverse('metrics')).status_code)
@@ -0,0 +1,110 @@
+import json
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK
+from rest_framework.test import APITestCase
+
+from book.logic import rebuild_aggregates
+from book.models import Book, UserBookRelation
+from book.tests.utils import QueryBudgetMixin
+
+
+# The response cache would hide the cost of the views themselves.
+@override_settings(BOOK_RESPONSE_CACHE=None)
+class QueryBudgetTestCase(QueryBudgetMixin, APITestCase):
+    sizes = (10, 100, 1000)
+
+    def setUp(self):
+        self.users = [User.objects.create(username=f'test_user{index}') for index in range(3)]
+        self.admin = User.objects.create(username='test_admin', is_staff=True, is_superuser=True)
+
+    def grow_catalog(self, size):
+        # Every book has an owner and relations, so per-row lookups would show up as extra queries.
+        start = Book.objects.count()
+        books = Book.objects.bulk_create([
+            Book(name=f'Test book {index}', price=index % 50, author=f'Author {index % 7}',
+                 owner=self.users[index % len(self.users)]) for index in range(start, size)
+        ])
+        UserBookRelation.objects.bulk_create([
+            UserBookRelation(user=user, book=book, like=True, rate=book.id % 5 + 1)
+            for book in books for user in self.users[:2]
+        ])
+        rebuild_aggregates(Book.objects.filter(pk__in=[book.id for book in books]))
+        return Book.objects.get(pk=books[0].id)
+
+    def assertBudgetAtEverySize(self, budget, request):
+        for size in self.sizes:
+            with self.subTest(books=size):
+                book = self.grow_catalog(size)
+                resp = self.assertQueryBudget(budget, request, book)
+                self.assertEqual(HTTP_200_OK, resp.status_code)
+
+    def test_list(self):
+        for size in self.sizes:
+            self.grow_catalog(size)
+            for params in [{}, {'page_size': 100}, {'ordering': '-price'}, {'price': 10}, {'search': 'Author 3'}]:
+                with self.subTest(books=size, **params):
+                    # conditional GET state, page
+                    resp = self.assertQueryBudget(2, self.client.get, reverse('book-list'), data=params)
+                    self.assertEqual(HTTP_200_OK, resp.status_code)
+
+    def test_list_logged_in(self):
+        self.client.force_login(self.users[0])
+        for size in self.sizes:
+            with self.subTest(books=size):
+                self.grow_catalog(size)
+                # session + user, conditional GET state, page with the user's relations joined
+                resp = self.assertQueryBudget(4, self.client.get, reverse('book-list'), data={'page_size': 100})
+                self.assertTrue(all(book['relation']['like'] for book in resp.data['results']))
+                self.assertQueryBudget(4, self.client.get, reverse('book-mine'), data={'page_size': 100})
+
+    def test_list_next_page(self):
+        for size in self.sizes:
+            with self.subTest(books=size):
+                self.grow_catalog(size)
+                url = self.client.get(reverse('book-list'), data={'ordering': 'name', 'page_size': 5}).data['next']
+                resp = self.assertQueryBudget(2, self.client.get, url)
+                self.assertEqual(5, len(resp.data['results']))
+
+    def test_detail(self):
+        # conditional GET state, book
+        self.assertBudgetAtEverySize(2, lambda book: self.client.get(reverse('book-detail', args=(book.id,))))
+
+    def test_relation_update(self):
+        self.client.force_login(self.users[2])
+
+        def request(book):
+            return self.client.patch(reverse('userbookrelation-detail', args=(book.id,)),
+                                     data=json.dumps({'like': not book.likes_count % 2}),
+                                     content_type='application/json')
+        # session + user, savepoint, upsert returning the old values, like activity, aggregate
+        # update, release; SQLite reads the old values first
+        self.assertBudgetAtEverySize(7 if connection.vendor == 'postgresql' else 8, request)
+
+    def test_relation_bulk(self):
+        self.client.force_login(self.users[2])
+
+        def request(book):
+            data = [{'book': book_id, 'rate': 3} for book_id in range(book.id, book.id + 10)]
+            return self.client.post(reverse('userbookrelation-bulk'), data=json.dumps(data),
+                                    content_type='application/json')
+        # session + user, savepoint, existing books, existing relations, insert, update, aggregates, release
+        self.assertBudgetAtEverySize(8, request)
+
+    def test_export(self):
+        self.client.force_login(self.admin)
+
+        def request(book):
+            resp = self.client.get(reverse('book-export'))
+            b''.join(resp.streaming_content)
+            return resp
+        # session + user, one server-side cursor over all books
+        self.assertBudgetAtEverySize(3, request)
+
+    def test_admin_relation_changelist(self):
+        # UserBookRelation.__str__ reads user and book, which the changelist has to join.
+        self.client.force_login(self.admin)
+        self.assertBudgetAtEverySize(5, lambda book: self.client.get(reverse('admin:book_userbookrelation_changelist')))
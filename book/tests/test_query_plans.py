@@ -0,0 +1,89 @@
+from urllib.parse import parse_qs, urlsplit
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Sum
+from rest_framework.request import Request
+from rest_framework.test import APITestCase, APIRequestFactory
+
+from book.benchmarks.data import seed_catalog
+from book.conditional import catalog_last_modified
+from book.facets import author_counts
+from book.logic import _relation_count, _relation_subquery
+from book.models import Book, CatalogState, UserBookRelation
+from book.tests.utils import QueryPlanMixin
+from book.views import BookViewSet
+
+
+class QueryPlanTestCase(QueryPlanMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_catalog(users=50, books=2000, relations_per_user=20, seed=3)
+        cls.price = Book.objects.values('price').annotate(books=Count('id')).order_by('-books')[0]['price']
+
+    def page_queryset(self, params, user=None, action='list'):
+        request = Request(APIRequestFactory().get('/book/', params))
+        if user is not None:
+            request.user = user
+        view = BookViewSet(request=request, format_kwarg=None, action=action, args=(), kwargs={})
+        queryset = view.filter_queryset(view.get_queryset())
+        paginator = view.paginator
+        page_queryset = paginator.get_page_queryset(queryset, request, view)
+        paginator.set_page(list(page_queryset))
+        return page_queryset, paginator.get_next_link()
+
+    def test_list(self):
+        word = self.data['words'][0]
+        for params in [{}, {'price': self.price}, {'ordering': '-price'}, {'ordering': 'name'},
+                       {'ordering': '-name'}, {'price': self.price, 'ordering': 'name'}, {'search': word},
+                       {'search': word, 'ordering': 'price'}]:
+            with self.subTest(**params):
+                queryset, next_link = self.page_queryset(dict(params, page_size=2))
+                self.assertNoSeqScan(queryset)
+                self.assertIsNotNone(next_link)
+                queryset, _ = self.page_queryset(dict(parse_qs(urlsplit(next_link).query)))
+                self.assertNoSeqScan(queryset)
+
+    def test_author(self):
+        queryset, _ = self.page_queryset({'author': Book.objects.values_list('author', flat=True)[0]})
+        self.assertNoSeqScan(queryset)
+        self.assertIn('book_author_id_idx', self.explain(queryset))
+        # The author facet groups the whole filtered catalog.
+        self.assertNoSeqScan(author_counts(Book.objects.all()))
+        self.assertIn('book_author_id_idx', self.explain(author_counts(Book.objects.all())))
+
+    def test_logged_in(self):
+        user = User.objects.get(pk=self.data['user_ids'][0])
+        for action in ('list', 'mine'):
+            with self.subTest(action=action):
+                queryset, _ = self.page_queryset({'page_size': 2}, user, action)
+                self.assertNoSeqScan(queryset)
+                self.assertIn('relation_like', queryset.query.annotations)
+
+    def test_leaderboards(self):
+        self.assertNoSeqScan(Book.objects.filter(rating__isnull=False, rating_count__gte=1)
+                             .order_by('-rating', '-id')[:10])
+        self.assertNoSeqScan(Book.objects.filter(likes_count__gt=0).order_by('-likes_count', '-id')[:10])
+
+    def test_detail(self):
+        self.assertNoSeqScan(BookViewSet.queryset.filter(pk=self.data['book_ids'][0]))
+
+    def test_catalog_last_modified(self):
+        last_update = Book.objects.order_by('-updated_at').values('updated_at')[:1]
+        self.assertNoSeqScan(last_update)
+        self.assertIsNotNone(catalog_last_modified()[0])
+        self.assertNoSeqScan(CatalogState.objects.filter(pk=1))
+
+    def test_aggregates(self):
+        books = Book.objects.filter(pk__in=self.data['book_ids'][:10]).annotate(
+            likes=_relation_count(like=True), rates=_relation_subquery(Sum('rate'), rate__isnull=False))
+        self.assertNoSeqScan(books)
+
+    def test_relation_lookups(self):
+        user_id = self.data['user_ids'][0]
+        self.assertNoSeqScan(UserBookRelation.objects.filter(user_id=user_id, book_id=self.data['book_ids'][0]))
+        self.assertNoSeqScan(UserBookRelation.objects.filter(user_id=user_id, book_id__in=self.data['book_ids'][:50]))
+        self.assertNoSeqScan(UserBookRelation.objects.filter(book_id=self.data['book_ids'][0], like=True))
+
+    def test_detects_seq_scan(self):
+        with self.assertRaises(AssertionError):
+            self.assertNoSeqScan(Book.objects.filter(name__icontains='Author 1'))
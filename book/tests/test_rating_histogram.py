@@ -0,0 +1,134 @@
+import json
+import random
+import threading
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Count, Q
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from book.logic import flush_dirty_books, set_rating, upsert_relation
+from book.models import RATE_COUNT_FIELDS, Book, UserBookRelation
+
+
+def histogram(book):
+    book.refresh_from_db()
+    return [getattr(book, field) for field in RATE_COUNT_FIELDS.values()]
+
+
+def recount(book):
+    counts = UserBookRelation.objects.filter(book=book).aggregate(
+        **{field: Count('pk', filter=Q(rate=rate)) for rate, field in RATE_COUNT_FIELDS.items()})
+    return [counts[field] for field in RATE_COUNT_FIELDS.values()]
+
+
+class RatingHistogramTestCase(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f'test_user{index}') for index in range(3)]
+        self.book1 = Book.objects.create(name='Test book 1', price=100, author='Author 1')
+        self.relation1 = UserBookRelation.objects.create(user=self.users[0], book=self.book1, rate=5)
+        self.relation2 = UserBookRelation.objects.create(user=self.users[1], book=self.book1, rate=5, like=True)
+        UserBookRelation.objects.create(user=self.users[2], book=self.book1, like=True)
+
+    def test_create(self):
+        self.assertEqual([0, 0, 0, 0, 0, 2], histogram(self.book1))
+
+    def test_change(self):
+        relation = UserBookRelation.objects.get(pk=self.relation1.pk)
+        relation.rate = 0
+        relation.save()
+        relation.rate = None
+        relation.save()
+        self.relation2.like = False
+        self.relation2.save()
+        self.assertEqual([0, 0, 0, 0, 0, 1], histogram(self.book1))
+
+    def test_delete(self):
+        self.relation1.delete()
+        self.assertEqual([0, 0, 0, 0, 0, 1], histogram(self.book1))
+
+    def test_upsert_and_bulk(self):
+        upsert_relation(self.users[0], self.book1.id, {'rate': 3})
+        upsert_relation(self.users[2], self.book1.id, {'rate': 1})
+        self.client.force_login(self.users[1])
+        self.client.post(reverse('userbookrelation-bulk'), content_type='application/json',
+                         data=json.dumps([{'book': self.book1.id, 'rate': 3}]))
+        self.assertEqual([0, 1, 0, 2, 0, 0], histogram(self.book1))
+
+    @override_settings(BOOK_AGGREGATES_WRITE_BEHIND=True)
+    def test_write_behind(self):
+        upsert_relation(self.users[0], self.book1.id, {'rate': 2})
+        self.assertEqual([0, 0, 0, 0, 0, 2], histogram(self.book1))
+        flush_dirty_books()
+        self.assertEqual([0, 0, 1, 0, 0, 1], histogram(self.book1))
+
+    def test_rebuild(self):
+        Book.objects.update(rate_0_count=7, rate_5_count=0)
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual([0, 0, 0, 0, 0, 2], histogram(self.book1))
+        Book.objects.update(rate_5_count=0)
+        set_rating(self.book1)
+        self.assertEqual([0, 0, 0, 0, 0, 2], histogram(self.book1))
+
+    def test_interleaved_writers(self):
+        # Model saves, upserts and bulk writes of several users in random order.
+        rng = random.Random(7)
+        rates = [None, 0, 1, 2, 3, 4, 5]
+        for _ in range(30):
+            user = rng.choice(self.users)
+            relation = UserBookRelation.objects.get(user=user, book=self.book1)
+            relation.rate = rng.choice(rates)
+            relation.save()
+            upsert_relation(rng.choice(self.users), self.book1.id, {'rate': rng.choice(rates)})
+            self.client.force_login(rng.choice(self.users))
+            self.client.post(reverse('userbookrelation-bulk'), content_type='application/json',
+                             data=json.dumps([{'book': self.book1.id, 'rate': rng.choice(rates)}]))
+            self.assertEqual(recount(self.book1), histogram(self.book1))
+
+
+class RatingHistogramApiTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_user1')
+        self.book1 = Book.objects.create(name='Test book 1', price=100, author='Author 1')
+        self.book2 = Book.objects.create(name='Test book 2', price=200, author='Author 2')
+        UserBookRelation.objects.create(user=self.user, book=self.book1, rate=4)
+
+    def test_detail(self):
+        resp = self.client.get(reverse('book-detail', args=(self.book1.id,)))
+        self.assertEqual({'0': 0, '1': 0, '2': 0, '3': 0, '4': 1, '5': 0}, resp.data['rating_histogram'])
+        resp = self.client.get(reverse('async-book-detail', args=(self.book1.id,)))
+        self.assertEqual(1, resp.json()['rating_histogram']['4'])
+
+    def test_list(self):
+        resp = self.client.get(reverse('book-list'))
+        self.assertNotIn('rating_histogram', resp.data['results'][0])
+        resp = self.client.get(reverse('book-list'), data={'rating_histogram': 'true'})
+        self.assertEqual([1, 0], [book['rating_histogram']['4'] for book in resp.data['results']])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SQLite serializes writers with table locks')
+class ConcurrentRatingHistogramTestCase(TransactionTestCase):
+    def test_concurrent_rate_changes(self):
+        book = Book.objects.create(name='Test book 1', price=100, author='Author 1')
+        users = [User.objects.create(username=f'test_user{index}') for index in range(8)]
+
+        def rate(user, seed):
+            rng = random.Random(seed)
+            try:
+                for _ in range(20):
+                    upsert_relation(user, book.id, {'rate': rng.choice([None, 0, 1, 2, 3, 4, 5])})
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=rate, args=(user, seed)) for seed, user in enumerate(users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(recount(book), histogram(book))
+        self.assertEqual(book.rating_count, sum(histogram(book)))
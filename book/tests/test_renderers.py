@@ -0,0 +1,108 @@
+import datetime
+import io
+import uuid
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.status import HTTP_200_OK, HTTP_406_NOT_ACCEPTABLE, HTTP_415_UNSUPPORTED_MEDIA_TYPE
+from rest_framework.test import APITestCase
+from rest_framework.utils.serializer_helpers import ReturnDict
+
+from book.models import Book, UserBookRelation
+from book.renderers import MessagePackParser, MessagePackRenderer, ORJSONParser, ORJSONRenderer, msgpack
+
+
+class ORJSONRendererTestCase(APITestCase):
+    def test_same_output_as_json_renderer(self):
+        data = ReturnDict({
+            'rating': Decimal('4.50'),
+            'at': datetime.datetime(2022, 9, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'naive': datetime.datetime(2022, 9, 1, 12, 30),
+            'day': datetime.date(2022, 9, 1),
+            'time': datetime.time(8, 15, 0, 500),
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'lazy': gettext_lazy('Not found.'),
+            'error': ErrorDetail('Invalid', code='invalid'),
+            'text': 'Ünïcode line "quoted"',
+            'numbers': [1, -2, 0.5, 0.8165, True, None],
+            3: 'int key',
+        }, serializer=None)
+        self.assertEqual(JSONRenderer().render(data), ORJSONRenderer().render(data))
+        self.assertEqual(b'', ORJSONRenderer().render(None))
+
+    def test_indent_falls_back(self):
+        rendered = ORJSONRenderer().render({'a': [1]}, 'application/json; indent=2')
+        self.assertEqual(JSONRenderer().render({'a': [1]}, 'application/json; indent=2'), rendered)
+
+    def test_api_responses(self):
+        user = User.objects.create(username='test_user1')
+        book = Book.objects.create(name='Test book 1', price=100, author='Author 1', owner=user)
+        UserBookRelation.objects.create(user=user, book=book, like=True, rate=4)
+        self.client.force_login(user)
+        for url in [reverse('book-list'), reverse('book-detail', args=(book.id,)),
+                    reverse('book-list') + '?facets=price,author,rating']:
+            resp = self.client.get(url)
+            self.assertEqual(HTTP_200_OK, resp.status_code)
+            self.assertEqual(JSONRenderer().render(resp.data), resp.content)
+
+    def test_parser(self):
+        self.assertEqual({'rate': 4, 'name': 'Ü'},
+                         ORJSONParser().parse(io.BytesIO('{"rate": 4, "name": "Ü"}'.encode()), 'application/json'))
+        latin1 = io.BytesIO('{"name": "Ü"}'.encode('latin-1'))
+        self.assertEqual({'name': 'Ü'}, ORJSONParser().parse(latin1, 'application/json', {'encoding': 'latin-1'}))
+        for body in [b'{"rate": ', b'{"rate": NaN}', b'\xff']:
+            with self.assertRaises(ParseError):
+                ORJSONParser().parse(io.BytesIO(body), 'application/json')
+
+    @mock.patch('book.renderers.orjson', None)
+    def test_without_orjson(self):
+        data = {'rating': Decimal('4.50'), 'text': 'Ü'}
+        self.assertEqual(JSONRenderer().render(data), ORJSONRenderer().render(data))
+        self.assertEqual({'rate': 4}, ORJSONParser().parse(io.BytesIO(b'{"rate": 4}'), 'application/json'))
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"rate": '), 'application/json')
+        resp = self.client.get(reverse('book-list'))
+        self.assertEqual(JSONRenderer().render(resp.data), resp.content)
+
+
+class MessagePackTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_user1')
+        self.book = Book.objects.create(name='Test book 1', price=100, author='Author 1')
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_negotiation(self):
+        resp = self.client.get(reverse('book-detail', args=(self.book.id,)), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual('application/msgpack', resp['Content-Type'])
+        self.assertEqual(resp.data, msgpack.unpackb(resp.content, raw=False))
+        self.assertEqual('application/json', self.client.get(reverse('book-list'))['Content-Type'])
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_parse(self):
+        self.client.force_login(self.user)
+        resp = self.client.patch(reverse('userbookrelation-detail', args=(self.book.id,)),
+                                 data=msgpack.packb({'rate': 5}), content_type='application/msgpack')
+        self.assertEqual(HTTP_200_OK, resp.status_code)
+        self.assertEqual(5, UserBookRelation.objects.get(user=self.user, book=self.book).rate)
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_encodes_like_json(self):
+        data = {'rating': Decimal('4.50'), 'at': timezone.now(), 'lazy': gettext_lazy('Not found.')}
+        self.assertEqual({'rating': 4.5, 'at': data['at'].isoformat()[:23] + 'Z', 'lazy': 'Not found.'},
+                         msgpack.unpackb(MessagePackRenderer().render(data), raw=False))
+
+    @mock.patch.object(MessagePackRenderer, 'available', False)
+    @mock.patch.object(MessagePackParser, 'available', False)
+    def test_unavailable(self):
+        resp = self.client.get(reverse('book-list'), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(HTTP_406_NOT_ACCEPTABLE, resp.status_code)
+        self.client.force_login(self.user)
+        resp = self.client.patch(reverse('userbookrelation-detail', args=(self.book.id,)),
+                                 data=b'\x81\xa4rate\x05', content_type='application/msgpack')
+        self.assertEqual(HTTP_415_UNSUPPORTED_MEDIA_TYPE, resp.status_code)
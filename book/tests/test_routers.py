@@ -0,0 +1,128 @@
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connections, router
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from book.cache import get_response_cache
+from book.models import Book, CatalogState
+from book import routers
+from book.routers import ReplicaRoutingMiddleware, health
+
+
+# The `replica` alias mirrors `default` in tests, so a TransactionTestCase is needed for
+# its separate connection to see committed rows.
+@override_settings(BOOK_READ_REPLICAS=['replica'], BOOK_RESPONSE_CACHE=None)
+class ReplicaRouterTestCase(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        health.reset()
+        CatalogState.objects.get_or_create(pk=1)
+        self.user = User.objects.create(username='test_user1')
+        self.book = Book.objects.create(name='Test book 1', price=100, author='Author 1')
+
+    def get_queries(self, method, *args, **kwargs):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(self.client, method)(*args, **kwargs)
+        return response, len(primary), len(replica)
+
+    def test_reads_from_replica(self):
+        for url in [reverse('book-list'), reverse('book-detail', args=(self.book.id,)), reverse('async-book-list')]:
+            response, primary, replica = self.get_queries('get', url)
+            self.assertEqual(200, response.status_code)
+            self.assertEqual(0, primary)
+            self.assertGreater(replica, 0)
+
+    async def test_async_reads_with_cold_health(self):
+        # No sync request has checked the replica yet; the check must not run in the event loop.
+        with mock.patch.object(health, 'measure_lag', wraps=health.measure_lag) as measure_lag, \
+                mock.patch.object(routers.random, 'choice', wraps=routers.random.choice) as choice:
+            response = await AsyncClient().get(reverse('async-book-list'))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, measure_lag.call_count)
+        choice.assert_called_with(['replica'])
+
+    def test_write_pins_to_primary(self):
+        self.client.force_login(self.user)
+        response, primary, replica = self.get_queries(
+            'patch', reverse('userbookrelation-detail', args=(self.book.id,)),
+            data=json.dumps({'like': True}), content_type='application/json')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(0, replica)
+        self.assertIn(ReplicaRoutingMiddleware.pin_cookie, response.cookies)
+
+        response, primary, replica = self.get_queries('get', reverse('book-list'))
+        self.assertEqual(0, replica)
+        self.assertTrue(response.data['results'][0]['relation']['like'])
+
+        del self.client.cookies[ReplicaRoutingMiddleware.pin_cookie]
+        _, primary, replica = self.get_queries('get', reverse('book-list'))
+        # Only the session and the user come from the primary.
+        self.assertEqual(2, primary)
+        self.assertGreater(replica, 0)
+
+    def test_get_that_writes_pins(self):
+        def view(request):
+            User.objects.create(username='test_user2')
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(RequestFactory().get('/'))
+        self.assertIn(ReplicaRoutingMiddleware.pin_cookie, response.cookies)
+        response = ReplicaRoutingMiddleware(lambda request: HttpResponse())(RequestFactory().get('/'))
+        self.assertNotIn(ReplicaRoutingMiddleware.pin_cookie, response.cookies)
+
+    def test_only_book_reads(self):
+        admin = User.objects.create(username='test_admin', is_staff=True)
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connections['replica']) as replica:
+            b''.join(self.client.get(reverse('book-export')).streaming_content)
+            self.client.get(reverse('metrics'))
+        self.assertEqual(0, len(replica))
+
+    @override_settings(BOOK_RESPONSE_CACHE={'BACKEND': 'book.cache.LRUResponseCache'})
+    def test_no_caching_of_replica_reads_after_write(self):
+        cache = get_response_cache()
+        Book.objects.create(name='Test book 2', price=100, author='Author 2')
+        self.client.get(reverse('book-list'))
+        self.assertEqual(0, cache.stats()['size'])
+        with mock.patch.object(cache, 'bumped_within', return_value=False):
+            self.client.get(reverse('book-list'))
+        self.assertEqual(1, cache.stats()['size'])
+
+    def test_lagging_replica(self):
+        with mock.patch.object(health, 'measure_lag', return_value=60.0):
+            _, primary, replica = self.get_queries('get', reverse('book-list'))
+        self.assertEqual(0, replica)
+        self.assertGreater(primary, 0)
+
+    def test_broken_replica(self):
+        with mock.patch.object(health, 'measure_lag', side_effect=DatabaseError):
+            response, primary, replica = self.get_queries('get', reverse('book-list'))
+        self.assertEqual(200, response.status_code)
+        self.assertGreater(primary, 0)
+
+    def test_health_is_cached(self):
+        with mock.patch.object(health, 'measure_lag', return_value=0.0) as measure_lag:
+            self.client.get(reverse('book-list'))
+            self.client.get(reverse('book-list'))
+        self.assertEqual(1, measure_lag.call_count)
+
+    def test_outside_requests(self):
+        with CaptureQueriesContext(connections['replica']) as replica:
+            Book.objects.count()
+        self.assertEqual(0, len(replica))
+        book = Book.objects.using('replica').get(pk=self.book.pk)
+        self.assertEqual('default', router.db_for_write(Book, instance=book))
+
+    @override_settings(BOOK_READ_REPLICAS=[])
+    def test_no_replicas(self):
+        response, primary, replica = self.get_queries('patch', reverse('userbookrelation-detail', args=(1,)))
+        self.assertNotIn(ReplicaRoutingMiddleware.pin_cookie, response.cookies)
+        _, primary, replica = self.get_queries('get', reverse('book-list'))
+        self.assertEqual(0, replica)
@@ -0,0 +1,53 @@
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from book.models import Book
+
+
+class FullTextSearchTestCase(APITestCase):
+    def setUp(self):
+        self.book1 = Book.objects.create(name='Dune', price=100, author='Frank Herbert')
+        self.book2 = Book.objects.create(name='Children of Dune', price=150, author='Frank Herbert')
+        self.book3 = Book.objects.create(name='Dune Dune Dune', price=200, author='Dune')
+        self.book4 = Book.objects.create(name='Solaris', price=120, author='Stanislaw Lem')
+
+    def search(self, **params):
+        resp = self.client.get(reverse('book-list'), data=params)
+        return [book['id'] for book in resp.data['results']]
+
+    def test_prefix(self):
+        self.assertEqual([self.book4.id], self.search(search='Sola'))
+
+    def test_word_prefixes_only(self):
+        # Unlike SearchFilter's ILIKE, a term does not match inside a word.
+        self.assertEqual([self.book1.id, self.book2.id], self.search(search='herb'))
+        self.assertEqual([], self.search(search='bert'))
+        self.assertEqual([], self.search(search='olaris'))
+
+    def test_all_terms(self):
+        self.assertEqual([self.book2.id], self.search(search='dune children'))
+
+    def test_reindex_on_update(self):
+        self.book4.name = 'Fiasco'
+        self.book4.save()
+        self.assertEqual([], self.search(search='Solaris'))
+        self.assertEqual([self.book4.id], self.search(search='fiasco'))
+
+    def test_reindex_on_delete(self):
+        self.book1.delete()
+        self.assertEqual([self.book2.id, self.book3.id], self.search(search='dune'))
+
+    def test_rank_ordering(self):
+        ids = self.search(search='dune', ordering='-search_rank')
+        self.assertEqual(self.book3.id, ids[0])
+        self.assertEqual({self.book1.id, self.book2.id, self.book3.id}, set(ids))
+
+    def test_rank_ordering_pages(self):
+        first = self.client.get(reverse('book-list'), data={'search': 'dune', 'ordering': '-search_rank',
+                                                            'page_size': 2})
+        second = self.client.get(first.data['next'])
+        ids = [book['id'] for book in first.data['results'] + second.data['results']]
+        self.assertEqual(self.search(search='dune', ordering='-search_rank'), ids)
+
+    def test_no_tokens(self):
+        self.assertEqual([], self.search(search='%%'))
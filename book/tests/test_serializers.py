@@ -1,9 +1,10 @@
 from django.contrib.auth.models import User
 from django.db.models import Count, Case, When, Avg, Sum, F, FloatField
 from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
 
 from book.models import Book, UserBookRelation
-from book.serializers import BooksSerializer
+from book.serializers import BooksSerializer, BooksValuesSerializer
 
 
 class BookSerializerTestCase(TestCase):
@@ -35,6 +36,7 @@ class BookSerializerTestCase(TestCase):
                 'annotated_likes': 3,
                 'rating': '2.00',
                 'owner_name': 'test_user1',
+                'relation': None,
             },
             {
                 'id': self.book2.id,
@@ -44,6 +46,33 @@ class BookSerializerTestCase(TestCase):
                 'annotated_likes': 2,
                 'rating': '2.67',
                 'owner_name': '',
+                'relation': None,
             },
         ]
         self.assertEqual(expected_data, data)
+
+
+class BooksValuesSerializerTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='test_user1')
+        self.user2 = User.objects.create(username='test_user2')
+        self.user3 = User.objects.create(username='test_user3')
+        self.book1 = Book.objects.create(name='Test book 1', price=100, author='Author', owner=self.user1)
+        self.book2 = Book.objects.create(name='Тестовая книга «2»', price=0, author='Автор')
+        self.book3 = Book.objects.create(name='Test book 3', price=150, author='Author 3', owner=self.user2)
+
+        UserBookRelation.objects.create(user=self.user1, book=self.book1, like=True, rate=2)
+        UserBookRelation.objects.create(user=self.user2, book=self.book1, like=True, rate=3)
+        UserBookRelation.objects.create(user=self.user3, book=self.book1, rate=3)
+        UserBookRelation.objects.create(user=self.user1, book=self.book3, like=True, rate=5)
+
+    def test_same_json(self):
+        books = Book.objects.all().select_related('owner').order_by('id')
+        expected = JSONRenderer().render(BooksSerializer(books, many=True).data)
+        data = BooksValuesSerializer(BooksValuesSerializer.prepare(books), many=True).data
+        self.assertEqual(expected, JSONRenderer().render(data))
+
+    def test_queries(self):
+        books = BooksValuesSerializer.prepare(Book.objects.all().select_related('owner'))
+        with self.assertNumQueries(1):
+            BooksValuesSerializer(books, many=True).data
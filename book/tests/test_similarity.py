@@ -0,0 +1,127 @@
+import json
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
+from rest_framework.test import APITestCase
+
+from book.models import Book, BookNeighbor, UserBookRelation
+from book.similarity import SimilarityIndex, build_similar_books, store, update_similar_books
+
+
+@override_settings(BOOK_SIMILAR_RELOAD_INTERVAL=0)
+class SimilarBooksTestCase(APITestCase):
+    def setUp(self):
+        store.reset()
+        self.users = [User.objects.create(username=f'test_user{index}') for index in range(4)]
+        self.book1 = Book.objects.create(name='Test book 1', price=100, author='Author 1')
+        self.book2 = Book.objects.create(name='Test book 2', price=150, author='Author 2')
+        self.book3 = Book.objects.create(name='Test book 3', price=200, author='Author 3')
+        self.book4 = Book.objects.create(name='Test book 4', price=250, author='Author 4')
+
+        # Readers: book1 {0, 1}, book2 {0, 1, 2}, book3 {1, 2}, book4 {3}.
+        UserBookRelation.objects.create(user=self.users[0], book=self.book1, like=True)
+        UserBookRelation.objects.create(user=self.users[0], book=self.book2, like=True)
+        UserBookRelation.objects.create(user=self.users[1], book=self.book1, rate=5)
+        UserBookRelation.objects.create(user=self.users[1], book=self.book2, like=True)
+        UserBookRelation.objects.create(user=self.users[1], book=self.book3, like=True)
+        UserBookRelation.objects.create(user=self.users[2], book=self.book2, rate=4)
+        UserBookRelation.objects.create(user=self.users[2], book=self.book3, like=True)
+        UserBookRelation.objects.create(user=self.users[3], book=self.book4, like=True)
+        # Low rates and bookmarks are not "liked".
+        UserBookRelation.objects.create(user=self.users[3], book=self.book1, rate=2, in_bookmarks=True)
+
+    def similar(self, book, **params):
+        resp = self.client.get(reverse('book-similar', args=(book.id,)), data=params)
+        self.assertEqual(HTTP_200_OK, resp.status_code)
+        return [(row['id'], row['similarity']) for row in resp.data]
+
+    def test_build(self):
+        self.assertEqual(3, build_similar_books())
+        self.assertEqual([(self.book2.id, 0.8165), (self.book3.id, 0.5)], self.similar(self.book1))
+        self.assertEqual([(self.book1.id, 0.8165), (self.book3.id, 0.8165)], self.similar(self.book2))
+        self.assertEqual([(self.book2.id, 0.8165)], self.similar(self.book1, limit=1))
+        self.assertEqual([], self.similar(self.book4))
+
+    def test_rebuild_is_served(self):
+        build_similar_books()
+        self.assertEqual([(self.book2.id, 0.8165), (self.book3.id, 0.5)], self.similar(self.book1))
+        # A change that reaches the rebuild without passing through the API.
+        UserBookRelation.objects.filter(user=self.users[1], book=self.book3).update(like=False)
+        build_similar_books()
+        self.assertEqual([(self.book2.id, 0.8165)], self.similar(self.book1))
+
+    def test_rows(self):
+        build_similar_books()
+        resp = self.client.get(reverse('book-similar', args=(self.book1.id,)))
+        self.assertEqual('Test book 2', resp.data[0]['name'])
+        self.assertEqual(2, resp.data[0]['annotated_likes'])
+
+    def test_top_k(self):
+        build_similar_books(top_k=1)
+        self.assertEqual(1, BookNeighbor.objects.filter(book_id=self.book1.id).count())
+        self.assertEqual([(self.book2.id, 0.8165)], self.similar(self.book1))
+
+    @override_settings(BOOK_SIMILAR_MAX_USER_ITEMS=2)
+    def test_heavy_users_are_skipped(self):
+        build_similar_books()
+        # user1 liked three books, so only user0 links book1 and book2.
+        self.assertEqual([(self.book2.id, 0.4082)], self.similar(self.book1))
+
+    def test_update_follows_relation_writes(self):
+        build_similar_books()
+        self.client.force_login(self.users[3])
+        self.client.patch(reverse('userbookrelation-detail', args=(self.book1.id,)),
+                          data=json.dumps({'rate': 5}), content_type='application/json')
+        UserBookRelation.objects.filter(user=self.users[2], book=self.book3).delete()
+
+        update_similar_books()
+        self.assertEqual([(self.book2.id, 0.6667), (self.book3.id, 0.5774), (self.book4.id, 0.5774)],
+                         self.similar(self.book1))
+        self.assertEqual([(self.book1.id, 0.5774)], self.similar(self.book4))
+        self.assertEqual([(self.book1.id, 0.6667), (self.book3.id, 0.5774)], self.similar(self.book2))
+
+    def test_update_without_build(self):
+        self.assertEqual(3, update_similar_books())
+        self.assertEqual([(self.book2.id, 0.8165), (self.book3.id, 0.5)], self.similar(self.book1))
+
+    def test_deleted_book(self):
+        build_similar_books()
+        self.book2.delete()
+        self.assertFalse(BookNeighbor.objects.filter(neighbor_id=self.book2.id).exists())
+        self.assertEqual([(self.book3.id, 0.5)], self.similar(self.book1))
+
+    def test_errors(self):
+        self.assertEqual(HTTP_404_NOT_FOUND, self.client.get(reverse('book-similar', args=(0,))).status_code)
+        for limit in (0, 101, 'x'):
+            resp = self.client.get(reverse('book-similar', args=(self.book1.id,)), data={'limit': limit})
+            self.assertEqual(HTTP_400_BAD_REQUEST, resp.status_code)
+
+    @override_settings(BOOK_RESPONSE_CACHE=None, BOOK_SIMILAR_RELOAD_INTERVAL=60)
+    def test_queries(self):
+        build_similar_books()
+        self.similar(self.book1)
+        with self.assertNumQueries(1):
+            self.similar(self.book2)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('build_similar_books', '--full', stdout=out)
+        self.assertEqual('Built neighbors for 3 books\n', out.getvalue())
+        call_command('build_similar_books', stdout=out)
+        self.assertIn('Updated neighbors of', out.getvalue())
+
+
+class SimilarityIndexTestCase(APITestCase):
+    def test_neighbors(self):
+        index = SimilarityIndex([(1, 2, 0.75), (1, 3, 0.5), (4, 1, 0.25)])
+        self.assertEqual(2, len(index))
+        self.assertEqual([(2, 0.75), (3, 0.5)], index.neighbors(1, 10))
+        self.assertEqual([(2, 0.75)], index.neighbors(1, 1))
+        self.assertEqual([(1, 0.25)], index.neighbors(4, 10))
+        self.assertEqual([], index.neighbors(2, 10))
+        self.assertEqual([], index.neighbors(5, 10))
+        self.assertEqual([], SimilarityIndex().neighbors(1, 10))
@@ -0,0 +1,50 @@
+import re
+
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    def assertQueryBudget(self, budget, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as captured:
+            result = func(*args, **kwargs)
+        if len(captured) != budget:
+            queries = '\n'.join(f'{number}. {query["sql"]}'
+                                for number, query in enumerate(captured.captured_queries, start=1))
+            self.fail(f'{len(captured)} queries executed, the budget is {budget}:\n{queries}')
+        return result
+
+
+class QueryPlanMixin:
+    large_tables = ('book_book', 'book_userbookrelation', 'auth_user')
+
+    def explain(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return queryset.explain()
+        # Test tables are tiny, so the planner would rightly prefer a sequential scan.
+        # Disabling it leaves a Seq Scan in the plan only where no index fits.
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+            try:
+                return queryset.explain()
+            finally:
+                cursor.execute('RESET enable_seqscan')
+
+    def assertNoSeqScan(self, queryset):
+        plan = self.explain(queryset)
+        vendor = connections[queryset.db].vendor
+        if vendor == 'postgresql':
+            pattern = r'Seq Scan on (\w+)'
+        elif vendor == 'sqlite':
+            # A bare SCAN walks the table b-tree, which is the primary key index itself:
+            # fine for an unfiltered page in id order, which stops after LIMIT rows.
+            ordering = queryset.query.order_by
+            if not queryset.query.where and ordering and ordering[0].lstrip('-') in ('id', 'pk'):
+                return
+            pattern = r'\bSCAN (\w+)(?! USING)(?!\w)'
+        else:
+            self.skipTest(f'No plan check for {vendor}')
+        scanned = set(re.findall(pattern, plan)) & set(self.large_tables)
+        if scanned:
+            self.fail(f'Sequential scan on {", ".join(sorted(scanned))}:\n{plan}\n\n{queryset.query}')
@@ -1,7 +1,9 @@
 from django.urls import path, include
 from rest_framework.routers import SimpleRouter
 
-from book.views import BookViewSet, auth, UserBookRelationView
+from book import async_views
+from book.metrics import metrics
+from book.views import BookViewSet, auth, UserBookRelationView, revoke_token, token
 
 router = SimpleRouter()
 router.register(r'book', BookViewSet)
@@ -10,6 +12,12 @@ router.register(r'book_relation', UserBookRelationView)
 urlpatterns = [
     path('', include('social_django.urls', namespace='social')),
     path('auth/', auth, name='git_auth'),
+    path('token/', token, name='token'),
+    path('token/revoke/', revoke_token, name='token-revoke'),
+    path('metrics', metrics, name='metrics'),
+    path('async/book/', async_views.book_list, name='async-book-list'),
+    path('async/book/<int:pk>/', async_views.book_detail, name='async-book-detail'),
+    path('async/book_relation/<int:book>/', async_views.relation_update, name='async-userbookrelation-detail'),
 ]
 
 urlpatterns += router.urls
@@ -1,41 +1,205 @@
-from django.db.models import Count, Case, When, Avg
+from django.conf import settings
+from django.db.models import Q
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.mixins import UpdateModelMixin
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.response import Response
+from rest_framework.status import HTTP_204_NO_CONTENT
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
 
+from book.authentication import issue_token, revoke_tokens
+from book.cache import CachedResponseMixin
+from book.conditional import ConditionalGetMixin
+from book.export import EXPORT_FORMATS, iter_export
+from book.facets import get_facets, parse_facets
+from book.leaderboard import BOARDS, get_leaderboard
+from book.logic import annotate_relation_state, apply_relation_changes, upsert_relation, RELATION_FIELDS
 from book.models import Book, UserBookRelation
+from book.pagination import KeysetPagination
 from book.permissions import IsOwnerOrStaffOrReadOnly
-from book.serializers import BooksSerializer, UserBookRelationSerializer
+from book.search import FullTextSearchFilter
+from book.serializers import BookDetailSerializer, BooksSerializer, BooksValuesSerializer, UserBookRelationSerializer, \
+    UserBookRelationBulkItemSerializer, LeaderboardParamsSerializer, SimilarParamsSerializer
+from book.similarity import similar_books
 
 
-class BookViewSet(ModelViewSet):
-    queryset = Book.objects.all().annotate(annotated_likes=Count(Case(When(userbookrelation__like=True, then=1)))).select_related('owner')
+class BookViewSet(ConditionalGetMixin, CachedResponseMixin, ModelViewSet):
+    queryset = Book.objects.all().select_related('owner')
     serializer_class = BooksSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, OrderingFilter]
     permission_classes = [IsOwnerOrStaffOrReadOnly]
-    filterset_fields = ['price', ]
+    pagination_class = KeysetPagination
+    filterset_fields = {
+        'price': ['exact', 'gt', 'gte', 'lt', 'lte'],
+        'rating': ['gt', 'gte', 'lt', 'lte'],
+        'author': ['exact'],
+    }
     search_fields = ['name', 'author']
-    ordering_fields = ['price', 'name']
+    ordering_fields = ['price', 'name', 'search_rank']
+    ordering = ['id']
+    values_actions = ('list', 'mine')
+    # Read from replicas by ReplicaRoutingMiddleware.
+    replica_actions = ('list', 'retrieve', 'mine', 'top', 'similar')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve', 'mine') and self.request.user.is_authenticated:
+            queryset = annotate_relation_state(queryset, self.request.user)
+        if self.action == 'mine':
+            relations = UserBookRelation.objects.filter(Q(like=True) | Q(in_bookmarks=True) | Q(rate__isnull=False),
+                                                        user=self.request.user)
+            queryset = queryset.filter(pk__in=relations.values('book_id'))
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action in self.values_actions:
+            return BooksValuesSerializer
+        if self.action == 'retrieve':
+            return BookDetailSerializer
+        return super().get_serializer_class()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in self.values_actions:
+            # Lists carry the star distribution only on request (`?rating_histogram=true`).
+            with_histogram = self.request.query_params.get('rating_histogram') in ('1', 'true')
+            queryset = BooksValuesSerializer.prepare(queryset, with_rating_histogram=with_histogram)
+        return queryset
+
+    def paginate_queryset(self, queryset):
+        # `?facets=price,author,rating` adds counts over the filtered books to the page.
+        names = parse_facets(self.request.query_params.get('facets'))
+        self.facets = get_facets(queryset, names) if names else None
+        return super().paginate_queryset(queryset)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if getattr(self, 'facets', None) is not None:
+            response.data['facets'] = self.facets
+        return response
 
     def perform_create(self, serializer):
         serializer.validated_data['owner'] = self.request.user
         super().perform_create(serializer)
 
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def mine(self, request):
+        """Books the current user liked, bookmarked or rated."""
+        return self.list(request)
+
+    @action(detail=False, url_path=f'top/(?P<board>{"|".join(BOARDS)})', pagination_class=None)
+    def top(self, request, board):
+        """Top books by rating, by likes, or by net likes over the last `days` days."""
+        return self.cached_response(self.leaderboard, request, board=board)
+
+    def leaderboard(self, request, board):
+        params = LeaderboardParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(get_leaderboard(board, **params.validated_data))
+
+    @action(detail=True, pagination_class=None)
+    def similar(self, request, pk):
+        """Books that readers who liked or highly rated this one also liked."""
+        # Not in the response cache: neighbors come from the per-process SimilarityStore, which
+        # picks up rebuilds on its own, so a cached response could outlive a rebuild.
+        params = SimilarParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        try:
+            books = similar_books(int(pk), **params.validated_data)
+        except ValueError:
+            books = None
+        if books is None:
+            raise NotFound()
+        return Response(books)
+
+    @action(detail=False, permission_classes=[IsAdminUser], pagination_class=None)
+    def export(self, request):
+        export_format = request.query_params.get('output', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'output': [f'Expected one of: {", ".join(EXPORT_FORMATS)}.']})
+
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(iter_export(queryset, export_format),
+                                         content_type=EXPORT_FORMATS[export_format])
+        response['Content-Disposition'] = f'attachment; filename="books.{export_format}"'
+        return response
+
 
 class UserBookRelationView(UpdateModelMixin, GenericViewSet):
     queryset = UserBookRelation.objects.all()
     serializer_class = UserBookRelationSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = 'book'
+    max_bulk_items = 500
+
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        serializer = self.get_serializer(data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        try:
+            book_id = int(self.kwargs['book'])
+        except ValueError:
+            raise NotFound()
+
+        fields = {name: value for name, value in serializer.validated_data.items() if name in RELATION_FIELDS}
+        relation = upsert_relation(request.user, book_id, fields)
+        if relation is None:
+            raise NotFound()
+        return Response(self.get_serializer(relation).data)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        if not isinstance(request.data, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of items.']})
+        if len(request.data) > self.max_bulk_items:
+            raise ValidationError({'non_field_errors': [f'At most {self.max_bulk_items} items are allowed.']})
+
+        results = [None] * len(request.data)
+        changes, positions = {}, {}
+        for index, item in enumerate(request.data):
+            serializer = UserBookRelationBulkItemSerializer(data=item)
+            if not serializer.is_valid():
+                results[index] = {'status': 'error', 'errors': serializer.errors}
+                continue
+            fields = dict(serializer.validated_data)
+            book_id = fields.pop('book')
+            if book_id in changes:
+                results[index] = {'book': book_id, 'status': 'error',
+                                  'errors': {'book': ['Duplicate book in this batch.']}}
+                continue
+            changes[book_id] = fields
+            positions[book_id] = index
 
-    def get_object(self):
-        obj, _ = UserBookRelation.objects.get_or_create(user=self.request.user,
-                                                        book_id=self.kwargs['book'])
-        return obj
+        existing = set(Book.objects.filter(pk__in=changes).values_list('pk', flat=True))
+        for book_id in set(changes) - existing:
+            results[positions.pop(book_id)] = {'book': book_id, 'status': 'error',
+                                               'errors': {'book': [f'Invalid pk "{book_id}" - object does not exist.']}}
+            del changes[book_id]
+
+        for book_id, (relation, status) in apply_relation_changes(request.user, changes).items():
+            results[positions[book_id]] = dict(UserBookRelationSerializer(relation).data, status=status)
+        return Response(results)
 
 
 def auth(request):
     return render(request, 'oauth.html')
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def token(request):
+    """Issue a signed API token to the logged-in user, e.g. right after the GitHub login."""
+    return Response({'token': issue_token(request.user), 'expires_in': settings.BOOK_TOKEN_MAX_AGE})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def revoke_token(request):
+    """Revoke every token issued to the current user."""
+    revoke_tokens(request.user)
+    return Response(status=HTTP_204_NO_CONTENT)
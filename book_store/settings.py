@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 STATIC_URL = '/static/'
 
 MIDDLEWARE = [
+    'book.metrics.MetricsMiddleware',
+    'book.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -91,6 +93,12 @@ DATABASES = {
     }
 }
 
+# Local stand-in for a read replica: the same database. Point it at a streaming replica
+# and list it in BOOK_READ_REPLICAS to move GET traffic off the primary.
+DATABASES['replica'] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+
+DATABASE_ROUTERS = ['book.routers.ReplicaRouter']
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -132,11 +140,22 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # DRF settings
 REST_FRAMEWORK = {
+    # orjson and msgpack are optional and not in requirements.txt: install them for faster
+    # JSON and for MessagePack. Without them JSON falls back to the stdlib encoder and
+    # MessagePack is not offered.
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'book.renderers.ORJSONRenderer',
+        'book.renderers.MessagePackRenderer',
     ),
     'DEFAULT_PARSER_CLASSES': (
-        'rest_framework.parsers.JSONParser',
+        'book.renderers.ORJSONParser',
+        'book.renderers.MessagePackParser',
+    ),
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS': 'book.renderers.ContentNegotiation',
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'rest_framework.authentication.SessionAuthentication',
+        'book.authentication.SignedTokenAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
     ),
 }
 
@@ -149,4 +168,53 @@ AUTHENTICATION_BACKENDS = (
 )
 
 SOCIAL_AUTH_GITHUB_KEY = 'fcd667a92b52a9797162'
-SOCIAL_AUTH_GITHUB_SECRET = 'a8f14eaf587e48cfbd6ba7ea521c0f66bd7d8f57'
\ No newline at end of file
+SOCIAL_AUTH_GITHUB_SECRET = 'a8f14eaf587e48cfbd6ba7ea521c0f66bd7d8f57'
+# Book aggregates
+# When enabled, relation writes only queue the book in DirtyBook and the
+# process_dirty_books worker recomputes likes/bookmarks/rating in batches.
+BOOK_AGGREGATES_WRITE_BEHIND = False
+BOOK_AGGREGATES_MAX_STALENESS = 5
+
+# Longest `?days=` window of the trending leaderboard; prune_like_activity drops older buckets.
+BOOK_TRENDING_MAX_DAYS = 30
+
+# Versioned cache for BookViewSet list/retrieve responses. The version counter is kept in
+# the ALIAS Django cache: point it at a shared backend (Redis, Memcached) so a write in any
+# process invalidates every worker; with the per-process LocMemCache, LRUResponseCache
+# entries are only bounded by TIMEOUT seconds. Use 'book.cache.DjangoResponseCache' to
+# share the responses too; set to None to disable.
+BOOK_RESPONSE_CACHE = {
+    'BACKEND': 'book.cache.LRUResponseCache',
+    'OPTIONS': {
+        'MAX_ENTRIES': 1024,
+        'TIMEOUT': 5,
+        'ALIAS': 'default',
+    },
+}
+
+# /metrics is served to staff users and to scrapers sending `Authorization: Bearer <token>`
+# with this token; None allows staff only.
+BOOK_METRICS_TOKEN = None
+
+# Read replicas. Book reads of the BookViewSet read actions and the async book views go to a
+# replica whose lag is below BOOK_REPLICA_MAX_LAG seconds (checked at most every
+# BOOK_REPLICA_CHECK_INTERVAL seconds); clients whose request wrote to the primary read from
+# it for BOOK_REPLICA_PIN_SECONDS, and replica responses are not cached that long after a write.
+BOOK_READ_REPLICAS = []
+BOOK_REPLICA_MAX_LAG = 10
+BOOK_REPLICA_CHECK_INTERVAL = 5
+BOOK_REPLICA_PIN_SECONDS = 10
+
+# "Readers also liked": build_similar_books keeps BOOK_SIMILAR_TOP_K neighbors per book,
+# ignoring users with more than BOOK_SIMILAR_MAX_USER_ITEMS liked books. Workers look for a
+# new build every BOOK_SIMILAR_RELOAD_INTERVAL seconds.
+BOOK_SIMILAR_TOP_K = 20
+BOOK_SIMILAR_MAX_USER_ITEMS = 500
+BOOK_SIMILAR_RELOAD_INTERVAL = 60
+
+# Signed API tokens (POST /token/ after logging in). Users behind them are cached per process
+# for BOOK_TOKEN_USER_CACHE_TTL seconds, which also bounds how long a revoked token keeps
+# working in workers other than the one that revoked it.
+BOOK_TOKEN_MAX_AGE = 60 * 60 * 24 * 7
+BOOK_TOKEN_USER_CACHE_TTL = 60
+BOOK_TOKEN_USER_CACHE_SIZE = 10000